@@ -0,0 +1,434 @@
+# === Load Packages ===
+from contextlib import contextmanager
+import bgzf
+import box_cache
+import numpy as np
+import os
+import polars as pl
+import remote_bgzf
+import requests
+import streaming
+import telemetry
+import time
+import VCF
+
+# === SETTINGS ===
+AGV_LD_PARQUET_DIR = os.environ.get('AGV_LD_PARQUET_DIR', 'files/AGV_LD_parquet')
+AGV_LD_PARTNERS_DIR = os.environ.get('AGV_LD_PARTNERS_DIR', 'files/AGV_LD_partners')
+PARTNER_ROW_GROUP_SIZE = 8192
+AGVS_BOX_URLS_PATH = 'files/AGVs_Box_URLs.json'
+ANCESTRY_GROUPS = {'AFR': 'African', 'EAS': 'East Asian', 'EUR': 'European', 'SAS': 'South Asian'}
+LD_LIST_COLUMNS = ['populations', 'r2', "D'", 'corr']
+# Parsed AGV-LD rows, for results of a chromosome file without any rows.
+AGV_LDV_SCHEMA = pl.Schema({
+	'chr': pl.Int64, 'LDV_pos': pl.Int64, 'LDV_ref': pl.Utf8, 'LDV_alt': pl.Utf8, 'LDV_rsID': pl.Utf8,
+	'AGV_pos': pl.Int64, 'AGV_ref': pl.Utf8, 'AGV_alt': pl.Utf8, 'AGV_rsID': pl.Utf8,
+	'populations': pl.List(pl.Utf8), 'r2': pl.List(pl.Float64), "D'": pl.List(pl.Float64), 'corr': pl.List(pl.Float64)
+})
+MIN_R2 = 0.5
+
+# === UTILS ===
+def parquet_path(variant_chr, parquet_dir=None):
+	return os.path.join(parquet_dir or AGV_LD_PARQUET_DIR, f'chr{variant_chr}.parquet')
+
+def AGV_LD_box_url(variant_chr):
+	return box_cache.box_url(box_cache.box_file_ids(AGVS_BOX_URLS_PATH).get(f'chr{variant_chr}'))
+
+# === FUNCTION: Parse Comma-Joined LD Columns ===
+# The TSVs store one value per ancestry group joined by commas. Correlation signs without a
+# magnitude ("+"/"-") are stored as nulls, as they have always been displayed.
+def parse_LD_lists(df):
+	return df.with_columns([
+		pl.col('r2').cast(pl.Utf8).str.split(',').list.eval(pl.element().cast(pl.Float64)),
+		pl.col('populations').str.split(','),
+		pl.col("D'").cast(pl.Utf8).str.split(',').list.eval(pl.element().cast(pl.Float64)),
+		pl.col('corr').cast(pl.Utf8).str.split(',').list.eval(
+			pl.when(pl.element().is_in(["+", "-"]))
+			.then(None)
+			.otherwise(pl.element())
+			.cast(pl.Float64)
+		),
+	])
+
+# === FUNCTION: Read AGV-LD Table in Batches ===
+# Without a Parquet file the TSV is decompressed and parsed in blocks of streaming.BATCH_BYTES,
+# so memory use stays flat however large the chromosome is. Batches keep the LD columns as
+# comma-joined strings (see parse_LD_lists); the schema inferred from the first block is reused
+# for the rest.
+def parse_AGV_LD_blocks(blocks):
+	schema = None
+	elapsed, rows = 0.0, 0
+	try:
+		for block in blocks:
+			start = time.perf_counter()
+			if schema is None:
+				df = pl.read_csv(block, separator='\t', has_header=True, low_memory=True, schema_overrides={column: pl.Utf8 for column in LD_LIST_COLUMNS})
+				schema = df.schema
+			else:
+				df = pl.read_csv(block, separator='\t', has_header=False, schema=schema, low_memory=True)
+			elapsed += time.perf_counter() - start
+			rows += df.height
+			yield df
+	finally:
+		telemetry.observe('parsing', elapsed, rows=rows)
+
+@contextmanager
+def AGV_LD_batches(variant_chr):
+	with streaming.open_decompressed(AGV_LD_box_url(variant_chr)) as chunks:
+		yield parse_AGV_LD_blocks(streaming.iter_blocks(chunks))
+
+# === FUNCTION: Build Remote AGV-LD Index ===
+# Writes the TSV sorted by LDV_pos as BGZF and a small linear index: the first position and
+# virtual offset of each chunk of about LD_CHUNK_BYTES (chunks never split a position's rows),
+# the block offsets, and the schema the TSV reader would infer. rsID -> position lookups go in
+# a separate file that is only fetched for rsID queries. Served over HTTP (see remote_bgzf), a
+# lookup fetches only the blocks of the chunks that can hold its rows.
+LD_CHUNK_BYTES = 32 * 1024
+
+def remote_AGV_LD_paths(bgz_path):
+	return bgz_path + '.idx.npz', bgz_path + '.rsID.npz'
+
+def build_AGV_LD_bgzf(source, bgz_path, chunk_bytes=LD_CHUNK_BYTES):
+	os.makedirs(os.path.dirname(bgz_path) or '.', exist_ok=True)
+	idx_path, rsID_path = remote_AGV_LD_paths(bgz_path)
+	schema = pl.read_csv(source, separator='\t', has_header=True, n_rows=100, schema_overrides={column: pl.Utf8 for column in LD_LIST_COLUMNS}).schema
+	df = pl.read_csv(source, separator='\t', has_header=True, infer_schema=False, low_memory=True)
+	df = df.with_columns(pl.col('LDV_pos').cast(pl.Int64).alias('pos_key')).sort('pos_key', maintain_order=True)
+	lines = df.select(pl.concat_str(pl.all().exclude('pos_key').fill_null(''), separator='\t')).to_series().to_list()
+
+	chunk_positions, chunk_starts = [], []
+	chunk_size, previous_pos = chunk_bytes, None
+	tmp_bgz_path = bgz_path + '.tmp'
+	with bgzf.BgzfWriter(tmp_bgz_path) as writer:
+		for pos, line in zip(df['pos_key'].to_list(), lines):
+			if pos != previous_pos and chunk_size >= chunk_bytes:
+				chunk_positions.append(pos)
+				chunk_starts.append(writer.tell())
+				chunk_size = 0
+			data = line.encode('utf-8') + b'\n'
+			writer.write(data)
+			chunk_size += len(data)
+			previous_pos = pos
+		chunk_starts.append(writer.tell())
+
+	LDVs = df.select('LDV_rsID', 'pos_key').unique(maintain_order=True)
+	rsIDs, rsID_positions, other_IDs, other_ID_positions = [], [], [], []
+	for rsID, pos in LDVs.iter_rows():
+		rsID_int = VCF.rsID_to_int(rsID)
+		if rsID_int is not None:
+			rsIDs.append(rsID_int)
+			rsID_positions.append(pos)
+		elif rsID:
+			other_IDs.append(rsID)
+			other_ID_positions.append(pos)
+	rsIDs = np.asarray(rsIDs, dtype=np.uint64)
+	rsID_order = np.argsort(rsIDs, kind='stable')
+	other_IDs = np.asarray(other_IDs, dtype=str)
+	other_order = np.argsort(other_IDs, kind='stable')
+
+	tmp_idx_path, tmp_rsID_path = idx_path + '.tmp.npz', rsID_path + '.tmp.npz'
+	np.savez(
+		tmp_idx_path,
+		columns=np.asarray(schema.names(), dtype=str),
+		dtypes=np.asarray([str(dtype) for dtype in schema.dtypes()], dtype=str),
+		chunk_positions=np.asarray(chunk_positions, dtype=np.int64),
+		chunk_starts=np.asarray(chunk_starts, dtype=np.uint64),
+		block_offsets=np.asarray(writer.block_offsets, dtype=np.int64)
+	)
+	np.savez_compressed(
+		tmp_rsID_path,
+		rsIDs=rsIDs[rsID_order],
+		rsID_positions=np.asarray(rsID_positions, dtype=np.int64)[rsID_order],
+		other_IDs=other_IDs[other_order],
+		other_ID_positions=np.asarray(other_ID_positions, dtype=np.int64)[other_order]
+	)
+	os.replace(tmp_bgz_path, bgz_path)
+	os.replace(tmp_idx_path, idx_path)
+	os.replace(tmp_rsID_path, rsID_path)
+	return df.height
+
+# === CLASS: Remote AGV-LD Index ===
+class RemoteAGVLDIndex:
+	def __init__(self, bgz_url, index):
+		self.bgz_url = bgz_url
+		self.schema = pl.Schema({column: getattr(pl, dtype) for column, dtype in zip(index['columns'].tolist(), index['dtypes'].tolist())})
+		self.chunk_positions = index['chunk_positions']
+		self.chunk_starts = index['chunk_starts']
+		self.remote = remote_bgzf.RemoteBgzfFile(bgz_url, index['block_offsets'])
+		self.rsID_index = None
+
+	def positions_for_rsID(self, rsID):
+		if self.rsID_index is None:
+			self.rsID_index = remote_bgzf.fetch_index(remote_AGV_LD_paths(self.bgz_url)[1])
+		rsID_int = VCF.rsID_to_int(rsID)
+		if rsID_int is not None:
+			keys, positions, key = self.rsID_index['rsIDs'], self.rsID_index['rsID_positions'], rsID_int
+		else:
+			keys, positions, key = self.rsID_index['other_IDs'], self.rsID_index['other_ID_positions'], rsID
+		start, end = np.searchsorted(keys, key, side='left'), np.searchsorted(keys, key, side='right')
+		return positions[start:end].tolist()
+
+	def read_rows(self, LDV_positions=(), LDV_rsIDs=()):
+		# Rows of the chunks that can hold the requested variants; callers apply the exact match.
+		positions = [int(pos) for pos in LDV_positions]
+		for rsID in LDV_rsIDs:
+			positions.extend(self.positions_for_rsID(rsID))
+		chunks = sorted({int(chunk) for chunk in np.searchsorted(self.chunk_positions, positions, side='right') - 1 if chunk >= 0})
+		return self.read_chunks(chunks)
+
+	def region_chunks(self, start, end):
+		first = max(int(np.searchsorted(self.chunk_positions, start, side='right')) - 1, 0)
+		last = int(np.searchsorted(self.chunk_positions, end, side='right')) - 1
+		return list(range(first, last + 1))
+
+	def read_chunks(self, chunks):
+		spans = [(int(self.chunk_starts[chunk]), int(self.chunk_starts[chunk + 1])) for chunk in chunks]
+		text = b''.join(self.remote.read_spans(spans)) if spans else b''
+		if not text:
+			return pl.DataFrame(schema=self.schema)
+		with telemetry.span('parsing', bytes=len(text)) as span:
+			df = pl.read_csv(text, separator='\t', has_header=False, schema=self.schema)
+			span.set(rows=df.height)
+		return df
+
+# Only loaded indexes are cached, so an index published while the app is running is picked up.
+remote_AGV_LD_indexes = {}
+
+def load_remote_AGV_LD_index(variant_chr):
+	if variant_chr not in remote_AGV_LD_indexes:
+		bgz_url = remote_bgzf.remote_url(f'chr{variant_chr}.AGV_LD.tsv.bgz')
+		if bgz_url is None:
+			return None
+		remote_AGV_LD_indexes[variant_chr] = RemoteAGVLDIndex(bgz_url, remote_bgzf.fetch_index(remote_AGV_LD_paths(bgz_url)[0]))
+	return remote_AGV_LD_indexes[variant_chr]
+
+def read_remote_AGV_LDVs(variant_chr, LDV_positions=(), LDV_rsIDs=()):
+	try:
+		remote_index = load_remote_AGV_LD_index(variant_chr)
+		if remote_index is not None:
+			return remote_index.read_rows(LDV_positions, LDV_rsIDs)
+	except requests.exceptions.RequestException as e:
+		print(f"Remote AGV-LD index unavailable for chr{variant_chr}, falling back to Box: {e}")
+	return None
+
+# === FUNCTION: Read AGV-LD Rows in a Region ===
+# Yields the rows with start <= LDV_pos <= end, with typed LD lists, in position order and in
+# frames of about batch_rows rows that never split a position. Parquet files (via row-group
+# statistics) and remote BGZF files (via the chunk index) are read only where they overlap the
+# region; the Box fallback has to scan the whole file and sorts the matches once it has.
+REGION_BATCH_ROWS = 8192
+REGION_REMOTE_CHUNKS = 8
+
+def region_expr(start, end):
+	return pl.col('LDV_pos').is_between(start, end)
+
+def parquet_region_batches(path, start, end, batch_rows):
+	positions = pl.scan_parquet(path).select('LDV_pos').filter(region_expr(start, end)).collect()['LDV_pos'].to_numpy()
+	while len(positions):
+		last_pos = int(positions[min(batch_rows, len(positions)) - 1])
+		with telemetry.span('parsing') as span:
+			batch = pl.scan_parquet(path).filter(region_expr(int(positions[0]), last_pos)).sort('LDV_pos', maintain_order=True).collect()
+			span.set(rows=batch.height)
+		yield batch
+		positions = positions[np.searchsorted(positions, last_pos, side='right'):]
+
+def remote_region_batches(remote_index, start, end):
+	chunks = remote_index.region_chunks(start, end)
+	for i in range(0, len(chunks), REGION_REMOTE_CHUNKS):
+		batch = remote_index.read_chunks(chunks[i:i + REGION_REMOTE_CHUNKS])
+		yield parse_LD_lists(batch.filter(region_expr(start, end)))
+
+def box_region_batches(variant_chr, start, end):
+	kept, kept_bytes = [], 0
+	with AGV_LD_batches(variant_chr) as batches:
+		for batch in batches:
+			kept.append(parse_LD_lists(batch.filter(region_expr(start, end))))
+			kept_bytes += kept[-1].estimated_size()
+			streaming.check_memory(kept_bytes + batch.estimated_size())
+	if kept:
+		yield pl.concat(kept).sort('LDV_pos', maintain_order=True)
+
+def AGV_LD_region_batches(variant_chr, start, end, batch_rows=REGION_BATCH_ROWS):
+	path = parquet_path(variant_chr)
+	if os.path.exists(path):
+		yield from parquet_region_batches(path, start, end, batch_rows)
+		return
+
+	try:
+		remote_index = load_remote_AGV_LD_index(variant_chr)
+	except requests.exceptions.RequestException as e:
+		print(f"Remote AGV-LD index unavailable for chr{variant_chr}, falling back to Box: {e}")
+		remote_index = None
+	if remote_index is not None:
+		yield from remote_region_batches(remote_index, start, end)
+		return
+
+	yield from box_region_batches(variant_chr, start, end)
+
+# === FUNCTION: Filter LD Proxies ===
+# Per-ancestry values are exploded to one row per proxy and ancestry group, filtered, and
+# re-aggregated in list order, so no Python code runs per row.
+def filter_AGV_LDVs(df, min_r2=MIN_R2, min_D=None, ancestry_groups=None):
+	if isinstance(df, pl.DataFrame):
+		df = df.lazy()
+	columns = df.collect_schema().names()
+	other_columns = [column for column in columns if column not in LD_LIST_COLUMNS]
+
+	conditions = pl.col('r2') >= (MIN_R2 if min_r2 is None else min_r2)
+	if min_D is not None:
+		conditions = conditions & (pl.col("D'") >= min_D)
+	# An empty selection keeps no proxies; None keeps every ancestry group.
+	if ancestry_groups is not None:
+		conditions = conditions & pl.col('populations').is_in(list(ancestry_groups))
+
+	indexed = df.with_row_index('proxy_index')
+	kept_LD = (
+		indexed
+		.select(['proxy_index'] + LD_LIST_COLUMNS)
+		.explode(LD_LIST_COLUMNS)
+		.filter(conditions)
+		.group_by('proxy_index', maintain_order=True)
+		.agg(LD_LIST_COLUMNS)
+	)
+	return (
+		indexed
+		.select(['proxy_index'] + other_columns)
+		.join(kept_LD, on='proxy_index', how='inner', maintain_order='left')
+		.select(columns)
+	)
+
+def format_AGV_LDVs(df):
+	return df.with_columns([
+		pl.col("populations").list.join(", ").alias("populations"),
+		pl.col("r2").list.eval(pl.element().cast(pl.Utf8)).list.join(", ").alias("r2"),
+		pl.col("D'").list.eval(pl.element().cast(pl.Utf8)).list.join(", ").alias("D'"),
+		pl.col("corr").list.eval(pl.element().cast(pl.Utf8)).list.join(", ").alias("corr"),
+	])
+
+# === FUNCTION: Query LD Proxies ===
+# Returns proxies with typed list columns for any LD variants matching the given positions or
+# rsIDs, sorted by r2 and filtered. One scan covers all requested variants on a chromosome.
+def match_expr(column, values):
+	values = list(values)
+	return pl.col(column) == values[0] if len(values) == 1 else pl.col(column).is_in(values)
+
+def query_AGV_LDVs(variant_chr, LDV_positions=(), LDV_rsIDs=(), min_r2=MIN_R2, min_D=None, ancestry_groups=None):
+	conditions = []
+	if LDV_positions:
+		conditions.append(match_expr('LDV_pos', [int(pos) for pos in LDV_positions]))
+	if LDV_rsIDs:
+		conditions.append(match_expr('LDV_rsID', LDV_rsIDs))
+	if not conditions:
+		raise ValueError('At least one LD variant position or rsID is required.')
+
+	condition = conditions[0] if len(conditions) == 1 else conditions[0] | conditions[1]
+	path = parquet_path(variant_chr)
+	if os.path.exists(path):
+		return sort_and_filter_AGV_LDVs(pl.scan_parquet(path).filter(condition), min_r2, min_D, ancestry_groups)
+
+	remote_AGV_LDVs = read_remote_AGV_LDVs(variant_chr, LDV_positions, LDV_rsIDs)
+	if remote_AGV_LDVs is not None:
+		return sort_and_filter_AGV_LDVs(parse_LD_lists(remote_AGV_LDVs.lazy().filter(condition)), min_r2, min_D, ancestry_groups)
+
+	return scan_AGV_LDVs(variant_chr, condition, min_r2, min_D, ancestry_groups)
+
+def sort_and_filter_AGV_LDVs(matched_AGV_LDVs, min_r2, min_D, ancestry_groups):
+	# Pages are read, decoded and filtered in one lazy query, timed as a whole.
+	with telemetry.span('r2_filtering') as span:
+		matched_AGV_LDVs = matched_AGV_LDVs.sort(pl.col('r2').list.first(), descending=True, maintain_order=True)
+		AGV_LDVs = filter_AGV_LDVs(matched_AGV_LDVs, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups).collect()
+		span.set(rows=AGV_LDVs.height)
+	return AGV_LDVs
+
+def scan_AGV_LDVs(variant_chr, condition, min_r2, min_D, ancestry_groups):
+	# Batches are matched and filtered as they are read; the sort key is the unfiltered first r2,
+	# as in the Parquet path, and the stable sort keeps file order for ties.
+	kept, kept_bytes = [], 0
+	elapsed = 0.0
+	with AGV_LD_batches(variant_chr) as batches:
+		for batch in batches:
+			start = time.perf_counter()
+			matched_AGV_LDVs = parse_LD_lists(batch.lazy().filter(condition)).with_columns(pl.col('r2').list.first().alias('sort_r2'))
+			kept.append(filter_AGV_LDVs(matched_AGV_LDVs, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups).collect())
+			elapsed += time.perf_counter() - start
+			kept_bytes += kept[-1].estimated_size()
+			streaming.check_memory(kept_bytes + batch.estimated_size())
+	if not kept:
+		telemetry.observe('r2_filtering', elapsed, rows=0)
+		return pl.DataFrame(schema=AGV_LDV_SCHEMA)
+	AGV_LDVs = pl.concat(kept).sort('sort_r2', descending=True, maintain_order=True).drop('sort_r2')
+	telemetry.observe('r2_filtering', elapsed, rows=AGV_LDVs.height)
+	return AGV_LDVs
+
+# === FUNCTION: Build AGV Partner Index ===
+# The reverse index of a chromosome: its AGV-LD rows sorted by AGV_pos (then LDV_pos) in a
+# Parquet file, and a postings file listing each AGV position with the first row of its LD
+# partners. A lookup is a binary search in the postings and a read of that row range, which
+# polars pushes into the Parquet scan so only the row groups it covers are decoded.
+def partner_index_paths(variant_chr, partners_dir=None):
+	base_path = os.path.join(partners_dir or AGV_LD_PARTNERS_DIR, f'chr{variant_chr}')
+	return base_path + '.by_AGV.parquet', base_path + '.by_AGV.postings.npz'
+
+def build_AGV_partner_index(source, variant_chr, partners_dir=None, row_group_size=PARTNER_ROW_GROUP_SIZE):
+	parquet_output_path, postings_path = partner_index_paths(variant_chr, partners_dir)
+	os.makedirs(os.path.dirname(parquet_output_path) or '.', exist_ok=True)
+	df = pl.read_csv(source, separator='\t', has_header=True, low_memory=True)
+	df = parse_LD_lists(df).sort(['AGV_pos', 'LDV_pos'], maintain_order=True)
+	AGV_positions, starts = np.unique(df['AGV_pos'].to_numpy(), return_index=True)
+
+	tmp_parquet_path, tmp_postings_path = parquet_output_path + '.tmp', postings_path + '.tmp.npz'
+	try:
+		df.write_parquet(tmp_parquet_path, compression='zstd', statistics=True, row_group_size=row_group_size)
+		np.savez(tmp_postings_path, AGV_positions=AGV_positions.astype(np.int64), starts=np.append(starts, df.height).astype(np.int64))
+		os.replace(tmp_parquet_path, parquet_output_path)
+		os.replace(tmp_postings_path, postings_path)
+	except BaseException:
+		for tmp_path in (tmp_parquet_path, tmp_postings_path):
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+		raise
+	return df.height, len(AGV_positions)
+
+# === CLASS: AGV Partner Index ===
+class AGVPartnerIndex:
+	def __init__(self, parquet_path, postings_path):
+		postings = np.load(postings_path)
+		self.parquet_path = parquet_path
+		self.AGV_positions = postings['AGV_positions']
+		self.starts = postings['starts']
+
+	def row_range(self, AGV_pos):
+		i = int(np.searchsorted(self.AGV_positions, AGV_pos))
+		if i < len(self.AGV_positions) and self.AGV_positions[i] == AGV_pos:
+			return int(self.starts[i]), int(self.starts[i + 1])
+		return 0, 0
+
+	def scan(self, AGV_pos):
+		start, end = self.row_range(int(AGV_pos))
+		return pl.scan_parquet(self.parquet_path).slice(start, end - start)
+
+# Only loaded indexes are cached, so an index built while the app is running is picked up.
+AGV_partner_indexes = {}
+
+def load_AGV_partner_index(variant_chr):
+	if variant_chr not in AGV_partner_indexes:
+		paths = partner_index_paths(variant_chr)
+		if not all(os.path.exists(path) for path in paths):
+			return None
+		AGV_partner_indexes[variant_chr] = AGVPartnerIndex(*paths)
+	return AGV_partner_indexes[variant_chr]
+
+# === FUNCTION: Query LD Partners of an AGV ===
+# Returns every LD variant tagged by the AGV at AGV_pos, with typed list columns, sorted by r2
+# and filtered as query_AGV_LDVs does. Without a partner index the chromosome's Parquet file is
+# filtered on AGV_pos, or its AGV-LD file is scanned in full.
+def query_AGV_partners(variant_chr, AGV_pos, min_r2=MIN_R2, min_D=None, ancestry_groups=None):
+	partner_index = load_AGV_partner_index(variant_chr)
+	if partner_index is not None:
+		return sort_and_filter_AGV_LDVs(partner_index.scan(AGV_pos), min_r2, min_D, ancestry_groups)
+
+	condition = pl.col('AGV_pos') == int(AGV_pos)
+	path = parquet_path(variant_chr)
+	if os.path.exists(path):
+		return sort_and_filter_AGV_LDVs(pl.scan_parquet(path).filter(condition), min_r2, min_D, ancestry_groups)
+	return scan_AGV_LDVs(variant_chr, condition, min_r2, min_D, ancestry_groups)
@@ -0,0 +1,102 @@
+# === Load Packages ===
+from functools import lru_cache
+import gzip
+import numpy as np
+import os
+import polars as pl
+import telemetry
+
+# === SETTINGS ===
+AGVS_PATH = os.environ.get('AGV_CATALOG_PATH', 'files/AGVs_hg38.txt.gz')
+
+# === FUNCTION: Load AGV Catalog ===
+def load_AGVs(path=None):
+	with gzip.open(path or AGVS_PATH, 'rt') as f:
+		df = pl.read_csv(f, separator='\t', has_header=False, schema_overrides={'column_1': pl.Utf8})
+	df.columns = ['chr', 'pos', 'rsID', 'ref', 'alt']
+	return df
+
+# === CLASS: AGV Catalog Index ===
+# The catalog is kept as one columnar frame sorted by chromosome and position. Positions are
+# searched per chromosome with binary search, and rsIDs through a sorted array of their numeric
+# part, so no per-AGV Python objects are held.
+class AGVCatalog:
+	def __init__(self, df):
+		df = df.with_row_index('order').sort(['chr', 'pos', 'order'])
+		file_order = df['order'].to_numpy()
+		df = df.drop('order')
+		self.df = df
+		self.chr = df['chr']
+		self.rsID = df['rsID']
+		self.ref = df['ref']
+		self.alt = df['alt']
+		self.positions = df['pos'].cast(pl.Int64).to_numpy()
+
+		self.chr_bounds = {}
+		chr_runs = df.select(pl.col('chr').rle()).unnest('chr')
+		start = 0
+		for length, chr in chr_runs.iter_rows():
+			self.chr_bounds[chr] = (start, start + length)
+			start += length
+
+		rsID_ints = df['rsID'].str.strip_prefix('rs').cast(pl.UInt64, strict=False)
+		rsID_ints = rsID_ints.set(df['rsID'].str.starts_with('rs').not_(), None)
+		has_int = rsID_ints.is_not_null().to_numpy()
+		rows = np.flatnonzero(has_int)
+		keys = rsID_ints.filter(rsID_ints.is_not_null()).to_numpy()
+		order = np.lexsort((file_order[rows], keys))
+		self.rsID_keys = keys[order]
+		self.rsID_rows = rows[order].astype(np.uint32)
+		self.other_rsIDs = {}
+		for row in sorted(np.flatnonzero(~has_int), key=lambda row: file_order[row]):
+			self.other_rsIDs.setdefault(self.rsID[int(row)], int(row))
+
+	def __len__(self):
+		return self.df.height
+
+	def row(self, i):
+		return {'chr': self.chr[i], 'pos': int(self.positions[i]), 'rsID': self.rsID[i], 'ref': self.ref[i], 'alt': self.alt[i]}
+
+	def find_chr_pos(self, chr, pos):
+		start, end = self.chr_bounds.get(str(chr), (0, 0))
+		i = start + int(np.searchsorted(self.positions[start:end], pos))
+		if i < end and self.positions[i] == pos:
+			return i
+		return None
+
+	def find_rsID(self, rsID):
+		if rsID and rsID.startswith('rs') and rsID[2:].isdigit():
+			if int(rsID[2:]) >= 2 ** 64:
+				return None
+			key = np.uint64(rsID[2:])
+			i = int(np.searchsorted(self.rsID_keys, key))
+			if i < len(self.rsID_keys) and self.rsID_keys[i] == key:
+				return int(self.rsID_rows[i])
+			return None
+		return self.other_rsIDs.get(rsID)
+
+	def range(self, chr, start_pos, end_pos):
+		start, end = self.chr_bounds.get(str(chr), (0, 0))
+		chr_positions = self.positions[start:end]
+		lo = start + int(np.searchsorted(chr_positions, start_pos, side='left'))
+		hi = start + int(np.searchsorted(chr_positions, end_pos, side='right'))
+		return self.df.slice(lo, hi - lo)
+
+	def nbytes(self):
+		return int(self.df.estimated_size() + self.positions.nbytes + self.rsID_keys.nbytes + self.rsID_rows.nbytes)
+
+@lru_cache(maxsize=1)
+def get_AGV_catalog():
+	with telemetry.span('catalog_load') as span:
+		catalog = AGVCatalog(load_AGVs())
+		span.set(rows=len(catalog))
+	return catalog
+
+# === FUNCTION: Lookups ===
+def lookup_AGV_by_chr_pos(catalog, chr, pos):
+	i = catalog.find_chr_pos(chr, int(pos))
+	return catalog.row(i) if i is not None else None
+
+def lookup_AGV_by_rsID(catalog, rsID):
+	i = catalog.find_rsID(rsID)
+	return catalog.row(i) if i is not None else None
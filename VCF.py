@@ -0,0 +1,221 @@
+# === Load Packages ===
+import bgzf
+import box_cache
+import gzip
+import numpy as np
+import os
+import remote_bgzf
+import requests
+import streaming
+
+# === SETTINGS ===
+VCF_INDEX_DIR = os.environ.get('AGV_VCF_INDEX_DIR', 'files/VCF_index')
+VCFS_BOX_URLS_PATH = 'files/VCFs_Box_URLs.json'
+
+# === UTILS ===
+def VCF_box_url(variant_chr):
+	return box_cache.box_url(box_cache.box_file_ids(VCFS_BOX_URLS_PATH).get(f'chr{variant_chr}'))
+
+def indexed_VCF_paths(variant_chr, index_dir=None):
+	base = os.path.join(index_dir or VCF_INDEX_DIR, f'chr{variant_chr}.vcf.bgz')
+	return base, base + '.idx.npz'
+
+def rsID_to_int(rsID):
+	if rsID and rsID.startswith('rs') and rsID[2:].isdigit() and int(rsID[2:]) < 2 ** 64:
+		return np.uint64(rsID[2:])
+	return None
+
+# === FUNCTION: Build BGZF VCF and Index ===
+# Recompresses a VCF as BGZF and records the virtual offset of every record, keyed both by
+# hg19 position and by rsID. Non-"rs" IDs are kept in a separate sorted string table.
+def build_VCF_index(source, bgz_path, idx_path):
+	os.makedirs(os.path.dirname(bgz_path) or '.', exist_ok=True)
+	positions, position_offsets = [], []
+	rsIDs, rsID_offsets = [], []
+	other_IDs, other_ID_offsets = [], []
+	sample_names = []
+
+	tmp_bgz_path = bgz_path + '.tmp'
+	with gzip.open(source, 'rb') as vcf_file, bgzf.BgzfWriter(tmp_bgz_path) as writer:
+		for raw_line in vcf_file:
+			virtual_offset = writer.tell()
+			writer.write(raw_line)
+			if raw_line.startswith(b'#'):
+				if raw_line.startswith(b'#CHROM'):
+					sample_names = raw_line.rstrip(b'\r\n').decode('utf-8').split('\t')[9:]
+				continue
+			fields = raw_line.split(b'\t', 3)
+			positions.append(int(fields[1]))
+			position_offsets.append(virtual_offset)
+			variant_ID = fields[2].decode('utf-8')
+			rsID_int = rsID_to_int(variant_ID)
+			if rsID_int is not None:
+				rsIDs.append(rsID_int)
+				rsID_offsets.append(virtual_offset)
+			elif variant_ID != '.':
+				other_IDs.append(variant_ID)
+				other_ID_offsets.append(virtual_offset)
+
+	positions = np.asarray(positions, dtype=np.int64)
+	position_offsets = np.asarray(position_offsets, dtype=np.uint64)
+	order = np.argsort(positions, kind='stable')
+	rsIDs = np.asarray(rsIDs, dtype=np.uint64)
+	rsID_offsets = np.asarray(rsID_offsets, dtype=np.uint64)
+	rsID_order = np.argsort(rsIDs, kind='stable')
+	other_IDs = np.asarray(other_IDs, dtype=str)
+	other_ID_offsets = np.asarray(other_ID_offsets, dtype=np.uint64)
+	other_order = np.argsort(other_IDs, kind='stable')
+
+	tmp_idx_path = idx_path + '.tmp.npz'
+	np.savez(
+		tmp_idx_path,
+		positions=positions[order],
+		position_offsets=position_offsets[order],
+		rsIDs=rsIDs[rsID_order],
+		rsID_offsets=rsID_offsets[rsID_order],
+		other_IDs=other_IDs[other_order],
+		other_ID_offsets=other_ID_offsets[other_order],
+		sample_names=np.asarray(sample_names, dtype=str),
+		block_offsets=np.asarray(writer.block_offsets, dtype=np.int64)
+	)
+	os.replace(tmp_bgz_path, bgz_path)
+	os.replace(tmp_idx_path, idx_path)
+	return len(positions)
+
+# === CLASS: Indexed VCF ===
+class VCFIndex:
+	def __init__(self, bgz_path, idx_path):
+		self.bgz_path = bgz_path
+		with np.load(idx_path, allow_pickle=False) as index:
+			self.load_index(index)
+
+	def load_index(self, index):
+		self.positions = index['positions']
+		self.position_offsets = index['position_offsets']
+		self.rsIDs = index['rsIDs']
+		self.rsID_offsets = index['rsID_offsets']
+		self.other_IDs = index['other_IDs']
+		self.other_ID_offsets = index['other_ID_offsets']
+		self.sample_names = index['sample_names'].tolist()
+
+	def offset_for_rsID(self, rsID):
+		rsID_int = rsID_to_int(rsID)
+		if rsID_int is not None:
+			keys, offsets, key = self.rsIDs, self.rsID_offsets, rsID_int
+		else:
+			keys, offsets, key = self.other_IDs, self.other_ID_offsets, rsID
+		i = np.searchsorted(keys, key)
+		if i < len(keys) and keys[i] == key:
+			return int(offsets[i])
+		return None
+
+	def offsets_for_pos(self, pos):
+		start, end = np.searchsorted(self.positions, [pos, pos + 1])
+		return [int(offset) for offset in self.position_offsets[start:end]]
+
+	def read_record(self, virtual_offset):
+		return self.read_records([virtual_offset])[0]
+
+	def read_records(self, virtual_offsets):
+		with open(self.bgz_path, 'rb') as bgz_file:
+			return [bgzf.read_line(bgz_file, virtual_offset).decode('utf-8').split('\t') for virtual_offset in virtual_offsets]
+
+	def fetch_by_rsID(self, rsID):
+		virtual_offset = self.offset_for_rsID(rsID)
+		if virtual_offset is None:
+			return None
+		return self.read_record(virtual_offset)
+
+	def fetch_by_pos(self, pos):
+		return self.read_records(self.offsets_for_pos(pos))
+
+	def fetch_by_rsIDs(self, rsIDs):
+		# Records by rsID for those found, read in file order.
+		offsets = sorted((offset, rsID) for rsID, offset in ((rsID, self.offset_for_rsID(rsID)) for rsID in rsIDs) if offset is not None)
+		return dict(zip((rsID for _, rsID in offsets), self.read_records([offset for offset, _ in offsets])))
+
+# Only loaded indexes are cached, so an index built while the app is running is picked up.
+VCF_indexes = {}
+
+def load_VCF_index(variant_chr, index_dir=None):
+	if (variant_chr, index_dir) not in VCF_indexes:
+		bgz_path, idx_path = indexed_VCF_paths(variant_chr, index_dir)
+		if not (os.path.exists(bgz_path) and os.path.exists(idx_path)):
+			return None
+		VCF_indexes[variant_chr, index_dir] = VCFIndex(bgz_path, idx_path)
+	return VCF_indexes[variant_chr, index_dir]
+
+# === CLASS: Remote Indexed VCF ===
+# The same BGZF file and index served over HTTP. A record runs up to the next record's virtual
+# offset, so reading one fetches only the compressed blocks it spans.
+class RemoteVCFIndex(VCFIndex):
+	def __init__(self, bgz_url, index):
+		self.bgz_path = bgz_url
+		self.load_index(index)
+		self.record_offsets = np.sort(self.position_offsets)
+		self.remote = remote_bgzf.RemoteBgzfFile(bgz_url, index['block_offsets'])
+		self.end_offset = bgzf.make_virtual_offset(int(index['block_offsets'][-1]), 0)
+
+	def record_end(self, virtual_offset):
+		i = np.searchsorted(self.record_offsets, np.uint64(virtual_offset), side='right')
+		return int(self.record_offsets[i]) if i < len(self.record_offsets) else self.end_offset
+
+	def read_records(self, virtual_offsets):
+		spans = [(virtual_offset, self.record_end(virtual_offset)) for virtual_offset in virtual_offsets]
+		return [line.rstrip(b'\r\n').decode('utf-8').split('\t') for line in self.remote.read_spans(spans)]
+
+	def fetch_by_pos(self, pos):
+		return self.read_records(self.offsets_for_pos(pos))
+
+remote_VCF_indexes = {}
+
+def load_remote_VCF_index(variant_chr):
+	if variant_chr not in remote_VCF_indexes:
+		bgz_url = remote_bgzf.remote_url(f'chr{variant_chr}.vcf.bgz')
+		if bgz_url is None:
+			return None
+		remote_VCF_indexes[variant_chr] = RemoteVCFIndex(bgz_url, remote_bgzf.fetch_index(bgz_url + '.idx.npz'))
+	return remote_VCF_indexes[variant_chr]
+
+# === FUNCTION: Linear VCF Scan ===
+# Fallback for chromosomes without an index. Only the first three fields are split per line;
+# the sample columns are split once a record is found, and the scan stops when all are found.
+def scan_variants_records(lines, variant_rsIDs):
+	targets = {rsID.encode('utf-8'): rsID for rsID in variant_rsIDs}
+	sample_names, records = [], {}
+	for raw_line in lines:
+		if raw_line.startswith(b'#'):
+			if raw_line.startswith(b'#CHROM'):
+				sample_names = raw_line.rstrip(b'\r\n').decode('utf-8').split('\t')[9:]
+			continue
+		rsID = targets.get(raw_line.split(b'\t', 3)[2])
+		if rsID is not None:
+			records[rsID] = raw_line.rstrip(b'\r\n').decode('utf-8').split('\t')
+			if len(records) == len(targets):
+				break
+	return sample_names, records
+
+# === FUNCTION: Fetch Records for Variants ===
+# Returns the sample names and the VCF record of each variant found, by rsID, reading the
+# chromosome's VCF once for all of them.
+def fetch_variants_records(variant_chr, variant_rsIDs):
+	VCF_index = load_VCF_index(variant_chr)
+	if VCF_index is not None:
+		return VCF_index.sample_names, VCF_index.fetch_by_rsIDs(variant_rsIDs)
+
+	try:
+		remote_index = load_remote_VCF_index(variant_chr)
+		if remote_index is not None:
+			return remote_index.sample_names, remote_index.fetch_by_rsIDs(variant_rsIDs)
+	except requests.exceptions.RequestException as e:
+		print(f"Remote VCF index unavailable for chr{variant_chr}, falling back to Box: {e}")
+
+	# The scan stops at the last matching record; when streaming from Box, so does the download.
+	with streaming.open_decompressed(VCF_box_url(variant_chr)) as chunks:
+		return scan_variants_records(streaming.iter_lines(chunks), variant_rsIDs)
+
+# === FUNCTION: Fetch Genotypes for a Variant ===
+def fetch_variant_GTs(variant_chr, variant_rsID):
+	sample_names, records = fetch_variants_records(variant_chr, [variant_rsID])
+	fields = records.get(variant_rsID)
+	return sample_names, (fields[9:] if fields else None)
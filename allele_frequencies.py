@@ -0,0 +1,350 @@
+# === Load Packages ===
+from functools import lru_cache
+import csv
+import genotype_store
+import gzip
+import numpy as np
+import polars as pl
+import re
+import requests
+import telemetry
+import threading
+import warnings
+
+# === SETTINGS ===
+# (lower, upper, label): samples with lower < Date_mean <= upper; lower == upper selects Date_mean == lower.
+DATE_BINS = [
+	(0, 0, "Present"),
+	(0, 1_000, "1000"),
+	(1_000, 2_000, "2000"),
+	(2_000, 3_000, "3000"),
+	(3_000, 4_000, "4000"),
+	(4_000, 5_000, "5000"),
+	(5_000, 10_000, "10000"),
+	(10_000, 15_000, "15000"),
+	(15_000, 20_000, "20000"),
+	(20_000, 30_000, "30000"),
+	(30_000, 40_000, "40000"),
+	(40_000, 50_000, "50000")
+]
+
+REGIONS = ["Africa", "Americas", "East Asia", "Europe", "Oceania", "South Asia", "West Asia"]
+# (label, regions): the rows of the AF table. Users can supply their own bin edges and groupings
+# of REGIONS, e.g. "Eurasia=Europe+West Asia+South Asia+East Asia; Africa".
+REGION_GROUPS = tuple((region, (region,)) for region in REGIONS)
+MAX_DATE_BINS = 100
+
+# Confidence intervals are percentile intervals over bootstrap replicates that resample
+# specimens with replacement within each region x time bin cell. The seed is fixed so a table is
+# reproducible.
+BOOTSTRAP_REPLICATES = 1000
+MAX_BOOTSTRAP_REPLICATES = 10000
+BOOTSTRAP_LEVEL = 0.95
+BOOTSTRAP_SEED = 1
+
+MISSING_GT = "./."
+EXCLUDED_LOCATIONS = ("Denisova", "Neanderthal", "REF")
+PREFERRED_DATA_SOURCE = "Shotgun.diploid"
+
+# === UTILS ===
+def read_only(array):
+	array.setflags(write=False)
+	return array
+
+def binning_key(date_bins, region_groups):
+	return tuple(map(tuple, date_bins)), tuple((label, tuple(members)) for label, members in region_groups)
+
+# === CLASS: Sample Annotation ===
+# The annotation file held as read-only numpy columns (empty fields are nulls, as polars reads
+# them). It is parsed without polars so it can be built in a gunicorn --preload master, whose
+# forked workers then share its pages; polars' thread pool does not survive a fork.
+class SampleAnnotation:
+	def __init__(self, path):
+		with gzip.open(path, 'rt', newline='') as annotation_file:
+			reader = csv.reader(annotation_file, delimiter='\t')
+			self.columns = next(reader)
+			records = list(reader)
+
+		self.values, self.nulls = {}, {}
+		for i, column in enumerate(self.columns):
+			values = [record[i] if i < len(record) else '' for record in records]
+			nulls = np.asarray([value == '' for value in values], dtype=bool)
+			try:
+				array = np.asarray([int(value) if value else 0 for value in values], dtype=np.int64)
+			except ValueError:
+				array = np.asarray(values, dtype=str)
+			self.values[column], self.nulls[column] = read_only(array), read_only(nulls)
+
+		self.ID_order = read_only(np.argsort(self.values['Genetic_ID'], kind='stable'))
+		self.sorted_IDs = read_only(self.values['Genetic_ID'][self.ID_order])
+
+	def __len__(self):
+		return len(self.sorted_IDs)
+
+	def rows_for(self, genetic_IDs):
+		# Row of each Genetic_ID in the file, or -1 if it is not annotated.
+		genetic_IDs = np.asarray(genetic_IDs, dtype=str)
+		i = np.minimum(np.searchsorted(self.sorted_IDs, genetic_IDs), max(len(self) - 1, 0))
+		found = (self.sorted_IDs[i] == genetic_IDs) if len(self) else np.zeros(len(genetic_IDs), dtype=bool)
+		return np.where(found, self.ID_order[i], -1)
+
+	def frame(self):
+		return pl.DataFrame([
+			pl.Series(column, self.values[column]).set(pl.Series(self.nulls[column]), None)
+			for column in self.columns
+		])
+
+@lru_cache(maxsize=None)
+def load_sample_annotation(path=genotype_store.SAMPLE_ANNOTATION_PATH):
+	return SampleAnnotation(path)
+
+# === FUNCTION: Parse Time Bins and Region Groups ===
+# Edges are years before present. Each pair of consecutive edges is a bin labelled by its upper
+# edge, as in DATE_BINS; an edge of 0 adds the "Present" bin of samples dated 0.
+def date_bins_from_edges(edges):
+	edges = list(edges)
+	if len(edges) < 2 or any(lower >= upper for lower, upper in zip(edges, edges[1:])) or edges[0] < 0:
+		raise ValueError("Time bin edges must be at least two increasing, non-negative numbers of years.")
+	if len(edges) > MAX_DATE_BINS:
+		raise ValueError(f"At most {MAX_DATE_BINS} time bins can be used.")
+	date_bins = [(0, 0, "Present")] if edges[0] == 0 else []
+	return tuple(date_bins + [(lower, upper, str(upper)) for lower, upper in zip(edges, edges[1:])])
+
+def date_bin_edges(date_bins):
+	return sorted({edge for lower, upper, _ in date_bins for edge in (lower, upper)})
+
+def parse_date_bins(text):
+	if not (text or '').strip():
+		return tuple(DATE_BINS)
+	try:
+		edges = [int(value.replace('_', '')) for value in re.split(r'[\s,;]+', text.strip()) if value]
+	except ValueError:
+		raise ValueError("Time bin edges must be whole numbers of years, e.g. 0, 1000, 5000, 10000.")
+	return date_bins_from_edges(edges)
+
+def parse_region_groups(text):
+	if not (text or '').strip():
+		return REGION_GROUPS
+	groups, grouped = [], set()
+	for part in (part.strip() for part in text.split(';')):
+		if not part:
+			continue
+		label, _, members = part.partition('=') if '=' in part else (part, '=', part)
+		label, members = label.strip(), [member.strip() for member in members.split('+') if member.strip()]
+		unknown = [member for member in members if member not in REGIONS]
+		if unknown:
+			raise ValueError(f"Unknown regions: {', '.join(unknown)}. Choose from {', '.join(REGIONS)}.")
+		if not label or not members or label == 'Total' or label in (group for group, _ in groups):
+			raise ValueError(f"Invalid region group: {part}.")
+		if grouped & set(members):
+			raise ValueError(f"Regions can only be in one group: {', '.join(sorted(grouped & set(members)))}.")
+		grouped |= set(members)
+		groups.append((label, tuple(members)))
+	return tuple(groups)
+
+# === FUNCTION: Assign Time Bins ===
+# Index into labels of each sample's time bin, or -1. Bins are the intervals between consecutive
+# bin edges, closed on the right, that are listed in date_bins; lower == upper bins match exactly.
+def date_bin_codes(date_mean, is_null, date_bins=DATE_BINS):
+	labels = list(dict.fromkeys(label for _, _, label in date_bins))
+	range_bins = [(lower, upper, label) for lower, upper, label in date_bins if lower != upper]
+	breaks = sorted({edge for lower, upper, _ in range_bins for edge in (lower, upper)})
+	interval_labels = {(lower, upper): label for lower, upper, label in range_bins}
+
+	codes = np.full(len(date_mean), -1, dtype=np.int16)
+	intervals = np.searchsorted(breaks, date_mean, side='left')
+	for i in range(len(breaks) - 1):
+		label = interval_labels.get((breaks[i], breaks[i + 1]))
+		if label is not None:
+			codes[intervals == i + 1] = labels.index(label)
+	for lower, upper, label in date_bins:
+		if lower == upper:
+			codes[date_mean == lower] = labels.index(label)
+	codes[is_null] = -1
+	return codes, labels
+
+# === CLASS: Sample Panel ===
+# Everything the AF calculation needs about the samples of a VCF, in its column order: the
+# columns kept after excluding archaic and reference samples and keeping one sample per
+# Specimen_ID (Shotgun.diploid preferred, then the first column), with their dates and regions.
+# Built once per sample order and shared read-only, along with its binning for the default time
+# bins and regions; other binnings are built on request and the most recent few are kept.
+class SamplePanel:
+	MAX_BINNINGS = 16
+
+	def __init__(self, sample_names, annotation, date_bins=DATE_BINS, region_groups=REGION_GROUPS):
+		self.sample_names = list(sample_names)
+		self.annotation = annotation
+		self.archaic_columns = tuple((genotype_store.ARCHAIC_SAMPLE_NAMES[name], column) for column, name in enumerate(self.sample_names) if name in genotype_store.ARCHAIC_SAMPLE_NAMES)
+
+		rows = annotation.rows_for(self.sample_names)
+		annotated = np.flatnonzero(rows >= 0)
+		values = {column: annotation.values[column][rows[annotated]] for column in ('Specimen_ID', 'Date_mean', 'Data_source', 'Location', 'Region')}
+		nulls = {column: annotation.nulls[column][rows[annotated]] for column in values}
+
+		excluded = nulls['Location'].copy()
+		for location in EXCLUDED_LOCATIONS:
+			excluded |= np.char.find(values['Location'], location) >= 0
+		kept = np.flatnonzero(~excluded)
+
+		specimens, specimen_codes = np.unique(values['Specimen_ID'][kept], return_inverse=True)
+		specimen_codes = np.where(nulls['Specimen_ID'][kept], len(specimens), specimen_codes)
+		priority = np.where(values['Data_source'][kept] == PREFERRED_DATA_SOURCE, 2, np.where(nulls['Data_source'][kept], 0, 1))
+		order = np.lexsort((kept, -priority, specimen_codes))
+		first = np.ones(len(order), dtype=bool)
+		first[1:] = specimen_codes[order][1:] != specimen_codes[order][:-1]
+		kept = np.sort(kept[order][first])
+		self.n_deduplicated = len(kept)
+
+		self.columns = read_only(annotated[kept])
+		self.dates, self.date_nulls = read_only(values['Date_mean'][kept]), read_only(nulls['Date_mean'][kept])
+		self.regions, self.region_nulls = read_only(values['Region'][kept]), read_only(nulls['Region'][kept])
+		self.default_key = binning_key(date_bins, region_groups)
+		self.default_binning = PanelBinning(self, *self.default_key)
+		self.binnings = {}
+		self.binnings_lock = threading.Lock()
+		self.frame = None
+
+	def binning(self, date_bins=DATE_BINS, region_groups=REGION_GROUPS):
+		key = binning_key(date_bins, region_groups)
+		if key == self.default_key:
+			return self.default_binning
+		with self.binnings_lock:
+			binning = self.binnings.pop(key, None) or PanelBinning(self, *key)
+			self.binnings[key] = binning
+			if len(self.binnings) > self.MAX_BINNINGS:
+				del self.binnings[next(iter(self.binnings))]
+		return binning
+
+	def sample_frame(self):
+		# Polars frames are built per process, on first use after any fork.
+		if self.frame is None:
+			self.frame = pl.DataFrame({'Genetic_ID': self.sample_names}).join(self.annotation.frame(), on='Genetic_ID', how='left')
+		return self.frame
+
+# === CLASS: Panel Binning ===
+# The region x time bin cell of each deduplicated sample that falls in a time bin, for one set of
+# time bins and region groups. Region code len(regions) collects samples outside the listed
+# groups, which only count towards the totals.
+class PanelBinning:
+	def __init__(self, panel, date_bins, region_groups):
+		bin_codes, self.labels = date_bin_codes(panel.dates, panel.date_nulls, date_bins)
+		self.regions = [label for label, _ in region_groups]
+		region_codes = np.full(len(bin_codes), len(self.regions), dtype=np.int64)
+		for i, (_, members) in enumerate(region_groups):
+			region_codes[np.isin(panel.regions, members) & ~panel.region_nulls] = i
+
+		binned = bin_codes >= 0
+		self.AF_columns = read_only(panel.columns[binned])
+		self.n_cells = (len(self.regions) + 1) * len(self.labels)
+		self.cells = read_only(region_codes[binned] * len(self.labels) + bin_codes[binned])
+
+sample_panels = {}
+
+def sample_panel(sample_names):
+	key = tuple(sample_names)
+	panel = sample_panels.get(key)
+	if panel is None:
+		panel = sample_panels[key] = SamplePanel(key, load_sample_annotation())
+	return panel
+
+# === FUNCTION: Decode Genotypes ===
+# Alt-allele dosage is the number of '1' alleles in the call; missing calls decode to -1.
+def genotype_dosages(GTs):
+	GTs = np.asarray(GTs, dtype=str)
+	return np.where(GTs == MISSING_GT, -1, np.char.count(GTs, '1'))
+
+# === FUNCTION: Bootstrap Allele Frequencies ===
+# Resampling a cell's n specimens with replacement only matters through how many of the draws
+# have each dosage (missing, 0, 1, 2), and those counts are multinomial with n trials and the
+# cell's dosage frequencies. So every replicate of every cell is drawn in one
+# Generator.multinomial call, whatever the number of specimens. The Total row adds up each
+# replicate's regions. dosages are in binning.AF_columns order. Returns (regions + Total, bins, 2)
+# interval bounds, NaN where no replicate has a called genotype.
+def bootstrap_AF_intervals(binning, dosages, replicates=BOOTSTRAP_REPLICATES, level=BOOTSTRAP_LEVEL, seed=BOOTSTRAP_SEED):
+	n_categories = int(dosages.max(initial=0)) + 2
+	categories = np.bincount(binning.cells * n_categories + dosages + 1, minlength=binning.n_cells * n_categories).reshape(binning.n_cells, n_categories)
+	sizes = categories.sum(axis=1)
+	occupied = np.flatnonzero(sizes)
+
+	draws = np.zeros((replicates, binning.n_cells, n_categories), dtype=np.int64)
+	rng = np.random.default_rng(seed)
+	draws[:, occupied] = rng.multinomial(sizes[occupied], categories[occupied] / sizes[occupied, None], size=(replicates, len(occupied)))
+	n_rows, n_bins = len(binning.regions) + 1, len(binning.labels)
+	draws = draws.reshape(replicates, n_rows, n_bins, n_categories)
+	draws = np.concatenate([draws[:, :-1], draws.sum(axis=1, keepdims=True)], axis=1)
+
+	called_counts = draws[..., 1:].sum(axis=-1)
+	alt_counts = draws[..., 1:] @ np.arange(n_categories - 1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		AFs = np.where(called_counts > 0, alt_counts / (2 * called_counts), np.nan)
+	with warnings.catch_warnings():
+		# Cells without any called genotype have no interval.
+		warnings.simplefilter('ignore', RuntimeWarning)
+		bounds = np.nanquantile(AFs, [(1 - level) / 2, (1 + level) / 2], axis=0)
+	return np.moveaxis(bounds, 0, -1)
+
+# === FUNCTION: Summarize Allele Frequencies ===
+def format_AF(n_samples, n_called, alt_count, interval=None):
+	if not n_samples:
+		return ""
+	total_alleles = 2 * n_called
+	AF = alt_count / total_alleles if total_alleles else None
+	if AF is not None and interval is not None and not np.isnan(interval).any():
+		return f"{round(AF, 4)} [{round(interval[0], 4)}, {round(interval[1], 4)}] ({n_called})"
+	return f"{round(AF, 4) if AF is not None else ''} ({n_called})"
+
+# replicates > 0 adds bootstrap confidence intervals to every cell, as "AF [lower, upper] (n)".
+def summarize_AFs(panel, dosages, date_bins=DATE_BINS, region_groups=REGION_GROUPS, replicates=0):
+	binning = panel.binning(date_bins, region_groups)
+	dosages = np.asarray(dosages)[binning.AF_columns]
+	called = dosages >= 0
+	n_rows, n_bins = len(binning.regions) + 1, len(binning.labels)
+	counts = np.stack([
+		np.bincount(binning.cells, minlength=binning.n_cells),
+		np.bincount(binning.cells[called], minlength=binning.n_cells),
+		np.bincount(binning.cells[called], weights=dosages[called], minlength=binning.n_cells).astype(np.int64)
+	], axis=-1).reshape(n_rows, n_bins, 3)
+	counts = np.concatenate([counts[:-1], counts.sum(axis=0, keepdims=True)])
+	intervals = bootstrap_AF_intervals(binning, dosages, replicates) if replicates else np.full((n_rows, n_bins, 2), np.nan)
+
+	output = []
+	for region, region_counts, region_intervals in zip(binning.regions + ['Total'], counts.tolist(), intervals):
+		row = {"Region": region}
+		for label, cell_counts, interval in zip(binning.labels, region_counts, region_intervals):
+			row[label] = format_AF(*cell_counts, interval=interval)
+		output.append(row)
+
+	return pl.DataFrame(output)
+
+# === FUNCTION: Retrieve Genotypes and Calculate Allele Frequencies ===
+def retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID, report=None, date_bins=DATE_BINS, region_groups=REGION_GROUPS, replicates=0):
+	try:
+		sample_names, GTs = genotype_store.fetch_variant_GTs(variant_chr, variant_rsID)
+
+		if GTs is not None:
+			if report:
+				report('Computing allele frequencies')
+			panel = sample_panel(sample_names)
+			with telemetry.span('annotation_join') as span:
+				sample_frame = panel.sample_frame()
+				GTs_df = sample_frame.with_columns(pl.Series('Genotype', GTs)).select(['Genetic_ID', 'Genotype'] + sample_frame.columns[1:])
+				span.set(rows=GTs_df.height)
+
+			archaic_GTs_dict = {archaic_name: GTs[column] for archaic_name, column in panel.archaic_columns}
+
+			with telemetry.span('AF_computation') as span:
+				summary_AFs_df = summarize_AFs(panel, genotype_dosages(GTs), date_bins, region_groups, replicates)
+				span.set(rows=panel.n_deduplicated)
+
+			return archaic_GTs_dict, GTs_df, summary_AFs_df
+
+		else:
+			print(f"Variant with rsID {variant_rsID} not found.")
+
+	except requests.exceptions.RequestException as e:
+		print(f"Error fetching VCF file: {str(e)}")
+	except Exception as e:
+		print(f"Error processing VCF file: {str(e)}")
+
+	return None, None, None
@@ -0,0 +1,294 @@
+# === Load Packages ===
+from AGV_catalog import get_AGV_catalog, lookup_AGV_by_rsID
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+from genotype_matrix import GENOTYPE_MATRIX_FORMATS, GENOTYPE_MATRIX_NAME, resolve_AGVs, stream_genotype_matrix
+from io import BytesIO
+from query_service import process_variant, query_AGV_LDVs, query_AGV_partners, retrieve_GTs_and_calculate_AFs
+from urllib.parse import urlencode
+from variants import process_chr
+import AGV_LD
+import allele_frequencies
+import base64
+import json
+import region_query
+import telemetry
+import zlib
+
+# === SETTINGS ===
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+NDJSON_BATCH_ROWS = 500
+FORMATS = {'ndjson': 'application/x-ndjson', 'arrow': 'application/vnd.apache.arrow.stream'}
+
+# === CLASS: API Error ===
+class APIError(Exception):
+	def __init__(self, message, status=400):
+		super().__init__(message)
+		self.message = message
+		self.status = status
+
+@api.errorhandler(APIError)
+def handle_api_error(error):
+	return jsonify({'error': error.message}), error.status
+
+# === UTILS ===
+def encode_cursor(offset):
+	return base64.urlsafe_b64encode(str(offset).encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+	if not cursor:
+		return 0
+	try:
+		offset = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii'))
+	except ValueError:
+		raise APIError('Invalid cursor.')
+	if offset < 0:
+		raise APIError('Invalid cursor.')
+	return offset
+
+# Region cursors are keys rather than offsets: "pos:n" resumes at LD variant position pos,
+# after the n proxies of that position already returned.
+def decode_region_cursor(cursor):
+	if not cursor:
+		return None
+	try:
+		pos, skip = (int(value) for value in base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii').split(':'))
+	except ValueError:
+		raise APIError('Invalid cursor.')
+	if pos < 1 or skip < 0:
+		raise APIError('Invalid cursor.')
+	return pos, skip
+
+def float_arg(name, default=None, minimum=None):
+	value = request.args.get(name)
+	if value in (None, ''):
+		return default
+	try:
+		value = float(value)
+	except ValueError:
+		raise APIError(f'{name} must be a number.')
+	if minimum is not None and not minimum <= value <= 1:
+		raise APIError(f'{name} must be between {minimum} and 1.')
+	return value
+
+def LD_filter_args():
+	ancestry_groups = [group for group in request.args.get('ancestry', '').split(',') if group]
+	unknown_groups = [group for group in ancestry_groups if group not in AGV_LD.ANCESTRY_GROUPS]
+	if unknown_groups:
+		raise APIError(f"Unknown ancestry groups: {', '.join(unknown_groups)}. Choose from {', '.join(AGV_LD.ANCESTRY_GROUPS)}.")
+	return {
+		'min_r2': float_arg('min_r2', AGV_LD.MIN_R2, AGV_LD.MIN_R2),
+		'min_D': float_arg('min_D', None, 0),
+		'ancestry_groups': ancestry_groups or None
+	}
+
+def AF_args():
+	try:
+		date_bins = allele_frequencies.parse_date_bins(request.args.get('bins'))
+		region_groups = allele_frequencies.parse_region_groups(request.args.get('regions'))
+	except ValueError as e:
+		raise APIError(str(e))
+	try:
+		replicates = int(request.args.get('replicates') or 0)
+	except ValueError:
+		raise APIError('replicates must be an integer.')
+	if not 0 <= replicates <= allele_frequencies.MAX_BOOTSTRAP_REPLICATES:
+		raise APIError(f'replicates must be between 0 and {allele_frequencies.MAX_BOOTSTRAP_REPLICATES}.')
+	return {'date_bins': date_bins, 'region_groups': region_groups, 'replicates': replicates}
+
+def variant_args():
+	input_chr, input_pos, input_rsID = request.args.get('chr'), request.args.get('pos'), request.args.get('rsID')
+	if bool(input_chr and input_pos) == bool(input_rsID):
+		raise APIError('Please provide either chr and pos OR rsID, not both.')
+	if input_pos and not input_pos.isdigit():
+		raise APIError('pos must be a positive integer.')
+	input_chr, error = process_chr(input_chr)
+	if error:
+		raise APIError(error)
+	return input_chr, input_pos, input_rsID
+
+# === FUNCTION: Stream Table ===
+# Pages a frame by limit/cursor and streams it as NDJSON or an Arrow IPC stream, gzip-encoded
+# when the client accepts it. Paging metadata is returned in headers.
+def gzip_chunks(chunks):
+	compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+	for chunk in chunks:
+		compressed = compressor.compress(chunk)
+		if compressed:
+			yield compressed
+	yield compressor.flush()
+
+def ndjson_chunks(df):
+	for batch in df.iter_slices(NDJSON_BATCH_ROWS):
+		yield ''.join(json.dumps(row) + '\n' for row in batch.iter_rows(named=True)).encode('utf-8')
+
+def format_arg():
+	output_format = request.args.get('format', 'ndjson')
+	if output_format not in FORMATS:
+		raise APIError(f"format must be one of {', '.join(FORMATS)}.")
+	return output_format
+
+def limit_arg(default=DEFAULT_LIMIT):
+	try:
+		limit = int(request.args.get('limit', default))
+	except ValueError:
+		raise APIError('limit must be an integer.')
+	if not 1 <= limit <= MAX_LIMIT:
+		raise APIError(f'limit must be between 1 and {MAX_LIMIT}.')
+	return limit
+
+def next_page_headers(headers, cursor):
+	headers['X-Next-Cursor'] = cursor
+	next_args = request.args.to_dict()
+	next_args['cursor'] = cursor
+	headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+
+def page_response(page, output_format, headers):
+	if output_format == 'arrow':
+		with telemetry.span('serialization', rows=page.height) as span:
+			buffer = BytesIO()
+			page.write_ipc_stream(buffer)
+			chunks = iter([buffer.getvalue()])
+			span.set(bytes=buffer.tell())
+	else:
+		# NDJSON is encoded as the response streams, after the Server-Timing header is sent.
+		chunks = telemetry.timed_chunks('serialization', ndjson_chunks(page), rows=page.height)
+
+	if 'gzip' in request.headers.get('Accept-Encoding', ''):
+		chunks = gzip_chunks(chunks)
+		headers['Content-Encoding'] = 'gzip'
+	headers['Vary'] = 'Accept-Encoding'
+	return Response(stream_with_context(chunks), mimetype=FORMATS[output_format], headers=headers)
+
+def table_response(df):
+	output_format = format_arg()
+	limit = limit_arg()
+	offset = decode_cursor(request.args.get('cursor'))
+
+	page = df.slice(offset, limit)
+	headers = {'X-Total-Count': str(df.height)}
+	if offset + limit < df.height:
+		next_page_headers(headers, encode_cursor(offset + limit))
+	return page_response(page, output_format, headers)
+
+# === ROUTE: LD Proxies ===
+@api.route('/proxies')
+def api_proxies():
+	input_chr, input_pos, input_rsID = variant_args()
+	filters = LD_filter_args()
+	variant_chr, _, _, _, _, _ = process_variant(input_chr, input_pos, input_rsID)
+	if not variant_chr:
+		raise APIError(f'Could not resolve a chromosome for {input_rsID}.', 404)
+
+	if input_rsID:
+		AGV_LDVs = query_AGV_LDVs(variant_chr, LDV_rsIDs=[input_rsID], **filters)
+	else:
+		AGV_LDVs = query_AGV_LDVs(variant_chr, LDV_positions=[input_pos], **filters)
+	return table_response(AGV_LDVs)
+
+# === ROUTE: LD Partners of an AGV ===
+@api.route('/partners')
+def api_partners():
+	input_chr, input_pos, input_rsID = variant_args()
+	filters = LD_filter_args()
+	variant_chr, variant_pos, _, _, _, is_AGV = process_variant(input_chr, input_pos, input_rsID)
+	if not is_AGV:
+		raise APIError(f'{input_rsID or f"chr{input_chr}:{input_pos}"} is not an AGV.', 404)
+	return table_response(query_AGV_partners(variant_chr, variant_pos, **filters))
+
+# === ROUTE: AGV ===
+@api.route('/agv/<rsID>')
+def api_AGV(rsID):
+	row = lookup_AGV_by_rsID(get_AGV_catalog(), rsID)
+	if row is None:
+		raise APIError(f'{rsID} is not an AGV.', 404)
+	return jsonify(row)
+
+# === ROUTE: Allele Frequencies ===
+@api.route('/af')
+def api_AFs():
+	input_chr, input_pos, input_rsID = variant_args()
+	AF_options = AF_args()
+	variant_chr, _, variant_rsID, _, _, is_AGV = process_variant(input_chr, input_pos, input_rsID)
+	if not is_AGV:
+		raise APIError('Allele frequencies are only available for AGVs.', 404)
+
+	_, _, AFs_summary_df = retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID, **AF_options)
+	if AFs_summary_df is None:
+		raise APIError(f'Genotypes for {variant_rsID} could not be retrieved.', 502)
+	return table_response(AFs_summary_df)
+
+# === ROUTE: Region ===
+def region_arg():
+	region_chr, start, end, error = region_query.parse_region(request.args.get('region'))
+	if error:
+		raise APIError(error)
+	return region_chr, start, end
+
+@api.route('/region/agvs')
+def api_region_AGVs():
+	region_chr, start, end = region_arg()
+	return table_response(region_query.query_region_AGVs(region_chr, start, end))
+
+# Large windows are paged by key: each page reads the index only from the cursor's position on,
+# so there is no total count.
+@api.route('/region/proxies')
+def api_region_proxies():
+	region_chr, start, end = region_arg()
+	filters = LD_filter_args()
+	output_format = format_arg()
+	limit = limit_arg()
+	after = decode_region_cursor(request.args.get('cursor'))
+
+	page, next_after = region_query.query_region_proxies(region_chr, start, end, after=after, limit=limit, **filters)
+	headers = {}
+	if next_after is not None:
+		next_pos, skip = next_after
+		next_page_headers(headers, encode_cursor(f'{next_pos}:{skip}'))
+	return page_response(page, output_format, headers)
+
+# === ROUTE: Genotype Matrix ===
+# AGV lists can be long, so they are also accepted in a POST body: a form field or a JSON object
+# with the same names as the query arguments, variants being a string or a list.
+def genotype_matrix_args():
+	args = request.get_json(silent=True) or request.values
+	variants = args.get('variants') or ''
+	if isinstance(variants, list):
+		variants = '\n'.join(str(variant) for variant in variants)
+
+	regions = args.get('regions') or []
+	if isinstance(regions, str):
+		regions = [region.strip() for region in regions.split(',') if region.strip()]
+	unknown_regions = [region for region in regions if region not in allele_frequencies.REGIONS]
+	if unknown_regions:
+		raise APIError(f"Unknown regions: {', '.join(unknown_regions)}. Choose from {', '.join(allele_frequencies.REGIONS)}.")
+
+	dates = {}
+	for name in ('min_date', 'max_date'):
+		value = args.get(name)
+		try:
+			dates[name] = int(value) if value not in (None, '') else None
+		except (TypeError, ValueError):
+			raise APIError(f'{name} must be an integer number of years BP.')
+	if dates['min_date'] is not None and dates['max_date'] is not None and dates['min_date'] > dates['max_date']:
+		raise APIError('min_date must not be greater than max_date.')
+
+	output_format = args.get('format') or 'plink'
+	if output_format not in GENOTYPE_MATRIX_FORMATS:
+		raise APIError(f"format must be one of {', '.join(GENOTYPE_MATRIX_FORMATS)}.")
+	return variants, regions, dates, output_format
+
+# AGVs are resolved before the response starts, so bad input is still a 400; the archive is then
+# streamed one chromosome at a time.
+@api.route('/genotypes', methods=['GET', 'POST'])
+def api_genotypes():
+	variants, regions, dates, output_format = genotype_matrix_args()
+	try:
+		by_chr, resolved = resolve_AGVs(variants)
+	except ValueError as e:
+		raise APIError(str(e))
+
+	chunks = stream_genotype_matrix(by_chr, resolved, regions=regions, output_format=output_format, **dates)
+	headers = {'Content-Disposition': f'attachment; filename={GENOTYPE_MATRIX_NAME}.{output_format}.zip'}
+	return Response(stream_with_context(chunks), mimetype='application/zip', headers=headers)
@@ -1,17 +1,51 @@
 # === Load Packages ===
-from dash import dash, dash_table, dcc, html
+from api import api
+from batch_query import parse_batch_input, query_batch, resolve_batch_variant
+from dash import ctx, dash, dash_table, dcc, html
 from dash.dependencies import Input, Output, State
-from io import BytesIO
+from genotype_matrix import GENOTYPE_MATRIX_MAX_VARIANTS, GENOTYPE_MATRIX_NAME, resolve_AGVs, stream_genotype_matrix
+from query_service import process_variant, query_AGV_partners
+from variants import process_chr
+import AGV_LD
+import allele_frequencies
+import background_jobs
+import base64
 import dash_bootstrap_components as dbc
-import gzip
-import json
-import pickle
 import polars as pl
-import requests
+import query_cache
+import region_query
+import result_store
+import table_paging
+import telemetry
+import variant_query
+import warmup
+
+# === UTILS ===
+def cancel_button_display(visible: bool) -> dict:
+	return {
+		'alignSelf': 'center',
+		'border-radius': '8px',
+		'display': 'inline-block' if visible else 'none',
+		'font-size': '16px',
+		'margin-top': '22px',
+		'padding': '5px 10px',
+		'width': '120px'
+	}
+
+# Column names of the AF table: "Present", or the bin's (lower-upper ka] interval.
+def AF_table_columns(date_bins):
+	columns = [{"name": "Region", "id": "Region"}]
+	for lower, upper, label in date_bins:
+		name = "Present" if lower == upper == 0 else f"{lower / 1000:g} ka" if lower == upper else f"({lower / 1000:g}-{upper / 1000:g} ka]"
+		columns.append({"name": name, "id": label})
+	return columns
 
 # === APP LAYOUT ===
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.BOOTSTRAP])
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.BOOTSTRAP], background_callback_manager=background_jobs.background_callback_manager())
 server = app.server
+server.register_blueprint(api)
+server.register_blueprint(telemetry.metrics)
+server.register_blueprint(warmup.readiness)
 
 app.layout = dbc.Container([
 	html.H1('Ancient Genotyped Variants Proxy Catalog'),
@@ -65,17 +99,51 @@ app.layout = dbc.Container([
 						}
 					),
 				], width='auto'),
+				dbc.Col([
+					dbc.Button(
+						children=[html.I(className="bi bi-x-circle"), " Cancel"],
+						id="cancel-button",
+						color="secondary",
+						size="sm",
+						style=cancel_button_display(False)
+					),
+				], width='auto'),
 				dbc.Col([
 					html.Div(id='AGV_message', children='', style={'alignSelf': 'center', 'color': 'green', 'margin-top': '20px', 'textAlign': 'center'})
 				], width='auto'),
-			], style={'margin-bottom': '20px'})
+			], style={'margin-bottom': '20px'}),
+			html.Div(
+				id='query_progress_container',
+				children=dbc.Progress(id='query_progress', value=0, label='', striped=True, animated=True, style={'height': '20px'}),
+				style={'display': 'none', 'margin-bottom': '20px'}
+			),
+			html.H6('LD Filters'),
+			dbc.Row([
+				dbc.Col([
+					html.P('Minimum r²', style={'margin-bottom': '4px'}),
+					dcc.Input(type='number', value=AGV_LD.MIN_R2, min=AGV_LD.MIN_R2, max=1, step=0.05, id='input_min_r2', style={'width': '10rem'}),
+				], width='auto', style={'margin-right': '15px'}),
+				dbc.Col([
+					html.P("Minimum D'", style={'margin-bottom': '4px'}),
+					dcc.Input(type='number', placeholder='0', min=0, max=1, step=0.05, id='input_min_D', style={'width': '10rem'}),
+				], width='auto', style={'margin-right': '15px'}),
+				dbc.Col([
+					html.P('Ancestry Groups', style={'margin-bottom': '4px'}),
+					dbc.Checklist(
+						id='input_ancestry_groups',
+						options=[{'label': label, 'value': group} for group, label in AGV_LD.ANCESTRY_GROUPS.items()],
+						value=list(AGV_LD.ANCESTRY_GROUPS),
+						inline=True
+					),
+				], width='auto'),
+			])
 		], width=12),
 	], style={'margin-bottom': '20px'}),
 	dbc.Row([
 		dbc.Col([
 			html.H3(id='AGV_summary_header', children='AGV Summary', style={'display': 'none'}),
 			html.P(
-				id='AGV_summary_description', children="The following tables present summary data on an AGV, including genotypes from four high-coverage archaic hominin genomes and allele frequencies of the AGV alternate allele across different regions over various time periods. Sample sizes for each region/time bin are provided next to the allele frequency in parentheses. Frequencies are calculated from a single sample per individual as some individuals in the AADR have multiple genotype calls from different sequencing approaches. Archaic hominins and reference sequences were excluded from allele frequency calculations. All genotype data, including hominins and reference sequences, are available when downloaded.",
+				id='AGV_summary_description', children="The following tables present summary data on an AGV, including genotypes from four high-coverage archaic hominin genomes and allele frequencies of the AGV alternate allele across different regions over various time periods. Sample sizes for each region/time bin are provided next to the allele frequency in parentheses. Frequencies are calculated from a single sample per individual as some individuals in the AADR have multiple genotype calls from different sequencing approaches. Archaic hominins and reference sequences were excluded from allele frequency calculations. The time bins and regions can be changed above the allele frequency table, and bootstrap confidence intervals, from resampling individuals within each region and time bin, can be added to every cell. All genotype data, including hominins and reference sequences, are available when downloaded.",
 				style={'display': 'none'}
 			),
 			dbc.Row([
@@ -162,6 +230,34 @@ app.layout = dbc.Container([
 			]),
 			html.H4(id='AGV_allele_frequencies_table_header', children='AGV Allele Frequencies through Time by Region', style={'display': 'none'}),
 			html.Div(id='AGV_allele_frequencies_table_container', children=[
+				dbc.Row([
+					dbc.Col([
+						html.P('Time Bin Edges (years BP)', style={'margin-bottom': '4px'}),
+						dcc.Input(type='text', value=', '.join(map(str, allele_frequencies.date_bin_edges(allele_frequencies.DATE_BINS))), id='input_date_bins', style={'width': '28rem'}),
+					], width='auto', style={'margin-right': '15px'}),
+					dbc.Col([
+						html.P('Region Groups', style={'margin-bottom': '4px'}),
+						dcc.Input(type='text', placeholder='e.g., Eurasia=Europe+West Asia+South Asia+East Asia; Africa', id='input_region_groups', style={'width': '28rem'}),
+					], width='auto', style={'margin-right': '15px'}),
+					dbc.Col([
+						dbc.Checklist(
+							id='input_AF_intervals',
+							options=[{'label': f'{allele_frequencies.BOOTSTRAP_LEVEL:.0%} bootstrap confidence intervals', 'value': 'bootstrap'}],
+							value=[],
+							switch=True
+						),
+					], width='auto', style={'margin-right': '15px'}),
+					dbc.Col([
+						dbc.Button(
+							children=[html.I(className="bi bi-arrow-repeat"), " Update"],
+							id="AF-update-button",
+							color="primary",
+							size="sm",
+							style={'border-radius': '8px', 'box-shadow': '2px 2px 5px rgba(0,0,0,0.2)', 'font-size': '16px', 'padding': '5px 10px'}
+						),
+					], width='auto'),
+				], align='end', style={'margin-top': '10px'}),
+				html.Div(id='AF_options_message', children='', style={'color': 'red', 'margin-top': '8px'}),
 				dash_table.DataTable(
 					id='AGV_allele_frequencies_table_results',
 					columns=[
@@ -207,7 +303,8 @@ app.layout = dbc.Container([
 			style={'display': 'none'})
 		])
 	]),
-	dcc.Store(id='all_genotypes_store', storage_type='session'),
+	dcc.Store(id='query_handle', storage_type='session'),
+	dcc.Store(id='batch_query_handle', storage_type='session'),
 	dbc.Row([
 		dbc.Col([
 			dbc.Button(
@@ -250,8 +347,13 @@ app.layout = dbc.Container([
 				],
 				data=[],
 				merge_duplicate_headers=True,
+				page_action='custom',
+				page_current=0,
 				page_size=10,
-				sort_action="native",
+				sort_action='custom',
+				sort_by=[],
+				filter_action='custom',
+				filter_query='',
 				style_cell={
 					'font-family': 'Arial, san-serif',
 					'font-size': '14px',
@@ -300,7 +402,356 @@ app.layout = dbc.Container([
 			),
 			dcc.Download(id="download-AGVs-csv")
 		], width=12, style={'display': 'flex', 'justifyContent': 'flex-end'})
-	], style={'margin-top': '10px', 'padding-bottom': '30px'})
+	], style={'margin-top': '10px', 'padding-bottom': '30px'}),
+	dcc.Store(id='partners_query_handle', storage_type='session'),
+	dbc.Row([
+		dbc.Col([
+			html.H3('Variants Tagged by an AGV'),
+			html.P("Enter an AGV as chromosome:position in hg38 reference coordinates (e.g., chr11:63290453) or as an rsID to list every variant in LD with it. The LD filters above apply."),
+			dbc.Row([
+				dbc.Col([
+					dcc.Input(type='text', placeholder='chr11:63290453', id='partners_input', style={'width': '20rem'}),
+				], width='auto', style={'margin-top': '15px'}),
+				dbc.Col([
+					dbc.Button(
+						children=[html.I(className="bi bi-search"), " Submit AGV"],
+						id="partners-submit-button",
+						color="primary",
+						size="sm",
+						style={
+							'border-radius': '8px',
+							'box-shadow': '2px 2px 5px rgba(0,0,0,0.2)',
+							'font-size': '16px',
+							'margin-top': '15px',
+							'padding': '5px 10px',
+							'width': '200px'
+						}
+					),
+				], width='auto'),
+				dbc.Col([
+					html.Div(id='partners_message', children='', style={'color': 'green', 'margin-top': '20px'})
+				], width='auto'),
+			]),
+			dash_table.DataTable(
+				id='AGV_partners_table',
+				columns=[
+					{"name": ["Ancient Genotyped Variant", "Chromosome"], "id": "chr"},
+					{"name": ["Ancient Genotyped Variant", "Position"], "id": "AGV_pos"},
+					{"name": ["Ancient Genotyped Variant", "rsID"], "id": "AGV_rsID"},
+					{"name": ["Variant in LD", "Position"], "id": "LDV_pos"},
+					{"name": ["Variant in LD", "Ref Allele"], "id": "LDV_ref"},
+					{"name": ["Variant in LD", "Alt Allele"], "id": "LDV_alt"},
+					{"name": ["Variant in LD", "rsID"], "id": "LDV_rsID"},
+					{"name": ["LD Information ℹ️", "Ancestry Groups"], "id": "populations"},
+					{"name": ["LD Information ℹ️", "r²"], "id": "r2"},
+					{"name": ["LD Information ℹ️", "D'"], "id": "D'"},
+					{"name": ["LD Information ℹ️", "Correlation"], "id": "corr"}
+				],
+				data=[],
+				merge_duplicate_headers=True,
+				page_action='custom',
+				page_current=0,
+				page_size=10,
+				sort_action='custom',
+				sort_by=[],
+				filter_action='custom',
+				filter_query='',
+				style_cell={
+					'font-family': 'Arial, san-serif',
+					'font-size': '14px',
+					'padding': '10px',
+					'textAlign': 'center'
+				},
+				style_header={
+					'font-family': 'Arial, san-serif',
+					'font-size': '16px',
+					'fontWeight': 'bold',
+					'textAlign': 'center'
+				},
+				style_header_conditional=[
+					{'if': {'header_index': 1}, 'fontWeight': 'normal', 'font-size': '14px'}
+				],
+				style_table={'margin-top': '20px', 'overflowX': 'auto'},
+				tooltip_header={
+					"populations": "LD metrics are displayed in the same order as ancestry groups",
+					"r2": "LD metrics are displayed in the same order as ancestry groups",
+					"D'": "LD metrics are displayed in the same order as ancestry groups",
+					"corr": "LD metrics are displayed in the same order as ancestry groups"
+				},
+				tooltip_delay=0,
+				tooltip_duration=None
+			)
+		], width=12)
+	], style={'padding-bottom': '30px'}),
+	dbc.Row([
+		dbc.Col([
+			html.H3('Batch Query'),
+			html.P("Enter a list of variants as chromosome:position in hg38 reference coordinates (e.g., chr11:63290453) and/or rsIDs, separated by commas or new lines, or upload a text file. Variants are grouped by chromosome and the LD filters above apply to all of them. Each query variant's status is reported and all AGVs in LD are combined into one table."),
+			dcc.Textarea(id='batch_input', placeholder='chr11:63290453\nrs1790218', style={'height': '120px', 'width': '100%'}),
+			dcc.Upload(
+				id='batch_upload',
+				children=html.Div(['Drag and drop or ', html.A('select a file', style={'color': 'blue', 'textDecoration': 'underline'})]),
+				style={'border': '1px dashed #adb5bd', 'border-radius': '8px', 'margin-top': '10px', 'padding': '10px', 'textAlign': 'center', 'width': '100%'}
+			),
+			dbc.Row([
+				dbc.Col([
+					dbc.Button(
+						children=[html.I(className="bi bi-search"), " Submit Batch"],
+						id="batch-submit-button",
+						color="primary",
+						size="sm",
+						style={
+							'border-radius': '8px',
+							'box-shadow': '2px 2px 5px rgba(0,0,0,0.2)',
+							'font-size': '16px',
+							'margin-top': '15px',
+							'padding': '5px 10px',
+							'width': '200px'
+						}
+					),
+				], width='auto'),
+				dbc.Col([
+					html.Div(id='batch_message', children='', style={'color': 'green', 'margin-top': '20px'})
+				], width='auto'),
+			]),
+			dash_table.DataTable(
+				id='batch_status_table',
+				columns=[
+					{"name": "Query Variant", "id": "query_variant"},
+					{"name": "Chromosome", "id": "chr"},
+					{"name": "Position", "id": "pos"},
+					{"name": "rsID", "id": "rsID"},
+					{"name": "AGVs in LD", "id": "n_proxies"},
+					{"name": "Status", "id": "status"}
+				],
+				data=[],
+				page_size=10,
+				sort_action="native",
+				style_cell={
+					'font-family': 'Arial, san-serif',
+					'font-size': '14px',
+					'padding': '8px',
+					'textAlign': 'center'
+				},
+				style_header={
+					'backgroundColor': '#f8f9fa',
+					'fontWeight': 'bold',
+					'textAlign': 'center'
+				},
+				style_table={'margin-top': '20px', 'overflowX': 'auto'}
+			),
+			dash_table.DataTable(
+				id='batch_proxies_table',
+				columns=[{"name": ["Query", "Query Variant"], "id": "query_variant"}] + [
+					{"name": ["Variant of Interest", "Chromosome"], "id": "chr"},
+					{"name": ["Variant of Interest", "Position"], "id": "LDV_pos"},
+					{"name": ["Variant of Interest", "rsID"], "id": "LDV_rsID"},
+					{"name": ["Ancient Genotyped Variant", "Position"], "id": "AGV_pos"},
+					{"name": ["Ancient Genotyped Variant", "rsID"], "id": "AGV_rsID"},
+					{"name": ["LD Information ℹ️", "Ancestry Groups"], "id": "populations"},
+					{"name": ["LD Information ℹ️", "r²"], "id": "r2"},
+					{"name": ["LD Information ℹ️", "D'"], "id": "D'"},
+					{"name": ["LD Information ℹ️", "Correlation"], "id": "corr"}
+				],
+				data=[],
+				merge_duplicate_headers=True,
+				page_size=10,
+				sort_action="native",
+				style_cell={
+					'font-family': 'Arial, san-serif',
+					'font-size': '14px',
+					'padding': '10px',
+					'textAlign': 'center'
+				},
+				style_header={
+					'font-family': 'Arial, san-serif',
+					'font-size': '16px',
+					'fontWeight': 'bold',
+					'textAlign': 'center'
+				},
+				style_header_conditional=[
+					{'if': {'header_index': 1}, 'fontWeight': 'normal', 'font-size': '14px'}
+				],
+				style_table={'margin-top': '20px', 'overflowX': 'auto'}
+			)
+		], width=12)
+	]),
+	dbc.Row([
+		dbc.Col([
+			dbc.Button(
+				children=[html.I(className="bi bi-download"), " Download Batch AGVs"],
+				id="download-batch-button",
+				color="primary",
+				size="md",
+				style={
+					'font-size': '16px',
+					'width': '200px',
+					'display': 'none',
+					'margin-top': '20px',
+					'textAlign': 'center',
+				}
+			),
+			dcc.Download(id="download-batch-csv")
+		], width=12, style={'display': 'flex', 'justifyContent': 'flex-end'})
+	], style={'margin-top': '10px', 'padding-bottom': '30px'}),
+	dbc.Row([
+		dbc.Col([
+			html.H3('AGV Genotype Matrix'),
+			html.P(f"Enter up to {GENOTYPE_MATRIX_MAX_VARIANTS:,} AGVs as chromosome:position in hg38 reference coordinates and/or rsIDs, separated by commas or new lines, to download their genotypes for the ancient samples in the chosen regions and time window (the samples used for allele frequencies). PLINK files pack the dosages of the alt allele (A1); Arrow files have one row per AGV and one column per sample, with -1 for missing genotypes. Both come with a sample annotation table and a status table for the query variants."),
+			dcc.Textarea(id='genotype_matrix_input', placeholder='chr11:63290453\nrs1790218', style={'height': '120px', 'width': '100%'}),
+			dbc.Row([
+				dbc.Col([
+					html.P('Regions', style={'margin-bottom': '4px'}),
+					dbc.Checklist(
+						id='genotype_matrix_regions',
+						options=[{'label': region, 'value': region} for region in allele_frequencies.REGIONS],
+						value=list(allele_frequencies.REGIONS),
+						inline=True
+					),
+				], width='auto', style={'margin-right': '15px'}),
+				dbc.Col([
+					html.P('Date Range (years BP)', style={'margin-bottom': '4px'}),
+					dcc.Input(type='number', placeholder='min', min=0, step=1, id='genotype_matrix_min_date', style={'width': '8rem', 'margin-right': '8px'}),
+					dcc.Input(type='number', placeholder='max', min=0, step=1, id='genotype_matrix_max_date', style={'width': '8rem'}),
+				], width='auto', style={'margin-right': '15px'}),
+				dbc.Col([
+					html.P('Format', style={'margin-bottom': '4px'}),
+					dbc.RadioItems(
+						id='genotype_matrix_format',
+						options=[{'label': 'PLINK (.bed/.bim/.fam)', 'value': 'plink'}, {'label': 'Arrow', 'value': 'arrow'}],
+						value='plink',
+						inline=True
+					),
+				], width='auto'),
+			], style={'margin-top': '10px'}),
+			dbc.Row([
+				dbc.Col([
+					dbc.Button(
+						children=[html.I(className="bi bi-download"), " Download Genotypes"],
+						id="genotype-matrix-button",
+						color="primary",
+						size="sm",
+						style={
+							'border-radius': '8px',
+							'box-shadow': '2px 2px 5px rgba(0,0,0,0.2)',
+							'font-size': '16px',
+							'margin-top': '15px',
+							'padding': '5px 10px',
+							'width': '220px'
+						}
+					),
+				], width='auto'),
+				dbc.Col([
+					html.Div(id='genotype_matrix_message', children='', style={'color': 'green', 'margin-top': '20px'})
+				], width='auto'),
+			]),
+			dcc.Download(id="download-genotype-matrix")
+		], width=12)
+	], style={'padding-bottom': '30px'}),
+	dcc.Store(id='region_query_state'),
+	dbc.Row([
+		dbc.Col([
+			html.H3('Region Query'),
+			html.P(f"Enter a genomic region as chromosome:start-end in hg38 reference coordinates (e.g., chr11:63200000-63300000), spanning at most {region_query.REGION_MAX_BP:,} bp. AGVs inside the region are listed first, followed by every variant in the region that is in LD with an AGV; the LD filters above apply. Variants in LD are ordered by position and shown one page at a time."),
+			dbc.Row([
+				dbc.Col([
+					dcc.Input(type='text', placeholder='chr11:63200000-63300000', id='region_input', style={'width': '20rem'}),
+				], width='auto', style={'margin-top': '15px'}),
+				dbc.Col([
+					dbc.Button(
+						children=[html.I(className="bi bi-search"), " Submit Region"],
+						id="region-submit-button",
+						color="primary",
+						size="sm",
+						style={
+							'border-radius': '8px',
+							'box-shadow': '2px 2px 5px rgba(0,0,0,0.2)',
+							'font-size': '16px',
+							'margin-top': '15px',
+							'padding': '5px 10px',
+							'width': '200px'
+						}
+					),
+				], width='auto'),
+				dbc.Col([
+					html.Div(id='region_message', children='', style={'color': 'green', 'margin-top': '20px'})
+				], width='auto'),
+			]),
+			html.H4('AGVs in Region', style={'margin-top': '20px'}),
+			dash_table.DataTable(
+				id='region_AGVs_table',
+				columns=[
+					{"name": "Chromosome", "id": "chr"},
+					{"name": "Position", "id": "pos"},
+					{"name": "rsID", "id": "rsID"},
+					{"name": "Ref Allele", "id": "ref"},
+					{"name": "Alt Allele", "id": "alt"}
+				],
+				data=[],
+				page_size=10,
+				style_cell={
+					'font-family': 'Arial, san-serif',
+					'font-size': '14px',
+					'padding': '8px',
+					'textAlign': 'center'
+				},
+				style_header={
+					'backgroundColor': '#f8f9fa',
+					'fontWeight': 'bold',
+					'textAlign': 'center'
+				},
+				style_table={'margin-top': '10px', 'overflowX': 'auto'}
+			),
+			html.H4('Variants in Region in LD with AGVs', style={'margin-top': '20px'}),
+			dash_table.DataTable(
+				id='region_proxies_table',
+				columns=[
+					{"name": ["Variant in Region", "Chromosome"], "id": "chr"},
+					{"name": ["Variant in Region", "Position"], "id": "LDV_pos"},
+					{"name": ["Variant in Region", "Ref Allele"], "id": "LDV_ref"},
+					{"name": ["Variant in Region", "Alt Allele"], "id": "LDV_alt"},
+					{"name": ["Variant in Region", "rsID"], "id": "LDV_rsID"},
+					{"name": ["Ancient Genotyped Variant", "Position"], "id": "AGV_pos"},
+					{"name": ["Ancient Genotyped Variant", "Ref Allele"], "id": "AGV_ref"},
+					{"name": ["Ancient Genotyped Variant", "Alt Allele"], "id": "AGV_alt"},
+					{"name": ["Ancient Genotyped Variant", "rsID"], "id": "AGV_rsID"},
+					{"name": ["LD Information ℹ️", "Ancestry Groups"], "id": "populations"},
+					{"name": ["LD Information ℹ️", "r²"], "id": "r2"},
+					{"name": ["LD Information ℹ️", "D'"], "id": "D'"},
+					{"name": ["LD Information ℹ️", "Correlation"], "id": "corr"}
+				],
+				data=[],
+				merge_duplicate_headers=True,
+				page_action='custom',
+				page_current=0,
+				page_size=region_query.REGION_PAGE_ROWS,
+				style_cell={
+					'font-family': 'Arial, san-serif',
+					'font-size': '14px',
+					'padding': '10px',
+					'textAlign': 'center'
+				},
+				style_header={
+					'font-family': 'Arial, san-serif',
+					'font-size': '16px',
+					'fontWeight': 'bold',
+					'textAlign': 'center'
+				},
+				style_header_conditional=[
+					{'if': {'header_index': 1}, 'fontWeight': 'normal', 'font-size': '14px'}
+				],
+				style_table={'margin-top': '10px', 'overflowX': 'auto'},
+				tooltip_header={
+					"populations": "LD metrics are displayed in the same order as ancestry groups",
+					"r2": "LD metrics are displayed in the same order as ancestry groups",
+					"D'": "LD metrics are displayed in the same order as ancestry groups",
+					"corr": "LD metrics are displayed in the same order as ancestry groups"
+				},
+				tooltip_delay=0,
+				tooltip_duration=None
+			)
+		], width=12)
+	], style={'padding-bottom': '30px'})
 ])
 
 # === MAIN CALLBACK ===
@@ -315,125 +766,74 @@ app.layout = dbc.Container([
 	Output('archaic_genotypes_table_results', 'data'),
 	Output('AGV_allele_frequencies_table_container', 'style'),
 	Output('AGV_allele_frequencies_table_header', 'style'),
-	Output('AGV_allele_frequencies_table_results', 'data'),
-	Output('all_genotypes_store', 'data'),
-	Output('AGVs_in_LD_table', 'data'),
+	Output('query_handle', 'data'),
 	Input('submit-button', 'n_clicks'),
 	State('input_chr', 'value'),
 	State('input_pos', 'value'),
-	State('input_rsID', 'value')
+	State('input_rsID', 'value'),
+	State('input_min_r2', 'value'),
+	State('input_min_D', 'value'),
+	State('input_ancestry_groups', 'value'),
+	background=True,
+	running=[
+		(Output('submit-button', 'disabled'), True, False),
+		(Output('cancel-button', 'style'), cancel_button_display(True), cancel_button_display(False)),
+		(Output('query_progress_container', 'style'), {'display': 'block', 'margin-bottom': '20px'}, {'display': 'none'})
+	],
+	progress=[Output('query_progress', 'value'), Output('query_progress', 'label')],
+	progress_default=[0, ''],
+	cancel=[Input('cancel-button', 'n_clicks')],
+	prevent_initial_call=True
 )
 
 # === FUNCTION: Run App ===
-def query_AGVs(n_clicks, input_chr, input_pos, input_rsID):
+@telemetry.traced('query_AGVs')
+def query_AGVs(set_progress, n_clicks, input_chr, input_pos, input_rsID, min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None):
 	if n_clicks:
+		report = background_jobs.stage_reporter(set_progress, variant_query.QUERY_STAGES)
+		report('Resolving variant')
 		if (input_chr and input_pos and input_rsID) or (not input_chr and not input_pos and not input_rsID):
-			return "Please enter either chromosome and position OR rsID, not both.", {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, [], [], []
+			return "Please enter either chromosome and position OR rsID, not both.", {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, []
 
 		input_chr, error = process_chr(input_chr)
 		if error:
-			return error, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, [], [], []
-
-		variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV = process_variant(input_chr, input_pos, input_rsID)
+			return error, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, []
 
-		AGV_data, archaic_GTs, AFs_summary, all_GTs = [], [], [], []
-		sorted_AGV_LDVs = pl.DataFrame()
+		if not input_rsID and not (input_chr and input_pos):
+			return "Unexpected error with input validation.", {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, []
 
-		if is_AGV:
-			archaic_GTs_df, all_GTs_df, AFs_summary_df = retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID)
-			if AFs_summary_df is not None:
-				AGV_data = [{"AGV_chr": variant_chr, "AGV_pos": variant_pos, "AGV_rsID": variant_rsID, "AGV_ref": variant_ref, "AGV_alt": variant_alt}]
-				archaic_GTs = [archaic_GTs_df]
-				all_GTs = all_GTs_df.to_dicts()
-				AFs_summary = AFs_summary_df.to_dicts()
-
-		with open('files/AGVs_Box_URLs.json', 'r') as AGVs_URLs:
-			AGVs_URLs_dict = json.load(AGVs_URLs)
-		AGV_chr_URL = AGVs_URLs_dict.get(f'chr{variant_chr}')
+		variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV = process_variant(input_chr, input_pos, input_rsID)
 
 		try:
-			response = requests.get(f'https://ucsf.box.com/shared/static/{AGV_chr_URL}.gz', stream=True)
-			response.raise_for_status()
-
-			with BytesIO(response.content) as file:
-				with gzip.GzipFile(fileobj=file) as gz_file:
-					AGV_LDVs = pl.scan_csv(gz_file, separator='\t', has_header=True, low_memory=True)
-
-					if input_rsID:
-						filtered_AGV_LDVs = AGV_LDVs.filter(pl.col('LDV_rsID') == input_rsID)
-					elif input_chr and input_pos:
-						chr_int = int(input_chr)
-						pos_int = int(input_pos)
-						filtered_AGV_LDVs = AGV_LDVs.filter((pl.col("chr") == chr_int) & (pl.col("LDV_pos") == pos_int))
-					else:
-						return "Unexpected error with input validation.", {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], [], []
-
-					df = filtered_AGV_LDVs.sort('r2', descending=True).collect()
-
-					#sorted_AGV_LDVs = filtered_AGV_LDVs.sort("r2", descending=True).collect() # original code
-
-					# new block that filters out results with r2 <= 0.5
-					sorted_AGV_LDVs = (
-						filtered_AGV_LDVs
-						.sort('r2', descending=True)
-						.collect()
-						.with_columns([
-							pl.col('r2').str.split(',').list.eval(pl.element().cast(pl.Float64)),
-							pl.col('populations').str.split(','),
-							pl.col("D'").str.split(',').list.eval(pl.element().cast(pl.Float64)),
-							pl.col('corr').str.split(',').list.eval(
-								pl.when(pl.element().is_in(["+", "-"]))
-								.then(None)
-								.otherwise(pl.element())
-								.cast(pl.Float64)
-							),
-						])
-						.filter(
-							pl.col('r2').list.eval(pl.element() >= 0.5).list.any()
-						)
-						.with_columns([
-							pl.struct(['populations', 'r2', "D'", 'corr']).map_elements(
-								lambda row: {
-									'populations': [p for r, p in zip(row['r2'], row['populations']) if r >= 0.5],
-									'r2': [r for r in row['r2'] if r >= 0.5],
-									"D'": [d for r, d in zip(row['r2'], row["D'"]) if r >= 0.5],
-									'corr': [c for r, c in zip(row['r2'], row['corr']) if r >= 0.5]
-								},
-								return_dtype=pl.Struct([
-									pl.Field('populations', pl.List(pl.Utf8)),
-									pl.Field('r2', pl.List(pl.Float64)),
-									pl.Field("D'", pl.List(pl.Float64)),
-									pl.Field('corr', pl.List(pl.Float64)),
-								])
-							).struct.unnest()
-						])
-						.with_columns([
-							pl.col("populations").list.join(", ").alias("populations"),
-							pl.col("r2").list.eval(pl.element().cast(pl.Utf8)).list.join(", ").alias("r2"),
-							pl.col("D'").list.eval(pl.element().cast(pl.Utf8)).list.join(", ").alias("D'"),
-							pl.col("corr").list.eval(pl.element().cast(pl.Utf8)).list.join(", ").alias("corr"),
-						])
-					)
-					del AGV_LDVs, filtered_AGV_LDVs
+			report('Checking cached results')
+			key = query_cache.query_key(variant_chr, variant_pos, variant_rsID, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
+			query_handle, results = query_cache.cached_query(key, lambda: variant_query.run_variant_query(variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV, min_r2, min_D, ancestry_groups, report=report))
+
+			AGV_data = results['AGV'].to_dicts() if 'AGV' in results else []
+			archaic_GTs = results['archaic'].to_dicts() if 'archaic' in results else []
+			sorted_AGV_LDVs = results.get('proxies', pl.DataFrame())
+			errors = results['errors']['error'].to_list() if 'errors' in results else []
+			if errors and 'AFs' not in results and sorted_AGV_LDVs.height == 0:
+				return (f"An error occurred: {' '.join(errors)}", {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'block'}, [])
 
 			if is_AGV:
 				if sorted_AGV_LDVs.height > 0:
 					message = (f"Variant {input_chr}:{input_pos} is an AGV and LD proxies were found. Both AGV summary results and LD proxies are displayed below." if input_chr and input_pos else f"Variant {input_rsID} is an AGV and LD proxies were found. Both AGV summary results and LD proxies are displayed below.")
-					return (message, {'display': 'block'}, {'display': 'block'}, AGV_data, {'display': 'block'}, {'display': 'block'}, {'display': 'block'}, archaic_GTs, {'display': 'block'}, {'display': 'block'}, AFs_summary, all_GTs, sorted_AGV_LDVs.to_dicts())
+					return (' '.join([message] + errors), {'display': 'block'}, {'display': 'block'}, AGV_data, {'display': 'block'}, {'display': 'block'}, {'display': 'block'}, archaic_GTs, {'display': 'block'}, {'display': 'block'}, query_handle)
 				else:
 					message = (f"Variant {input_chr}:{input_pos} is an AGV and summary results are displayed below. However, no LD proxies found." if input_chr and input_pos else f"Variant {input_rsID} is an AGV and summary results are displayed below. However, no LD proxies found.")
-					return (message, {'display': 'block'}, {'display': 'block'}, AGV_data, {'display': 'block'}, {'display': 'block'}, {'display': 'block'}, archaic_GTs, {'display': 'block'}, {'display': 'block'}, AFs_summary, all_GTs, [])
+					return (' '.join([message] + errors), {'display': 'block'}, {'display': 'block'}, AGV_data, {'display': 'block'}, {'display': 'block'}, {'display': 'block'}, archaic_GTs, {'display': 'block'}, {'display': 'block'}, query_handle)
 
 			else:
 				if sorted_AGV_LDVs.height > 0:
 					message = (f"Variant {input_chr}:{input_pos} is not an AGV, but LD proxies were found and are displayed below." if input_chr and input_pos else f"Variant {input_rsID} is not an AGV, but LD proxies were found and are displayed below.")
-					return (message, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, [], [], sorted_AGV_LDVs.to_dicts())
+					return (' '.join([message] + errors), {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, query_handle)
 
 		except Exception as e:
-			return (f"An error occurred: {str(e)}", {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'block'}, [], [], [])
+			return (f"An error occurred: {str(e)}", {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'none'}, {'display': 'none'}, [], {'display': 'none'}, {'display': 'block'}, [])
 
 	else:
-		return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+		return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
 # === UTILS ===
 def download_button_display(visible: bool) -> dict:
@@ -445,6 +845,62 @@ def download_button_display(visible: bool) -> dict:
 		'width': '200px'
 	}
 
+# === CALLBACK: Page AGVs in LD ===
+# The proxies stay in the result store; each page turn, sort or filter reads them by query handle
+# and sends only the visible rows. A new query handle starts again from the first page.
+@app.callback(
+	Output('AGVs_in_LD_table', 'data'),
+	Output('AGVs_in_LD_table', 'page_current'),
+	Output('AGVs_in_LD_table', 'page_count'),
+	Input('query_handle', 'data'),
+	Input('AGVs_in_LD_table', 'page_current'),
+	Input('AGVs_in_LD_table', 'page_size'),
+	Input('AGVs_in_LD_table', 'sort_by'),
+	Input('AGVs_in_LD_table', 'filter_query'),
+	prevent_initial_call=True
+)
+
+def page_AGVs_in_LD(query_handle, page_current, page_size, sort_by, filter_query):
+	df = result_store.get_result(query_handle, 'proxies')
+	if df is None:
+		return [], 0, 1
+	if ctx.triggered_id == 'query_handle':
+		page_current = 0
+	page, page_current, page_count = table_paging.page_table(df, page_current, page_size, sort_by, filter_query)
+	return page.to_dicts(), page_current, page_count
+
+# === CALLBACK: AGV Allele Frequencies ===
+# Recomputed from the genotypes in the result store, so changing the time bins, region groups or
+# confidence intervals does not rerun the query.
+@app.callback(
+	Output('AGV_allele_frequencies_table_results', 'columns'),
+	Output('AGV_allele_frequencies_table_results', 'data'),
+	Output('AF_options_message', 'children'),
+	Input('query_handle', 'data'),
+	Input('AF-update-button', 'n_clicks'),
+	State('input_date_bins', 'value'),
+	State('input_region_groups', 'value'),
+	State('input_AF_intervals', 'value'),
+	prevent_initial_call=True
+)
+
+def summarize_AGV_AFs(query_handle, n_clicks, date_bins_text, region_groups_text, intervals):
+	GTs_df = result_store.get_result(query_handle, 'genotypes') if query_handle else None
+	if GTs_df is None:
+		return dash.no_update, [], ''
+	try:
+		date_bins = allele_frequencies.parse_date_bins(date_bins_text)
+		region_groups = allele_frequencies.parse_region_groups(region_groups_text)
+	except ValueError as e:
+		return dash.no_update, dash.no_update, str(e)
+
+	replicates = allele_frequencies.BOOTSTRAP_REPLICATES if intervals else 0
+	with telemetry.span('AF_computation') as span:
+		panel = allele_frequencies.sample_panel(GTs_df['Genetic_ID'].to_list())
+		AFs_df = allele_frequencies.summarize_AFs(panel, allele_frequencies.genotype_dosages(GTs_df['Genotype'].to_numpy()), date_bins, region_groups, replicates)
+		span.set(rows=panel.n_deduplicated)
+	return AF_table_columns(date_bins), AFs_df.to_dicts(), ''
+
 # === CALLBACK: Show/hide download buttons ===
 @app.callback(
 	Output('download-AGVs-button', 'style'),
@@ -460,13 +916,13 @@ def toggle_download_buttons(ld_table_data, genotype_table_data):
 @app.callback(
 	Output('download-genotypes-csv', 'data'),
 	Input('download-genotypes-button', 'n_clicks'),
-	State('all_genotypes_store', 'data'),
+	State('query_handle', 'data'),
 	prevent_initial_call=True
 )
 
-def download_AGV_genotypes(n_clicks, genotype_data):
-	if n_clicks and genotype_data:
-		df = pl.DataFrame(genotype_data)
+def download_AGV_genotypes(n_clicks, query_handle):
+	df = result_store.get_result(query_handle, 'genotypes') if n_clicks else None
+	if df is not None:
 		return dcc.send_string(df.write_csv(), filename="AGV_genotypes.csv")
 	return dash.no_update
 
@@ -474,220 +930,209 @@ def download_AGV_genotypes(n_clicks, genotype_data):
 @app.callback(
 	Output('download-AGVs-csv', 'data'),
 	Input('download-AGVs-button', 'n_clicks'),
-	State('AGVs_in_LD_table', 'data'),
+	State('query_handle', 'data'),
 	prevent_initial_call=True
 )
 
-def download_AGVs(n_clicks, AGVs_data):
-	if n_clicks and AGVs_data:
-		df = pl.DataFrame(AGVs_data)
+def download_AGVs(n_clicks, query_handle):
+	df = result_store.get_result(query_handle, 'proxies') if n_clicks else None
+	if df is not None:
 		return dcc.send_string(df.write_csv(), filename="AGVs_in_LD.csv")
 	return dash.no_update
 
-# === FUNCTION: Process Chromosome ===
-def process_chr(input_chr):
-	if input_chr:
-		if input_chr.lower().startswith('chr'):
-			input_chr = input_chr[3:]
-
-		if input_chr not in map(str, range(1, 23)) and input_chr != 'X':
-			return None, f"Invalid chromosome: {input_chr}. Chromosome must be between 1-22 or X."
-
-	return input_chr, None
-
-# === FUNCTION: Process Variant ===
-def load_AGVs():
-	with gzip.open('files/AGVs_hg38.txt.gz', 'rt') as f:
-		df = pl.read_csv(f, separator='\t', has_header=False, schema_overrides={'column_1': pl.Utf8})
-	df.columns = ['chr', 'pos', 'rsID', 'ref', 'alt']
-	return df
-
-def lookup_AGV_by_chr_pos(df, chr, pos):
-	pos_int = int(pos)
-	filtered = df.filter((pl.col("chr") == chr) & (pl.col("pos") == pos_int))
-	if filtered.height > 0:
-		return filtered.row(0, named=True)
-	return None
-
-def lookup_AGV_by_rsID(df, rsID):
-	filtered = df.filter(pl.col("rsID") == rsID)
-	if filtered.height > 0:
-		return filtered.row(0, named=True)
-	return None
-
-def lookup_chr_for_rsID_external(rsID):
-	pickle_url = 'https://ucsf.box.com/shared/static/qlx2f1ncqgx7kug6kem3p93vbb4ljg8e.pkl'
+# === CALLBACK: LD partners of an AGV ===
+@app.callback(
+	Output('partners_message', 'children'),
+	Output('partners_query_handle', 'data'),
+	Input('partners-submit-button', 'n_clicks'),
+	State('partners_input', 'value'),
+	State('input_min_r2', 'value'),
+	State('input_min_D', 'value'),
+	State('input_ancestry_groups', 'value'),
+	prevent_initial_call=True
+)
+
+def query_partners(n_clicks, partners_text, min_r2, min_D, ancestry_groups):
+	tokens = parse_batch_input(partners_text)
+	if len(tokens) != 1:
+		return "Please enter one AGV as chromosome:position or rsID.", None
+	variant = resolve_batch_variant(tokens[0])
+	if variant['status'] is not None:
+		return f"{tokens[0]}: {variant['status']}.", None
+	if not variant['is_AGV']:
+		return f"{tokens[0]} is not an AGV.", None
 	try:
-		response = requests.get(pickle_url, stream=True)
-		response.raise_for_status()
-		with BytesIO(response.content) as compressed_file:
-			with gzip.GzipFile(fileobj=compressed_file) as gz_file:
-				rsID_chr_map = pickle.load(gz_file)
-		return str(rsID_chr_map.get(rsID))
+		partners = query_AGV_partners(variant['chr'], variant['pos'], min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
 	except Exception as e:
-		print(f"Error loading rsID to chr lookup: {e}")
-		return None
-
-def process_variant(input_chr=None, input_pos=None, input_rsID=None):
-	df = load_AGVs()
-
-	variant_chr = variant_pos = variant_rsID = variant_ref = variant_alt = None
-	is_AGV = False
-
-	if input_chr and input_pos:
-		row = lookup_AGV_by_chr_pos(df, input_chr, input_pos)
-		if row:
-			variant_chr = row['chr']
-			variant_pos = row['pos']
-			variant_rsID = row['rsID']
-			variant_ref = row['ref']
-			variant_alt = row['alt']
-			is_AGV = True
-		else:
-			variant_chr = input_chr
-			variant_pos = input_pos
-
-	elif input_rsID:
-		row = lookup_AGV_by_rsID(df, input_rsID)
-		if row:
-			variant_chr = row['chr']
-			variant_pos = row['pos']
-			variant_rsID = row['rsID']
-			variant_ref = row['ref']
-			variant_alt = row['alt']
-			is_AGV = True
-		else:
-			variant_chr = lookup_chr_for_rsID_external(input_rsID)
-			variant_rsID = input_rsID
-
-	return variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV
-
-# === FUNCTION: Retrieve Genotypes and Calculate Allele Frequencies ===
-def retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID):
-	try:
-		with open('files/VCFs_Box_URLs.json', 'r') as VCFs_URLs:
-			VCFs_URLs_dict = json.load(VCFs_URLs)
-		VCFs_chr_URL = VCFs_URLs_dict.get(f'chr{variant_chr}')
-
-		response = requests.get(f'https://ucsf.box.com/shared/static/{VCFs_chr_URL}.gz', stream=True)
-		response.raise_for_status()
-
-		with BytesIO(response.content) as file:
-			with gzip.GzipFile(fileobj=file) as gz_file:
-				sample_names = []
-				GTs = None
-
-				for raw_line in gz_file:
-					line = raw_line.decode('utf-8').strip()
-					if line.startswith("#CHROM"):
-						header_fields = line.split("\t")
-						sample_names = header_fields[9:]
-					elif not line.startswith("#"):
-						fields = line.split("\t")
-						if fields[2] == variant_rsID:
-							GTs = fields[9:]
-							GTs_df = pl.DataFrame({
-								'Genetic_ID': sample_names,
-								'Genotype': GTs
-							})
-							break
-					
-
-		if GTs_df is not None:
-			sample_annotation = pl.read_csv('files/AADR_sample_annotation_basic.txt.gz', separator='\t', has_header=True, low_memory=True)
-			GTs_df = GTs_df.join(sample_annotation, on='Genetic_ID', how='left')
-			del sample_annotation
-
-			archaic_sample_ID_mapping = {"AltaiNeanderthal_snpAD.DG": "Altai", "Chagyrskaya_noUDG.SG": "Chagyrskaya", "Denisova3_snpAD.DG": "Denisovan", "Vindija_snpAD.DG": "Vindija"}
-			archaic_GTs_dict = {}
-			for row in GTs_df.iter_rows(named=True):
-				archaic_name = archaic_sample_ID_mapping.get(row["Genetic_ID"])
-				if archaic_name:
-					archaic_GTs_dict[archaic_name] = row["Genotype"]
-
-			filtered_GTs_df = GTs_df.filter(~pl.col("Location").str.contains("Denisova|Neanderthal|REF"))
-			filtered_GTs_df = (filtered_GTs_df.with_columns((pl.col("Data_source") == "Shotgun.diploid").cast(pl.Int32()).alias("priority")).sort(["Specimen_ID", "priority"], descending=[False, True]).group_by("Specimen_ID").head(1))
-
-			date_bins = [
-				(0, 0, "Present"),
-				(0, 1_000, "1000"),
-				(1_000, 2_000, "2000"),
-				(2_000, 3_000, "3000"),
-				(3_000, 4_000, "4000"),
-				(4_000, 5_000, "5000"),
-				(5_000, 10_000, "10000"),
-				(10_000, 15_000, "15000"),
-				(15_000, 20_000, "20000"),
-				(20_000, 30_000, "30000"),
-				(30_000, 40_000, "40000"),
-				(40_000, 50_000, "50000")
-			]
-
-			regions = ["Africa", "Americas", "East Asia", "Europe", "Oceania", "South Asia", "West Asia"]
-
-			output = []
-
-			for region in regions:
-				row = {"Region": region}
-				for lower, upper, label in date_bins:
-					subset = filtered_GTs_df.filter(
-						(pl.col('Region') == region) &
-						((pl.col('Date_mean') <= upper) & (pl.col('Date_mean') > lower) if label != "Present" else (pl.col('Date_mean') == 0))
-						)
-
-					if subset.shape[0] == 0:
-						row[label] = ""
-						continue
-
-					GT_counts = [GT for GT in subset["Genotype"].to_list() if GT != "./."]
-					alt_count = sum(GT.count('1') for GT in GT_counts)
-					total_alleles = 2 * len(GT_counts)
-					AF = alt_count / total_alleles if total_alleles else None
-					row[label] = f"{round(AF, 4) if AF is not None else ''} ({len(GT_counts)})"
-
-				output.append(row)
-			
-			total_row = {"Region": "Total"}
-
-			for lower, upper, label in date_bins:
-				subset = filtered_GTs_df.filter(
-					((pl.col('Date_mean') <= upper) & (pl.col('Date_mean') > lower) if label != "Present" else (pl.col('Date_mean') == 0))
-				)
+		return f"An error occurred: {str(e)}", None
 
-				if subset.shape[0] == 0:
-					total_row[label] = ""
-					continue
+	partners_handle = result_store.put_results({'partners': AGV_LD.format_AGV_LDVs(partners) if partners.height else None})
+	return f"{partners.height} variants are in LD with AGV {variant['rsID']} (chr{variant['chr']}:{variant['pos']}).", partners_handle
 
-				AF, count = compute_AF(subset)
-				total_row[label] = f"{round(AF, 4) if AF is not None else ''} ({count})"
+@app.callback(
+	Output('AGV_partners_table', 'data'),
+	Output('AGV_partners_table', 'page_current'),
+	Output('AGV_partners_table', 'page_count'),
+	Input('partners_query_handle', 'data'),
+	Input('AGV_partners_table', 'page_current'),
+	Input('AGV_partners_table', 'page_size'),
+	Input('AGV_partners_table', 'sort_by'),
+	Input('AGV_partners_table', 'filter_query'),
+	prevent_initial_call=True
+)
 
-			output.append(total_row)
+def page_AGV_partners(partners_handle, page_current, page_size, sort_by, filter_query):
+	df = result_store.get_result(partners_handle, 'partners')
+	if df is None:
+		return [], 0, 1
+	if ctx.triggered_id == 'partners_query_handle':
+		page_current = 0
+	page, page_current, page_count = table_paging.page_table(df, page_current, page_size, sort_by, filter_query)
+	return page.to_dicts(), page_current, page_count
 
-			summary_AFs_df = pl.DataFrame(output)
+# === CALLBACK: Load batch file ===
+@app.callback(
+	Output('batch_input', 'value'),
+	Input('batch_upload', 'contents'),
+	State('batch_input', 'value'),
+	prevent_initial_call=True
+)
 
-			return archaic_GTs_dict, GTs_df, summary_AFs_df
+def load_batch_file(contents, batch_text):
+	if not contents:
+		return dash.no_update
+	uploaded_text = base64.b64decode(contents.split(',', 1)[1]).decode('utf-8', errors='replace')
+	return '\n'.join(text for text in (batch_text, uploaded_text) if text)
 
-		else:
-			print(f"Variant with rsID {variant_rsID} not found.")
+# === CALLBACK: Batch query ===
+@app.callback(
+	Output('batch_message', 'children'),
+	Output('batch_status_table', 'data'),
+	Output('batch_proxies_table', 'data'),
+	Output('batch_query_handle', 'data'),
+	Input('batch-submit-button', 'n_clicks'),
+	State('batch_input', 'value'),
+	State('input_min_r2', 'value'),
+	State('input_min_D', 'value'),
+	State('input_ancestry_groups', 'value'),
+	prevent_initial_call=True
+)
 
-	except requests.exceptions.RequestException as e:
-		print(f"Error fetching VCF file: {str(e)}")
+def query_batch_AGVs(n_clicks, batch_text, min_r2, min_D, ancestry_groups):
+	variants = parse_batch_input(batch_text)
+	if not variants:
+		return "Please enter at least one variant.", [], [], None
+	try:
+		proxies, status = query_batch(variants, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
 	except Exception as e:
-		print(f"Error processing VCF file: {str(e)}")
+		return f"An error occurred: {str(e)}", [], [], None
 
-# === FUNCTION: Compute Allele Frequencies ===
-def compute_AF(df):
-	non_missing_GTs = df.filter(pl.col("Genotype") != "./.")
-	if non_missing_GTs.height == 0:
-		return None, 0
+	formatted_proxies = AGV_LD.format_AGV_LDVs(proxies) if proxies.height else None
+	batch_handle = result_store.put_results({'proxies': formatted_proxies, 'status': status})
+	message = f"{status.height} variants queried; {status.filter(pl.col('n_proxies') > 0).height} have AGVs in LD ({proxies.height} pairs)."
+	return message, status.to_dicts(), formatted_proxies.to_dicts() if formatted_proxies is not None else [], batch_handle
 
-	alt_count = non_missing_GTs.select(
-		pl.col('Genotype').str.count_matches('1').alias('alt_count')
-	)['alt_count'].sum()
+# === CALLBACK: Download batch proxies ===
+@app.callback(
+	Output('download-batch-csv', 'data'),
+	Output('download-batch-button', 'style'),
+	Input('download-batch-button', 'n_clicks'),
+	Input('batch_query_handle', 'data'),
+	prevent_initial_call=True
+)
+
+def download_batch_AGVs(n_clicks, batch_handle):
+	if ctx.triggered_id == 'download-batch-button':
+		df = result_store.get_result(batch_handle, 'proxies')
+		if df is not None:
+			return dcc.send_string(df.write_csv(), filename="batch_AGVs_in_LD.csv"), dash.no_update
+		return dash.no_update, dash.no_update
+	return dash.no_update, download_button_display(result_store.has_result(batch_handle, 'proxies'))
+
+# === CALLBACK: Genotype matrix ===
+@app.callback(
+	Output('genotype_matrix_message', 'children'),
+	Output('download-genotype-matrix', 'data'),
+	Input('genotype-matrix-button', 'n_clicks'),
+	State('genotype_matrix_input', 'value'),
+	State('genotype_matrix_regions', 'value'),
+	State('genotype_matrix_min_date', 'value'),
+	State('genotype_matrix_max_date', 'value'),
+	State('genotype_matrix_format', 'value'),
+	prevent_initial_call=True
+)
 
-	total_alleles = 2 * non_missing_GTs.height
-	AF = alt_count / total_alleles if total_alleles else None
-	return AF, non_missing_GTs.height
+def download_genotype_matrix(n_clicks, variants_text, regions, min_date, max_date, output_format):
+	if not regions:
+		return "Please select at least one region.", dash.no_update
+	if min_date is not None and max_date is not None and min_date > max_date:
+		return "The minimum date must not be greater than the maximum date.", dash.no_update
+	try:
+		by_chr, resolved = resolve_AGVs(parse_batch_input(variants_text))
+		data = b''.join(stream_genotype_matrix(by_chr, resolved, regions=regions, min_date=min_date, max_date=max_date, output_format=output_format))
+	except ValueError as e:
+		return str(e), dash.no_update
+	except Exception as e:
+		return f"An error occurred: {str(e)}", dash.no_update
+
+	n_extracted = sum(variant['status'] == 'extracted' for variant in resolved)
+	message = f"{n_extracted} of {len(resolved)} query variants extracted; see {GENOTYPE_MATRIX_NAME}.status.tsv for the others." if n_extracted < len(resolved) else f"{n_extracted} AGVs extracted."
+	return message, dcc.send_bytes(data, filename=f"{GENOTYPE_MATRIX_NAME}.{output_format}.zip")
+
+# === CALLBACK: Region query ===
+# Submitting a region lists its AGVs and the first page of LD variants; changing page reads the
+# next page from the key the previous one returned. state['cursors'][i] is the key of page i, and
+# state['end'] is set once the last page has been read, which fixes the page count.
+@app.callback(
+	Output('region_message', 'children'),
+	Output('region_AGVs_table', 'data'),
+	Output('region_proxies_table', 'data'),
+	Output('region_proxies_table', 'page_current'),
+	Output('region_proxies_table', 'page_count'),
+	Output('region_query_state', 'data'),
+	Input('region-submit-button', 'n_clicks'),
+	Input('region_proxies_table', 'page_current'),
+	State('region_input', 'value'),
+	State('input_min_r2', 'value'),
+	State('input_min_D', 'value'),
+	State('input_ancestry_groups', 'value'),
+	State('region_query_state', 'data'),
+	prevent_initial_call=True
+)
+
+def query_region(n_clicks, page_current, region_text, min_r2, min_D, ancestry_groups, state):
+	if ctx.triggered_id == 'region-submit-button':
+		region_chr, start, end, error = region_query.parse_region(region_text)
+		if error:
+			return error, [], [], 0, None, None
+		state = {'region': [region_chr, start, end], 'filters': {'min_r2': min_r2, 'min_D': min_D, 'ancestry_groups': ancestry_groups}, 'cursors': [None], 'end': False}
+		page_current = 0
+	elif not state:
+		return dash.no_update, dash.no_update, dash.no_update, 0, dash.no_update, dash.no_update
+	page_current = min(page_current or 0, len(state['cursors']) - 1)
+
+	region_chr, start, end = state['region']
+	try:
+		AGVs = region_query.query_region_AGVs(region_chr, start, end) if ctx.triggered_id == 'region-submit-button' else None
+		page, next_after = region_query.query_region_proxies(region_chr, start, end, after=state['cursors'][page_current], **state['filters'])
+	except Exception as e:
+		return f"An error occurred: {str(e)}", [], [], 0, None, None
+
+	if next_after is None:
+		state['end'] = True
+	elif page_current + 1 == len(state['cursors']):
+		state['cursors'].append(list(next_after))
+	page_count = len(state['cursors']) if state['end'] else None
+	proxies = AGV_LD.format_AGV_LDVs(page).to_dicts() if page.height else []
+
+	if AGVs is None:
+		return dash.no_update, dash.no_update, proxies, page_current, page_count, state
+	message = f"{AGVs.height} AGVs in chr{region_chr}:{start:,}-{end:,}; variants in LD with AGVs are listed {region_query.REGION_PAGE_ROWS} per page."
+	return message, AGVs.to_dicts(), proxies, page_current, page_count, state
+
+# === WARM-UP ===
+if warmup.WARMUP:
+	warmup.warm_up_shared()
 
 if __name__ == "__main__":
 #	app.run(debug=False)
@@ -0,0 +1,49 @@
+# === Load Packages ===
+from dash import DiskcacheManager
+import box_cache
+import diskcache
+import multiprocess
+import os
+
+# === SETTINGS ===
+# Long queries run as Dash background callbacks in separate processes, so gunicorn workers only
+# answer the short polling requests. Job state and progress live in a local diskcache shared by
+# all workers; no external broker is needed.
+JOB_CACHE_DIR = os.environ.get('AGV_JOB_CACHE_DIR', os.path.join(box_cache.CACHE_DIR, 'jobs'))
+JOB_EXPIRE_SECONDS = int(os.environ.get('AGV_JOB_EXPIRE_SECONDS', 3600))
+JOB_PRELOAD_MODULES = ['app']
+
+# === CLASS: Fork Server Job Manager ===
+# Jobs are forked from a fork server instead of the gunicorn worker: a worker that has already
+# run Polars queries (the API, batch queries) holds thread pool locks that a plain fork copies
+# in their locked state, and the job then hangs. The fork server imports the app once, before
+# any query runs, so each job still starts in milliseconds. Importing app there only runs the
+# numpy-only shared warmup phase, which jobs then inherit, and builds an unused manager; no
+# threads are started (the worker phase starts from gunicorn hooks and requests), and the job
+# cache reopens its connection in each forked process.
+class ForkServerManager(DiskcacheManager):
+	def __init__(self, cache, preload_modules=None, **kwargs):
+		super().__init__(cache, **kwargs)
+		self.context = multiprocess.get_context('forkserver')
+		self.context.set_forkserver_preload(JOB_PRELOAD_MODULES if preload_modules is None else preload_modules)
+
+	def call_job_fn(self, key, job_fn, args, context):
+		process = self.context.Process(target=job_fn, args=(key, self._make_progress_key(key), args, context))
+		process.start()
+		return process.pid
+
+# === FUNCTION: Background Callback Manager ===
+def background_callback_manager(job_cache_dir=None):
+	return ForkServerManager(diskcache.Cache(job_cache_dir or JOB_CACHE_DIR), expire=JOB_EXPIRE_SECONDS)
+
+# === FUNCTION: Report Query Progress ===
+# Returns a report(stage) callable for variant_query that turns stage names into a percentage
+# for set_progress. Stages can run concurrently, so the bar only ever moves forward.
+def stage_reporter(set_progress, stages):
+	reached = [0]
+
+	def report(stage):
+		reached[0] = max(reached[0], stages.index(stage) + 1)
+		set_progress((round(100 * reached[0] / (len(stages) + 1)), stage))
+
+	return report
@@ -0,0 +1,98 @@
+# === Load Packages ===
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from query_service import process_variant, query_AGV_LDVs
+from variants import process_chr
+import AGV_LD
+import os
+import polars as pl
+import re
+
+# === SETTINGS ===
+BATCH_MAX_VARIANTS = int(os.environ.get('AGV_BATCH_MAX_VARIANTS', 1000))
+BATCH_WORKERS = int(os.environ.get('AGV_BATCH_WORKERS', 4))
+STATUS_COLUMNS = ['query_variant', 'chr', 'pos', 'rsID', 'is_AGV', 'n_proxies', 'status']
+
+# === FUNCTION: Parse Batch Input ===
+# Accepts chr:pos and rsID tokens separated by commas, semicolons, tabs, spaces or newlines.
+def parse_batch_input(text):
+	tokens = [token for token in re.split(r'[\s,;]+', text or '') if token]
+	return list(dict.fromkeys(tokens))
+
+def resolve_batch_variant(token):
+	variant = {'query_variant': token, 'chr': None, 'pos': None, 'rsID': None, 'ref': None, 'alt': None, 'is_AGV': False, 'n_proxies': 0, 'status': None}
+	if token.lower().startswith('rs'):
+		variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV = process_variant(input_rsID=token)
+		variant.update({'chr': variant_chr, 'pos': variant_pos, 'rsID': variant_rsID, 'ref': variant_ref, 'alt': variant_alt, 'is_AGV': is_AGV, 'match': ('rsID', token)})
+		if not variant_chr:
+			variant['status'] = 'unresolved rsID'
+		return variant
+
+	match = re.fullmatch(r'([^:]+):(\d+)', token)
+	input_chr, error = process_chr(match.group(1)) if match else (None, 'invalid')
+	if error:
+		variant['status'] = 'invalid chromosome' if match else 'invalid input'
+		return variant
+
+	variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV = process_variant(input_chr, match.group(2))
+	variant.update({'chr': variant_chr, 'pos': int(variant_pos), 'rsID': variant_rsID, 'ref': variant_ref, 'alt': variant_alt, 'is_AGV': is_AGV, 'match': ('pos', int(variant_pos))})
+	return variant
+
+# === FUNCTION: Query One Chromosome ===
+def query_chromosome(variant_chr, variants, min_r2, min_D, ancestry_groups):
+	positions = sorted({variant['match'][1] for variant in variants if variant['match'][0] == 'pos'})
+	rsIDs = sorted({variant['match'][1] for variant in variants if variant['match'][0] == 'rsID'})
+	AGV_LDVs = query_AGV_LDVs(variant_chr, LDV_positions=positions, LDV_rsIDs=rsIDs, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
+
+	queries = pl.DataFrame(
+		[(variant['query_variant'], variant['match'][0], str(variant['match'][1])) for variant in variants],
+		schema=['query_variant', 'match_by', 'match_value'],
+		orient='row'
+	)
+	keyed = pl.concat([
+		AGV_LDVs.with_columns(pl.lit('pos').alias('match_by'), pl.col('LDV_pos').cast(pl.Utf8).alias('match_value')),
+		AGV_LDVs.with_columns(pl.lit('rsID').alias('match_by'), pl.col('LDV_rsID').cast(pl.Utf8).alias('match_value'))
+	])
+	return queries.join(keyed, on=['match_by', 'match_value'], how='inner', maintain_order='left').drop('match_by', 'match_value')
+
+# === FUNCTION: Run Batch Query ===
+# Variants are resolved, grouped by chromosome, and each chromosome file is scanned once;
+# independent chromosomes run in parallel. Returns the combined proxy table (with list-typed
+# LD columns) and one status row per query variant.
+def query_batch(variants, min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None, max_workers=None):
+	if isinstance(variants, str):
+		variants = parse_batch_input(variants)
+	if len(variants) > BATCH_MAX_VARIANTS:
+		raise ValueError(f"Batch queries are limited to {BATCH_MAX_VARIANTS} variants; {len(variants)} were given.")
+
+	resolved = [resolve_batch_variant(token) for token in variants]
+	by_chr = {}
+	for variant in resolved:
+		if variant['status'] is None:
+			by_chr.setdefault(variant['chr'], []).append(variant)
+
+	proxy_tables = []
+	with ThreadPoolExecutor(max_workers=max_workers or BATCH_WORKERS) as executor:
+		futures = {variant_chr: executor.submit(copy_context().run, query_chromosome, variant_chr, chr_variants, min_r2, min_D, ancestry_groups) for variant_chr, chr_variants in by_chr.items()}
+		for variant_chr, future in futures.items():
+			try:
+				proxy_tables.append(future.result())
+			except Exception as e:
+				for variant in by_chr[variant_chr]:
+					variant['status'] = f"error: {e}"
+
+	proxies = pl.concat(proxy_tables, how='vertical_relaxed') if proxy_tables else pl.DataFrame()
+	n_proxies = dict(proxies.group_by('query_variant').len().iter_rows()) if proxies.height else {}
+
+	for variant in resolved:
+		variant['n_proxies'] = n_proxies.get(variant['query_variant'], 0)
+		if variant['status'] is None:
+			if variant['is_AGV']:
+				variant['status'] = 'AGV' if variant['n_proxies'] else 'AGV, no proxies'
+			else:
+				variant['status'] = 'not AGV' if variant['n_proxies'] else 'no proxies'
+
+	status = pl.DataFrame([{column: variant[column] for column in STATUS_COLUMNS} for variant in resolved], schema={
+		'query_variant': pl.Utf8, 'chr': pl.Utf8, 'pos': pl.Int64, 'rsID': pl.Utf8, 'is_AGV': pl.Boolean, 'n_proxies': pl.Int64, 'status': pl.Utf8
+	})
+	return proxies, status
@@ -0,0 +1,350 @@
+# === Load Packages ===
+from build_AGV_LD_parquet import convert_AGV_LD_table
+from build_benchmark_fixtures import DEFAULT_OUTPUT_DIR, fixture_paths, generate_fixtures, synthetic_rsIDs, LDV_STEP
+from build_rsID_chr_map import build_from_pickle
+from datetime import datetime, timezone
+from functools import partial
+from rsID_chr_map import RSID_CHR_PICKLE_ID
+import AGV_catalog
+import AGV_LD
+import allele_frequencies
+import app
+import argparse
+import batch_query
+import box_cache
+import box_standin
+import genotype_matrix
+import genotype_store
+import json
+import numpy as np
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import telemetry
+import tempfile
+import threading
+import time
+import variants
+import VCF
+
+# === SETTINGS ===
+# Runs each benchmark in a fresh process against synthetic fixtures (build_benchmark_fixtures.py)
+# served by a local Box stand-in, so results do not depend on Box and every benchmark has its own
+# peak RSS. Modes select where data is read from: 'box' downloads whole files into the cache as a
+# deployment without local indexes does, 'indexed' reads the Parquet, partner index, VCF index
+# and genotype store files, and 'remote' reads BGZF files from the stand-in with HTTP Range
+# requests.
+MODES = ['box', 'indexed', 'remote']
+DEFAULT_REPEAT = 20
+DEFAULT_WARMUP = 1
+BATCH_SIZE = 50
+PERCENTILES = {'p50': 50, 'p99': 99}
+
+# === UTILS ===
+def load_manifest(fixture_dir):
+	with open(fixture_paths(fixture_dir)['manifest'], 'r') as manifest_file:
+		return json.load(manifest_file)
+
+def git_commit():
+	try:
+		commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+		dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip())
+		return {'commit': commit, 'dirty': dirty}
+	except (OSError, subprocess.CalledProcessError):
+		return {'commit': None, 'dirty': None}
+
+def latency_summary(seconds):
+	milliseconds = np.asarray(seconds) * 1000
+	summary = {name: round(float(np.percentile(milliseconds, q)), 3) for name, q in PERCENTILES.items()}
+	summary.update({'mean': round(float(milliseconds.mean()), 3), 'min': round(float(milliseconds.min()), 3), 'max': round(float(milliseconds.max()), 3)})
+	return summary
+
+def peak_rss_bytes():
+	# On Linux ru_maxrss survives exec, so a child would report the parent's peak; VmHWM does not.
+	if os.path.exists('/proc/self/status'):
+		with open('/proc/self/status', 'r') as status_file:
+			for line in status_file:
+				if line.startswith('VmHWM:'):
+					return int(line.split()[1]) * 1024
+	# ru_maxrss is in bytes on macOS.
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# === FUNCTION: Mode Setup ===
+def mode_dirs(fixture_dir, mode):
+	run_dir = os.path.join(fixture_dir, 'runs', mode)
+	index_dir = os.path.join(fixture_dir, 'indexes') if mode == 'indexed' else os.path.join(run_dir, 'no_indexes')
+	return run_dir, index_dir, os.path.join(fixture_dir, 'remote')
+
+def build_mode_files(fixture_dir, mode, manifest):
+	run_dir, index_dir, remote_dir = mode_dirs(fixture_dir, mode)
+	box_dir = fixture_paths(fixture_dir)['box']
+	build_from_pickle(os.path.join(box_dir, f'{RSID_CHR_PICKLE_ID}.pkl'), os.path.join(run_dir, 'rsID_chr_map'))
+	LD_ids, VCF_ids = box_cache.box_file_ids(AGV_LD.AGVS_BOX_URLS_PATH), box_cache.box_file_ids(VCF.VCFS_BOX_URLS_PATH)
+	for chr in manifest['chromosomes']:
+		LD_source = os.path.join(box_dir, f"{LD_ids[f'chr{chr}']}.gz")
+		VCF_source = os.path.join(box_dir, f"{VCF_ids[f'chr{chr}']}.gz")
+		if mode == 'indexed':
+			convert_AGV_LD_table(LD_source, AGV_LD.parquet_path(chr, os.path.join(index_dir, 'AGV_LD_parquet')))
+			AGV_LD.build_AGV_partner_index(LD_source, chr, os.path.join(index_dir, 'AGV_LD_partners'))
+			VCF.build_VCF_index(VCF_source, *VCF.indexed_VCF_paths(chr, os.path.join(index_dir, 'VCF_index')))
+			genotype_store.build_genotype_store(VCF_source, chr, os.path.join(index_dir, 'genotype_store'))
+		elif mode == 'remote':
+			VCF.build_VCF_index(VCF_source, *VCF.indexed_VCF_paths(chr, remote_dir))
+			AGV_LD.build_AGV_LD_bgzf(LD_source, os.path.join(remote_dir, f'chr{chr}.AGV_LD.tsv.bgz'))
+
+def benchmark_env(fixture_dir, mode, base_url):
+	run_dir, index_dir, _ = mode_dirs(fixture_dir, mode)
+	env = dict(os.environ)
+	env.update({
+		'AGV_BOX_BASE_URL': f'{base_url}/box',
+		'AGV_REMOTE_INDEX_BASE_URL': f'{base_url}/remote' if mode == 'remote' else '',
+		'AGV_CATALOG_PATH': fixture_paths(fixture_dir)['catalog'],
+		'AGV_CACHE_DIR': os.path.join(run_dir, 'cache'),
+		'AGV_RESULT_STORE_DIR': os.path.join(run_dir, 'results'),
+		'AGV_JOB_CACHE_DIR': os.path.join(run_dir, 'jobs'),
+		'AGV_METRICS_DIR': os.path.join(run_dir, 'metrics'),
+		'AGV_RSID_CHR_MAP_DIR': os.path.join(run_dir, 'rsID_chr_map'),
+		'AGV_LD_PARQUET_DIR': os.path.join(index_dir, 'AGV_LD_parquet'),
+		'AGV_LD_PARTNERS_DIR': os.path.join(index_dir, 'AGV_LD_partners'),
+		'AGV_VCF_INDEX_DIR': os.path.join(index_dir, 'VCF_index'),
+		'AGV_GENOTYPE_STORE_DIR': os.path.join(index_dir, 'genotype_store'),
+		'AGV_TRACE_LOG': ''
+	})
+	return env
+
+# === BENCHMARKS ===
+# Each benchmark warms whatever it does not measure and returns one operation per iteration.
+# AGVs are drawn at random from the fixture catalog; operations run in the benchmark process.
+def sample_AGVs(AGVs, rng, n):
+	return AGVs[rng.choice(AGVs.height, n, replace=n > AGVs.height)].iter_rows(named=True)
+
+def bench_catalog_load(AGVs, rng, n):
+	def load():
+		AGV_catalog.get_AGV_catalog.cache_clear()
+		AGV_catalog.get_AGV_catalog()
+
+	return [load] * n
+
+def bench_catalog_lookup(AGVs, rng, n):
+	catalog = AGV_catalog.get_AGV_catalog()
+	return [partial(AGV_catalog.lookup_AGV_by_rsID, catalog, AGV['rsID']) for AGV in sample_AGVs(AGVs, rng, n)]
+
+def bench_rsID_resolution(AGVs, rng, n):
+	# Non-AGV LD variants are resolved through the rsID -> chromosome map built for the run.
+	LDVs = [synthetic_rsIDs(AGV['chr'], [AGV['pos'] + LDV_STEP])[0] for AGV in sample_AGVs(AGVs, rng, n)]
+	variants.lookup_chr_for_rsID_external(LDVs[0])
+	return [partial(variants.lookup_chr_for_rsID_external, rsID) for rsID in LDVs]
+
+def bench_box_download(AGVs, rng, n):
+	url = AGV_LD.AGV_LD_box_url(AGVs['chr'][0])
+	cache_dir = os.path.join(box_cache.CACHE_DIR, 'download_benchmark')
+
+	def download():
+		shutil.rmtree(cache_dir, ignore_errors=True)
+		box_cache.fetch(url, cache_dir=cache_dir)
+
+	return [download] * n
+
+def bench_LD_query(AGVs, rng, n):
+	sample = list(sample_AGVs(AGVs, rng, n))
+	AGV_LD.query_AGV_LDVs(sample[0]['chr'], LDV_positions=[sample[0]['pos']])
+	return [partial(AGV_LD.query_AGV_LDVs, AGV['chr'], LDV_positions=[AGV['pos']]) for AGV in sample]
+
+def bench_partner_query(AGVs, rng, n):
+	sample = list(sample_AGVs(AGVs, rng, n))
+	AGV_LD.query_AGV_partners(sample[0]['chr'], sample[0]['pos'])
+	return [partial(AGV_LD.query_AGV_partners, AGV['chr'], AGV['pos']) for AGV in sample]
+
+def bench_genotype_lookup(AGVs, rng, n):
+	sample = list(sample_AGVs(AGVs, rng, n))
+	genotype_store.fetch_variant_GTs(sample[0]['chr'], sample[0]['rsID'])
+	return [partial(genotype_store.fetch_variant_GTs, AGV['chr'], AGV['rsID']) for AGV in sample]
+
+def bench_AF_pipeline(AGVs, rng, n):
+	sample = list(sample_AGVs(AGVs, rng, n))
+	allele_frequencies.retrieve_GTs_and_calculate_AFs(sample[0]['chr'], sample[0]['rsID'])
+	return [partial(allele_frequencies.retrieve_GTs_and_calculate_AFs, AGV['chr'], AGV['rsID']) for AGV in sample]
+
+def bench_AF_bootstrap(AGVs, rng, n):
+	operations = []
+	for AGV in sample_AGVs(AGVs, rng, n):
+		sample_names, GTs = genotype_store.fetch_variant_GTs(AGV['chr'], AGV['rsID'])
+		panel = allele_frequencies.sample_panel(sample_names)
+		operations.append(partial(allele_frequencies.summarize_AFs, panel, allele_frequencies.genotype_dosages(GTs), replicates=allele_frequencies.BOOTSTRAP_REPLICATES))
+	return operations
+
+def extract_genotype_matrix(batch):
+	return b''.join(genotype_matrix.stream_genotype_matrix(*genotype_matrix.resolve_AGVs(batch)))
+
+def bench_genotype_matrix(AGVs, rng, n):
+	batches = [[AGV['rsID'] for AGV in sample_AGVs(AGVs, rng, BATCH_SIZE)] for _ in range(n)]
+	return [partial(extract_genotype_matrix, batch) for batch in batches]
+
+def bench_batch_query(AGVs, rng, n):
+	AGV_LD.query_AGV_LDVs(AGVs['chr'][0], LDV_positions=[AGVs['pos'][0]])
+	batches = [[f"chr{AGV['chr']}:{AGV['pos']}" for AGV in sample_AGVs(AGVs, rng, BATCH_SIZE)] for _ in range(n)]
+	return [partial(batch_query.query_batch, batch) for batch in batches]
+
+def query_AGVs_op(AGV):
+	return partial(app.query_AGVs, lambda progress: None, 1, AGV['chr'], str(AGV['pos']), None)
+
+def bench_query_AGVs(AGVs, rng, n):
+	# Distinct AGVs, so every query misses the memoized results; data files are cached first.
+	sample = list(sample_AGVs(AGVs, rng, n + 1))
+	query_AGVs_op(sample[-1])()
+	return [query_AGVs_op(AGV) for AGV in sample[:-1]]
+
+def bench_query_AGVs_cached(AGVs, rng, n):
+	AGV = next(sample_AGVs(AGVs, rng, 1))
+	query_AGVs_op(AGV)()
+	return [query_AGVs_op(AGV)] * n
+
+BENCHMARKS = {
+	'catalog_load': bench_catalog_load,
+	'catalog_lookup': bench_catalog_lookup,
+	'rsID_resolution': bench_rsID_resolution,
+	'box_download': bench_box_download,
+	'LD_query': bench_LD_query,
+	'partner_query': bench_partner_query,
+	'genotype_lookup': bench_genotype_lookup,
+	'AF_pipeline': bench_AF_pipeline,
+	'AF_bootstrap': bench_AF_bootstrap,
+	'genotype_matrix': bench_genotype_matrix,
+	'batch_query': bench_batch_query,
+	'query_AGVs': bench_query_AGVs,
+	'query_AGVs_cached': bench_query_AGVs_cached
+}
+
+# === FUNCTION: Run One Benchmark ===
+# Times each operation and collects the telemetry spans it records, so end-to-end benchmarks
+# also report where their time went.
+def run_benchmark(name, fixture_dir, repeat=DEFAULT_REPEAT, warmup=DEFAULT_WARMUP, seed=0):
+	rng = np.random.default_rng(seed)
+	AGVs = AGV_catalog.load_AGVs()
+	operations = BENCHMARKS[name](AGVs, rng, warmup + repeat)
+	for operation in operations[:warmup]:
+		operation()
+
+	latencies, spans = [], {}
+	for operation in operations[warmup:]:
+		with telemetry.trace(name) as trace:
+			start = time.perf_counter()
+			operation()
+			latencies.append(time.perf_counter() - start)
+		for span in trace.spans:
+			spans.setdefault(span.name, []).append(span.duration)
+
+	return {
+		'iterations': len(latencies),
+		'throughput_per_second': round(len(latencies) / sum(latencies), 3),
+		'latency_ms': latency_summary(latencies),
+		'peak_rss_bytes': peak_rss_bytes(),
+		'spans_ms': {span_name: {'count': len(durations), **latency_summary(durations)} for span_name, durations in spans.items()}
+	}
+
+# === FUNCTION: Run Suite ===
+def run_suite(fixture_dir=DEFAULT_OUTPUT_DIR, mode='box', names=None, repeat=DEFAULT_REPEAT, warmup=DEFAULT_WARMUP, seed=0, output_path=None):
+	if not os.path.exists(fixture_paths(fixture_dir)['manifest']):
+		generate_fixtures(fixture_dir)
+	manifest = load_manifest(fixture_dir)
+	run_dir, _, _ = mode_dirs(fixture_dir, mode)
+	shutil.rmtree(run_dir, ignore_errors=True)
+	build_mode_files(fixture_dir, mode, manifest)
+
+	server = box_standin.make_server(fixture_dir, port=0)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	env = benchmark_env(fixture_dir, mode, f'http://127.0.0.1:{server.server_port}')
+
+	results = {}
+	try:
+		for name in names or BENCHMARKS:
+			with tempfile.TemporaryDirectory() as tmp_dir:
+				result_path = os.path.join(tmp_dir, 'result.json')
+				subprocess.run([sys.executable, os.path.abspath(__file__), 'child', name, '--fixtures', fixture_dir, '--repeat', str(repeat), '--warmup', str(warmup), '--seed', str(seed), '--output', result_path], env=env, check=True)
+				with open(result_path, 'r') as result_file:
+					results[name] = json.load(result_file)
+			latency = results[name]['latency_ms']
+			print(f"{name}: p50 {latency['p50']} ms, p99 {latency['p99']} ms, {results[name]['throughput_per_second']}/s, peak RSS {results[name]['peak_rss_bytes'] / 1024 ** 2:.0f} MiB")
+	finally:
+		server.shutdown()
+
+	report = {
+		**git_commit(),
+		'timestamp': datetime.now(timezone.utc).isoformat(),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'mode': mode,
+		'repeat': repeat,
+		'warmup': warmup,
+		'seed': seed,
+		'fixtures': manifest,
+		'results': results
+	}
+	if output_path:
+		os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+		with open(output_path, 'w') as output_file:
+			json.dump(report, output_file, indent=2)
+	return report
+
+# === FUNCTION: Compare Results ===
+def compare_results(baseline, candidate):
+	lines = [f"{'benchmark':<20}{'p50 ms':>22}{'p99 ms':>22}{'peak RSS MiB':>22}"]
+	for name in candidate['results']:
+		if name not in baseline['results']:
+			continue
+		before, after = baseline['results'][name], candidate['results'][name]
+		cells = []
+		for old, new in (
+			(before['latency_ms']['p50'], after['latency_ms']['p50']),
+			(before['latency_ms']['p99'], after['latency_ms']['p99']),
+			(before['peak_rss_bytes'] / 1024 ** 2, after['peak_rss_bytes'] / 1024 ** 2)
+		):
+			change = f'{(new - old) / old:+.0%}' if old else 'n/a'
+			cells.append(f'{old:.1f} -> {new:.1f} ({change})')
+		lines.append(f'{name:<20}' + ''.join(f'{cell:>22}' for cell in cells))
+	return '\n'.join(lines)
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark query stages and end-to-end queries against synthetic fixtures served by a local Box stand-in.')
+	subparsers = parser.add_subparsers(dest='command', required=True)
+
+	run_parser = subparsers.add_parser('run', help='run the benchmark suite and write its results as JSON')
+	run_parser.add_argument('--fixtures', default=DEFAULT_OUTPUT_DIR, help='fixture directory; generated with default sizes if missing')
+	run_parser.add_argument('--mode', choices=MODES, default='box')
+	run_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='benchmarks to run (default: all)')
+	run_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+	run_parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+	run_parser.add_argument('--seed', type=int, default=0)
+	run_parser.add_argument('--output', help='JSON results file (default: benchmark_results/{commit}-{mode}.json)')
+
+	child_parser = subparsers.add_parser('child', help='run one benchmark in this process (used by run)')
+	child_parser.add_argument('name', choices=list(BENCHMARKS))
+	child_parser.add_argument('--fixtures', default=DEFAULT_OUTPUT_DIR)
+	child_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+	child_parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+	child_parser.add_argument('--seed', type=int, default=0)
+	child_parser.add_argument('--output', required=True)
+
+	compare_parser = subparsers.add_parser('compare', help='compare two results files')
+	compare_parser.add_argument('baseline')
+	compare_parser.add_argument('candidate')
+	args = parser.parse_args()
+
+	if args.command == 'run':
+		output_path = args.output or os.path.join('benchmark_results', f"{(git_commit()['commit'] or 'unknown')[:12]}-{args.mode}.json")
+		run_suite(args.fixtures, args.mode, args.only, args.repeat, args.warmup, args.seed, output_path)
+		print(f'Results written to {output_path}')
+	elif args.command == 'child':
+		result = run_benchmark(args.name, args.fixtures, args.repeat, args.warmup, args.seed)
+		with open(args.output, 'w') as output_file:
+			json.dump(result, output_file)
+	else:
+		with open(args.baseline, 'r') as baseline_file, open(args.candidate, 'r') as candidate_file:
+			print(compare_results(json.load(baseline_file), json.load(candidate_file)))
+
+if __name__ == "__main__":
+	main()
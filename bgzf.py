@@ -0,0 +1,109 @@
+# === Load Packages ===
+import struct
+import zlib
+
+# === SETTINGS ===
+# BGZF is a series of gzip members of at most 64 KiB, so files stay readable by gzip/zcat while
+# any record can be addressed by a virtual offset: (compressed block offset << 16) | offset in block.
+MAX_BLOCK_DATA = 65280
+BLOCK_HEADER = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+# === UTILS ===
+def make_virtual_offset(block_offset, within_block_offset):
+	return (block_offset << 16) | within_block_offset
+
+def split_virtual_offset(virtual_offset):
+	return virtual_offset >> 16, virtual_offset & 0xFFFF
+
+def compress_block(data, level=6):
+	compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+	cdata = compressor.compress(data) + compressor.flush()
+	block_size = len(BLOCK_HEADER) + 2 + len(cdata) + 8
+	return BLOCK_HEADER + struct.pack('<H', block_size - 1) + cdata + struct.pack('<II', zlib.crc32(data), len(data))
+
+def parse_block(block):
+	if block[:4] != b'\x1f\x8b\x08\x04':
+		raise ValueError('Not a BGZF block.')
+	xlen = struct.unpack('<H', block[10:12])[0]
+	block_size = None
+	extra = block[12:12 + xlen]
+	i = 0
+	while i < xlen:
+		subfield_id, subfield_len = extra[i:i + 2], struct.unpack('<H', extra[i + 2:i + 4])[0]
+		if subfield_id == b'BC':
+			block_size = struct.unpack('<H', extra[i + 4:i + 6])[0] + 1
+		i += 4 + subfield_len
+	if block_size is None:
+		raise ValueError('BGZF block is missing its BC size field.')
+	return 12 + xlen, block_size
+
+def decompress_block(block):
+	data_start, block_size = parse_block(block)
+	return zlib.decompress(block[data_start:block_size - 8], -15)
+
+# === CLASS: BGZF Writer ===
+class BgzfWriter:
+	def __init__(self, path, level=6):
+		self.file = open(path, 'wb')
+		self.level = level
+		self.buffer = bytearray()
+		self.block_offset = 0
+		# Start of every data block plus the end of the data, for readers that fetch blocks by byte range.
+		self.block_offsets = []
+
+	def tell(self):
+		return make_virtual_offset(self.block_offset, len(self.buffer))
+
+	def write(self, data):
+		self.buffer += data
+		while len(self.buffer) >= MAX_BLOCK_DATA:
+			self.flush_block(bytes(self.buffer[:MAX_BLOCK_DATA]))
+			del self.buffer[:MAX_BLOCK_DATA]
+
+	def flush_block(self, data):
+		block = compress_block(data, self.level)
+		self.block_offsets.append(self.block_offset)
+		self.file.write(block)
+		self.block_offset += len(block)
+
+	def close(self):
+		if self.buffer:
+			self.flush_block(bytes(self.buffer))
+			self.buffer = bytearray()
+		self.block_offsets.append(self.block_offset)
+		self.file.write(EOF_BLOCK)
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+# === FUNCTION: Read Blocks ===
+def read_block(file, block_offset):
+	file.seek(block_offset)
+	header = file.read(12)
+	if len(header) < 12:
+		return b'', None
+	header += file.read(struct.unpack('<H', header[10:12])[0])
+	_, block_size = parse_block(header)
+	block = header + file.read(block_size - len(header))
+	return decompress_block(block), block_offset + block_size
+
+# === FUNCTION: Read Line at Virtual Offset ===
+def read_line(file, virtual_offset):
+	block_offset, within_block_offset = split_virtual_offset(virtual_offset)
+	parts = []
+	while block_offset is not None:
+		data, block_offset = read_block(file, block_offset)
+		if not data and block_offset is None:
+			break
+		end = data.find(b'\n', within_block_offset)
+		if end >= 0:
+			parts.append(data[within_block_offset:end])
+			break
+		parts.append(data[within_block_offset:])
+		within_block_offset = 0
+	return b''.join(parts)
@@ -0,0 +1,216 @@
+# === Load Packages ===
+import cancellation
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+import requests
+import telemetry
+
+# === SETTINGS ===
+# All gunicorn workers on a host share one cache directory. Entries are keyed by URL and
+# written atomically, so concurrent fills of the same file never expose a partial download.
+BOX_BASE_URL = os.environ.get('AGV_BOX_BASE_URL', 'https://ucsf.box.com/shared/static').rstrip('/')
+CACHE_DIR = os.environ.get('AGV_CACHE_DIR', 'cache')
+CACHE_MAX_BYTES = int(os.environ.get('AGV_CACHE_MAX_BYTES', 20 * 1024 ** 3))
+CACHE_REVALIDATE_SECONDS = int(os.environ.get('AGV_CACHE_REVALIDATE_SECONDS', 3600))
+CHUNK_SIZE = 1024 * 1024
+REQUEST_TIMEOUT = (10, 60)
+
+# === UTILS ===
+def box_url(file_id, suffix='.gz'):
+	return f'{BOX_BASE_URL}/{file_id}{suffix}'
+
+@lru_cache(maxsize=None)
+def box_file_ids(urls_path):
+	# files/*_Box_URLs.json map chromosomes to Box file IDs; they are read once per process.
+	with open(urls_path, 'r') as urls_file:
+		return json.load(urls_file)
+
+def entry_paths(url, cache_dir=None):
+	cache_dir = cache_dir or CACHE_DIR
+	key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+	base = os.path.join(cache_dir, key[:2], key)
+	return base + '.data', base + '.json', base + '.lock'
+
+# Lock files can be removed by their holder (evict removes an entry's lock with the entry), so a
+# lock taken on a file that has since been unlinked or replaced is dropped and taken again.
+# With blocking=False, BlockingIOError is raised if the lock is held.
+@contextmanager
+def file_lock(lock_path, shared=False, blocking=True):
+	os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+	while True:
+		lock_file = open(lock_path, 'a')
+		try:
+			fcntl.flock(lock_file, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+		except BlockingIOError:
+			lock_file.close()
+			raise
+		try:
+			if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+				break
+		except FileNotFoundError:
+			pass
+		fcntl.flock(lock_file, fcntl.LOCK_UN)
+		lock_file.close()
+	with lock_file:
+		try:
+			yield
+		finally:
+			fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def read_metadata(meta_path):
+	try:
+		with open(meta_path, 'r') as meta_file:
+			return json.load(meta_file)
+	except (OSError, ValueError):
+		return None
+
+def write_atomic_json(path, data):
+	fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-', suffix='.json')
+	try:
+		with os.fdopen(fd, 'w') as tmp_file:
+			json.dump(data, tmp_file)
+		os.replace(tmp_path, path)
+	except BaseException:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		raise
+
+def touch(path):
+	try:
+		os.utime(path, None)
+	except OSError:
+		pass
+
+# === FUNCTION: Download Into Cache ===
+def download_to_entry(response, data_path):
+	fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(data_path), prefix='.tmp-', suffix='.data')
+	size = 0
+	try:
+		with telemetry.span('download') as span, os.fdopen(fd, 'wb') as tmp_file:
+			for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+				cancellation.check_cancelled()
+				tmp_file.write(chunk)
+				size += len(chunk)
+			tmp_file.flush()
+			os.fsync(tmp_file.fileno())
+			span.set(bytes=size)
+		os.replace(tmp_path, data_path)
+	except BaseException:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		raise
+	return size
+
+# === FUNCTION: Fetch File Through Cache ===
+def fetch(url, session=None, cache_dir=None, max_bytes=None, revalidate_seconds=None):
+	http = session or requests
+	max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+	revalidate_seconds = CACHE_REVALIDATE_SECONDS if revalidate_seconds is None else revalidate_seconds
+	data_path, meta_path, lock_path = entry_paths(url, cache_dir)
+
+	with file_lock(lock_path):
+		metadata = read_metadata(meta_path)
+		cached = metadata is not None and os.path.exists(data_path)
+
+		if cached and time.time() - metadata.get('checked_at', 0) < revalidate_seconds:
+			touch(data_path)
+			return data_path
+
+		headers = {}
+		if cached:
+			if metadata.get('etag'):
+				headers['If-None-Match'] = metadata['etag']
+			if metadata.get('last_modified'):
+				headers['If-Modified-Since'] = metadata['last_modified']
+
+		try:
+			response = http.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
+		except requests.exceptions.RequestException:
+			# Box is unreachable; a stale copy is better than no result.
+			if cached:
+				touch(data_path)
+				return data_path
+			raise
+
+		with response:
+			if cached and response.status_code == 304:
+				metadata['checked_at'] = time.time()
+				write_atomic_json(meta_path, metadata)
+				touch(data_path)
+				return data_path
+
+			response.raise_for_status()
+			size = download_to_entry(response, data_path)
+			write_atomic_json(meta_path, {
+				'url': url,
+				'etag': response.headers.get('ETag'),
+				'last_modified': response.headers.get('Last-Modified'),
+				'size': size,
+				'checked_at': time.time()
+			})
+
+	evict(cache_dir, max_bytes, keep=data_path)
+	return data_path
+
+# === FUNCTION: Evict Least Recently Used Entries ===
+def cache_entries(cache_dir=None):
+	cache_dir = cache_dir or CACHE_DIR
+	entries = []
+	if not os.path.isdir(cache_dir):
+		return entries
+	for root, _, files in os.walk(cache_dir):
+		for name in files:
+			if name.endswith('.data') and not name.startswith('.tmp-'):
+				path = os.path.join(root, name)
+				try:
+					stat = os.stat(path)
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, path))
+	return entries
+
+def evict(cache_dir=None, max_bytes=None, keep=None):
+	cache_dir = cache_dir or CACHE_DIR
+	max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+	with file_lock(os.path.join(cache_dir, 'evict.lock')):
+		entries = sorted(cache_entries(cache_dir))
+		total = sum(size for _, size, _ in entries)
+		for _, size, data_path in entries:
+			if total <= max_bytes:
+				break
+			if data_path == keep:
+				continue
+			lock_path = data_path[:-len('.data')] + '.lock'
+			meta_path = data_path[:-len('.data')] + '.json'
+			with file_lock(lock_path):
+				# The lock file goes last, while it is still held; see file_lock.
+				for path in (data_path, meta_path, lock_path):
+					if os.path.exists(path):
+						os.remove(path)
+			total -= size
+	return total
+
+def is_cached(url, cache_dir=None):
+	data_path, meta_path, _ = entry_paths(url, cache_dir)
+	return os.path.exists(data_path) and os.path.exists(meta_path)
+
+def cache_size(cache_dir=None):
+	return sum(size for _, size, _ in cache_entries(cache_dir))
+
+# === FUNCTION: Open Cached File ===
+def open_cached(url, **kwargs):
+	# An entry can be evicted by another worker between fetch and open; refetch once if so.
+	for attempt in range(2):
+		data_path = fetch(url, **kwargs)
+		try:
+			return open(data_path, 'rb')
+		except FileNotFoundError:
+			if attempt:
+				raise
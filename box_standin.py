@@ -0,0 +1,96 @@
+# === Load Packages ===
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+import argparse
+import os
+import re
+
+# === SETTINGS ===
+# A local stand-in for Box and for remote index hosting: serves a directory over HTTP with
+# keep-alive, ETag/Last-Modified validators and single byte-range requests, so the cache,
+# streaming and Range-read code paths can be exercised offline.
+DEFAULT_PORT = 8765
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# === CLASS: Range Request Handler ===
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def log_message(self, format, *args):
+		pass
+
+	def send_head(self):
+		path = self.translate_path(self.path)
+		if not os.path.isfile(path):
+			self.send_error(404, 'File not found')
+			return None
+
+		stat = os.stat(path)
+		etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+		if self.headers.get('If-None-Match') == etag:
+			self.send_response(304)
+			self.send_header('ETag', etag)
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+			return None
+
+		start, end = 0, stat.st_size - 1
+		match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+		if match and (match.group(1) or match.group(2)):
+			if match.group(1):
+				start = int(match.group(1))
+				end = min(int(match.group(2)), end) if match.group(2) else end
+			else:
+				start = max(0, stat.st_size - int(match.group(2)))
+			if start > end:
+				self.send_response(416)
+				self.send_header('Content-Range', f'bytes */{stat.st_size}')
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+				return None
+			self.send_response(206)
+			self.send_header('Content-Range', f'bytes {start}-{end}/{stat.st_size}')
+		else:
+			self.send_response(200)
+
+		self.send_header('Content-Type', 'application/octet-stream')
+		self.send_header('Content-Length', str(end - start + 1))
+		self.send_header('Accept-Ranges', 'bytes')
+		self.send_header('ETag', etag)
+		self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+		self.end_headers()
+
+		file = open(path, 'rb')
+		file.seek(start)
+		self.remaining = end - start + 1
+		return file
+
+	def copyfile(self, source, outputfile):
+		while self.remaining > 0:
+			chunk = source.read(min(COPY_CHUNK_SIZE, self.remaining))
+			if not chunk:
+				break
+			outputfile.write(chunk)
+			self.remaining -= len(chunk)
+
+# === FUNCTION: Serve a Directory ===
+def make_server(directory, host='127.0.0.1', port=DEFAULT_PORT):
+	return ThreadingHTTPServer((host, port), partial(RangeRequestHandler, directory=directory))
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Serve a directory over HTTP with Range support as a local stand-in for Box.')
+	parser.add_argument('directory', help='directory to serve, e.g. holding {file_id}.gz files and remote indexes')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+	args = parser.parse_args()
+
+	server = make_server(args.directory, args.host, args.port)
+	print(f'Serving {os.path.abspath(args.directory)} on http://{args.host}:{server.server_port}')
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,30 @@
+# === Load Packages ===
+from AGV_LD import AGV_LD_box_url, build_AGV_LD_bgzf, remote_AGV_LD_paths
+import argparse
+import box_cache
+import os
+
+# === SETTINGS ===
+CHROMOSOMES = [str(i) for i in range(1, 23)] + ['X']
+AGV_LD_BGZF_DIR = 'files/AGV_LD_bgzf'
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Recompress per-chromosome AGV-LD TSV.gz files as position-sorted BGZF with a block-offset index for HTTP Range reads.')
+	parser.add_argument('--chr', nargs='+', default=CHROMOSOMES, help='chromosomes to convert (default: all)')
+	parser.add_argument('--input-dir', help='directory holding chr{N}.txt.gz files; downloaded from Box if omitted')
+	parser.add_argument('--output-dir', default=AGV_LD_BGZF_DIR)
+	args = parser.parse_args()
+
+	for chr in args.chr:
+		chr = chr[3:] if chr.lower().startswith('chr') else chr
+		if args.input_dir:
+			source = os.path.join(args.input_dir, f'chr{chr}.txt.gz')
+		else:
+			source = box_cache.fetch(AGV_LD_box_url(chr))
+		bgz_path = os.path.join(args.output_dir, f'chr{chr}.AGV_LD.tsv.bgz')
+		n_rows = build_AGV_LD_bgzf(source, bgz_path)
+		print(f'chr{chr}: {n_rows} rows indexed in {remote_AGV_LD_paths(bgz_path)[0]}')
+
+if __name__ == "__main__":
+	main()
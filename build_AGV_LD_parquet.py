@@ -0,0 +1,49 @@
+# === Load Packages ===
+from AGV_LD import AGV_LD_box_url, AGV_LD_PARQUET_DIR, parquet_path, parse_LD_lists
+import argparse
+import box_cache
+import os
+import polars as pl
+import tempfile
+
+# === SETTINGS ===
+CHROMOSOMES = [str(i) for i in range(1, 23)] + ['X']
+ROW_GROUP_SIZE = 8192
+
+# === FUNCTION: Convert One Chromosome ===
+def convert_AGV_LD_table(source, output_path, row_group_size=ROW_GROUP_SIZE):
+	df = pl.read_csv(source, separator='\t', has_header=True, low_memory=True)
+	df = parse_LD_lists(df).sort('LDV_pos')
+
+	os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+	fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path) or '.', prefix='.tmp-', suffix='.parquet')
+	os.close(fd)
+	try:
+		df.write_parquet(tmp_path, compression='zstd', statistics=True, row_group_size=row_group_size)
+		os.replace(tmp_path, output_path)
+	except BaseException:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		raise
+	return df.height
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Convert per-chromosome AGV-LD TSV.gz files to position-sorted Parquet.')
+	parser.add_argument('--chr', nargs='+', default=CHROMOSOMES, help='chromosomes to convert (default: all)')
+	parser.add_argument('--input-dir', help='directory holding chr{N}.txt.gz files; downloaded from Box if omitted')
+	parser.add_argument('--output-dir', default=AGV_LD_PARQUET_DIR)
+	parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE)
+	args = parser.parse_args()
+
+	for chr in args.chr:
+		chr = chr[3:] if chr.lower().startswith('chr') else chr
+		if args.input_dir:
+			source = os.path.join(args.input_dir, f'chr{chr}.txt.gz')
+		else:
+			source = box_cache.fetch(AGV_LD_box_url(chr))
+		n_rows = convert_AGV_LD_table(source, parquet_path(chr, args.output_dir), args.row_group_size)
+		print(f'chr{chr}: {n_rows} rows written to {parquet_path(chr, args.output_dir)}')
+
+if __name__ == "__main__":
+	main()
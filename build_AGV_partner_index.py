@@ -0,0 +1,29 @@
+# === Load Packages ===
+from AGV_LD import AGV_LD_box_url, AGV_LD_PARTNERS_DIR, build_AGV_partner_index, partner_index_paths, PARTNER_ROW_GROUP_SIZE
+import argparse
+import box_cache
+import os
+
+# === SETTINGS ===
+CHROMOSOMES = [str(i) for i in range(1, 23)] + ['X']
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Build per-chromosome reverse indexes of the AGV-LD tables, sorted by AGV position, for LD partner lookups.')
+	parser.add_argument('--chr', nargs='+', default=CHROMOSOMES, help='chromosomes to index (default: all)')
+	parser.add_argument('--input-dir', help='directory holding chr{N}.txt.gz files; downloaded from Box if omitted')
+	parser.add_argument('--output-dir', default=AGV_LD_PARTNERS_DIR)
+	parser.add_argument('--row-group-size', type=int, default=PARTNER_ROW_GROUP_SIZE)
+	args = parser.parse_args()
+
+	for chr in args.chr:
+		chr = chr[3:] if chr.lower().startswith('chr') else chr
+		if args.input_dir:
+			source = os.path.join(args.input_dir, f'chr{chr}.txt.gz')
+		else:
+			source = box_cache.fetch(AGV_LD_box_url(chr))
+		n_rows, n_AGVs = build_AGV_partner_index(source, chr, args.output_dir, args.row_group_size)
+		print(f'chr{chr}: {n_rows} rows for {n_AGVs} AGVs written to {partner_index_paths(chr, args.output_dir)[0]}')
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,29 @@
+# === Load Packages ===
+from VCF import build_VCF_index, indexed_VCF_paths, VCF_box_url, VCF_INDEX_DIR
+import argparse
+import box_cache
+import os
+
+# === SETTINGS ===
+CHROMOSOMES = [str(i) for i in range(1, 23)] + ['X']
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Recompress per-chromosome VCFs as BGZF and build rsID/position indexes.')
+	parser.add_argument('--chr', nargs='+', default=CHROMOSOMES, help='chromosomes to index (default: all)')
+	parser.add_argument('--input-dir', help='directory holding chr{N}.vcf.gz files; downloaded from Box if omitted')
+	parser.add_argument('--output-dir', default=VCF_INDEX_DIR)
+	args = parser.parse_args()
+
+	for chr in args.chr:
+		chr = chr[3:] if chr.lower().startswith('chr') else chr
+		if args.input_dir:
+			source = os.path.join(args.input_dir, f'chr{chr}.vcf.gz')
+		else:
+			source = box_cache.fetch(VCF_box_url(chr))
+		bgz_path, idx_path = indexed_VCF_paths(chr, args.output_dir)
+		n_records = build_VCF_index(source, bgz_path, idx_path)
+		print(f'chr{chr}: {n_records} records indexed in {idx_path}')
+
+if __name__ == "__main__":
+	main()
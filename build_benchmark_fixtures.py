@@ -0,0 +1,164 @@
+# === Load Packages ===
+from AGV_LD import AGVS_BOX_URLS_PATH, ANCESTRY_GROUPS
+from box_cache import box_file_ids
+from rsID_chr_map import CHR_CODES, RSID_CHR_PICKLE_ID
+from VCF import VCFS_BOX_URLS_PATH
+import argparse
+import gzip
+import json
+import numpy as np
+import os
+import pickle
+import polars as pl
+
+# === SETTINGS ===
+# Synthetic inputs in the layout the app reads from Box: an AGV catalog, per-chromosome AGV-LD
+# TSV.gz files with the real columns and per-ancestry lists, VCFs whose sample columns are the
+# Genetic_IDs of AADR_sample_annotation_basic.txt, and the rsID -> chromosome pickle. Box files
+# are named by the file IDs in files/*_Box_URLs.json, so serving box/ over HTTP (box_standin.py)
+# stands in for Box. Sizes scale with the number of AGVs per chromosome.
+DEFAULT_OUTPUT_DIR = 'files/benchmark'
+SAMPLE_ANNOTATION_PATH = 'files/AADR_sample_annotation_basic.txt.gz'
+AGVS_PER_CHR = 2000
+AGV_START = 1_000_000
+AGV_SPACING = 350
+LDV_STEP = 50
+LD_WINDOW = 5000
+LD_PARTNERS = 4
+MISSING_RATE = 0.1
+GZIP_LEVEL = 1
+HG19_OFFSET = 500
+BASES = np.array(['A', 'C', 'G', 'T'])
+GENOTYPES = np.array([b'0/0', b'0/1', b'1/1', b'./.'])
+
+# === UTILS ===
+def fixture_paths(output_dir):
+	return {
+		'catalog': os.path.join(output_dir, 'AGVs_hg38.txt.gz'),
+		'box': os.path.join(output_dir, 'box'),
+		'manifest': os.path.join(output_dir, 'fixtures.json')
+	}
+
+def synthetic_rsIDs(chr, positions):
+	return np.char.add('rs', (CHR_CODES[chr] * 10 ** 9 + np.asarray(positions, dtype=np.int64)).astype(str))
+
+def synthetic_alleles(positions):
+	positions = np.asarray(positions, dtype=np.int64)
+	ref = positions // LDV_STEP % 4
+	alt = (ref + 1 + positions % 3) % 4
+	return BASES[ref], BASES[alt]
+
+def sample_names(annotation_path=SAMPLE_ANNOTATION_PATH, n_samples=None):
+	names = pl.read_csv(annotation_path, separator='\t', has_header=True, columns=['Genetic_ID'])['Genetic_ID'].to_list()
+	return names[:n_samples] if n_samples else names
+
+# === FUNCTION: AGV Positions ===
+def AGV_positions(n_AGVs, spacing=AGV_SPACING):
+	return AGV_START + np.arange(n_AGVs, dtype=np.int64) * spacing
+
+# === FUNCTION: AGV-LD Table ===
+# Every LDV_STEP bp from the first to the last AGV is an LD variant (AGVs included) with on
+# average LD_PARTNERS AGVs within LD_WINDOW bp, each in LD in a random subset of ancestry groups.
+def AGV_LD_table(chr, AGV_pos, rng, step=LDV_STEP, window=LD_WINDOW, partners=LD_PARTNERS):
+	spacing = int(AGV_pos[1] - AGV_pos[0]) if len(AGV_pos) > 1 else AGV_SPACING
+	LDV_pos = np.arange(AGV_pos[0], AGV_pos[-1] + 1, step, dtype=np.int64)
+	n_partners = np.maximum(1, rng.poisson(partners, len(LDV_pos)))
+	pair_LDV_pos = np.repeat(LDV_pos, n_partners)
+	offsets = rng.integers(-(window // spacing), window // spacing + 1, len(pair_LDV_pos))
+	pair_AGV = np.clip(np.searchsorted(AGV_pos, pair_LDV_pos) + offsets, 0, len(AGV_pos) - 1)
+	pairs = pl.DataFrame({'LDV_pos': pair_LDV_pos, 'AGV_pos': AGV_pos[pair_AGV]}).unique(maintain_order=True).filter(pl.col('LDV_pos') != pl.col('AGV_pos'))
+
+	groups = list(ANCESTRY_GROUPS)
+	masks = rng.integers(1, 2 ** len(groups), pairs.height)
+	populations, r2s, Ds, corrs = [], [], [], []
+	for mask in masks:
+		present = [group for i, group in enumerate(groups) if mask >> i & 1]
+		populations.append(','.join(present))
+		r2s.append(','.join(f'{value:.3f}' for value in rng.uniform(0.2, 1, len(present))))
+		Ds.append(','.join(f'{value:.3f}' for value in rng.uniform(0.3, 1, len(present))))
+		corrs.append(','.join(f'{value:.3f}' if value > 0 else '-' for value in rng.uniform(-1, 1, len(present))))
+
+	LDV_ref, LDV_alt = synthetic_alleles(pairs['LDV_pos'])
+	AGV_ref, AGV_alt = synthetic_alleles(pairs['AGV_pos'])
+	return pl.DataFrame({
+		'chr': [chr] * pairs.height,
+		'LDV_pos': pairs['LDV_pos'],
+		'LDV_ref': LDV_ref,
+		'LDV_alt': LDV_alt,
+		'LDV_rsID': synthetic_rsIDs(chr, pairs['LDV_pos']),
+		'AGV_pos': pairs['AGV_pos'],
+		'AGV_ref': AGV_ref,
+		'AGV_alt': AGV_alt,
+		'AGV_rsID': synthetic_rsIDs(chr, pairs['AGV_pos']),
+		'populations': populations,
+		'r2': r2s,
+		"D'": Ds,
+		'corr': corrs
+	})
+
+# === FUNCTION: VCF ===
+# One record per AGV at its hg19 position; genotypes follow Hardy-Weinberg proportions for a
+# random allele frequency, with MISSING_RATE of calls missing.
+def write_VCF(path, chr, AGV_pos, samples, rng, missing_rate=MISSING_RATE):
+	ref, alt = synthetic_alleles(AGV_pos)
+	rsIDs = synthetic_rsIDs(chr, AGV_pos)
+	with gzip.open(path, 'wb', compresslevel=GZIP_LEVEL) as VCF_file:
+		VCF_file.write(b'##fileformat=VCFv4.2\n')
+		VCF_file.write('\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO', 'FORMAT'] + samples).encode('utf-8') + b'\n')
+		for i, pos in enumerate(AGV_pos):
+			AF = rng.uniform(0.05, 0.95)
+			called = 1 - missing_rate
+			thresholds = np.cumsum([called * (1 - AF) ** 2, called * 2 * AF * (1 - AF), called * AF ** 2])
+			codes = np.searchsorted(thresholds, rng.random(len(samples)), side='right')
+			fields = [chr, str(pos - HG19_OFFSET), rsIDs[i], ref[i], alt[i], '.', '.', '.', 'GT']
+			VCF_file.write('\t'.join(fields).encode('utf-8') + b'\t' + b'\t'.join(GENOTYPES[codes].tolist()) + b'\n')
+
+# === FUNCTION: Generate Fixtures ===
+def generate_fixtures(output_dir=DEFAULT_OUTPUT_DIR, chromosomes=('11',), n_AGVs=AGVS_PER_CHR, n_samples=None, seed=0):
+	rng = np.random.default_rng(seed)
+	paths = fixture_paths(output_dir)
+	os.makedirs(paths['box'], exist_ok=True)
+	LD_ids, VCF_ids = box_file_ids(AGVS_BOX_URLS_PATH), box_file_ids(VCFS_BOX_URLS_PATH)
+	samples = sample_names(n_samples=n_samples)
+
+	catalogs, rsID_chrs, counts = [], {}, {}
+	for chr in chromosomes:
+		AGV_pos = AGV_positions(n_AGVs)
+		AGV_ref, AGV_alt = synthetic_alleles(AGV_pos)
+		catalogs.append(pl.DataFrame({'chr': [chr] * len(AGV_pos), 'pos': AGV_pos, 'rsID': synthetic_rsIDs(chr, AGV_pos), 'ref': AGV_ref, 'alt': AGV_alt}))
+
+		AGV_LD = AGV_LD_table(chr, AGV_pos, rng)
+		with gzip.open(os.path.join(paths['box'], f"{LD_ids[f'chr{chr}']}.gz"), 'wb', compresslevel=GZIP_LEVEL) as LD_file:
+			AGV_LD.write_csv(LD_file, separator='\t')
+		write_VCF(os.path.join(paths['box'], f"{VCF_ids[f'chr{chr}']}.gz"), chr, AGV_pos, samples, rng)
+
+		rsID_chrs.update(dict.fromkeys(AGV_LD['LDV_rsID'].unique().to_list(), chr))
+		counts[chr] = {'AGVs': len(AGV_pos), 'AGV_LD_rows': AGV_LD.height, 'LD_variants': AGV_LD['LDV_pos'].n_unique()}
+
+	with gzip.open(paths['catalog'], 'wb') as catalog_file:
+		pl.concat(catalogs).write_csv(catalog_file, separator='\t', include_header=False)
+	with gzip.open(os.path.join(paths['box'], f'{RSID_CHR_PICKLE_ID}.pkl'), 'wb') as pickle_file:
+		pickle.dump(rsID_chrs, pickle_file)
+
+	manifest = {'chromosomes': list(chromosomes), 'AGVs_per_chr': n_AGVs, 'samples': len(samples), 'seed': seed, 'counts': counts}
+	with open(paths['manifest'], 'w') as manifest_file:
+		json.dump(manifest, manifest_file, indent=2)
+	return manifest
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Generate synthetic AGV catalogs, AGV-LD tables and VCFs for benchmarking.')
+	parser.add_argument('--chr', nargs='+', default=['11'], help='chromosomes to generate (default: 11)')
+	parser.add_argument('--AGVs', type=int, default=AGVS_PER_CHR, help='AGVs per chromosome; the AGV-LD table grows with it')
+	parser.add_argument('--samples', type=int, help='number of samples in each VCF (default: every sample in the annotation file)')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+	args = parser.parse_args()
+
+	chromosomes = [chr[3:] if chr.lower().startswith('chr') else chr for chr in args.chr]
+	manifest = generate_fixtures(args.output_dir, chromosomes, args.AGVs, args.samples, args.seed)
+	for chr, counts in manifest['counts'].items():
+		print(f"chr{chr}: {counts['AGVs']} AGVs, {counts['AGV_LD_rows']} AGV-LD rows, {manifest['samples']} samples written to {args.output_dir}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,29 @@
+# === Load Packages ===
+from genotype_store import build_genotype_store, store_paths, GENOTYPE_STORE_DIR
+from VCF import VCF_box_url
+import argparse
+import box_cache
+import os
+
+# === SETTINGS ===
+CHROMOSOMES = [str(i) for i in range(1, 23)] + ['X']
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Encode per-chromosome VCF genotypes as memory-mapped int8 dosage matrices.')
+	parser.add_argument('--chr', nargs='+', default=CHROMOSOMES, help='chromosomes to encode (default: all)')
+	parser.add_argument('--input-dir', help='directory holding chr{N}.vcf.gz files; downloaded from Box if omitted')
+	parser.add_argument('--output-dir', default=GENOTYPE_STORE_DIR)
+	args = parser.parse_args()
+
+	for chr in args.chr:
+		chr = chr[3:] if chr.lower().startswith('chr') else chr
+		if args.input_dir:
+			source = os.path.join(args.input_dir, f'chr{chr}.vcf.gz')
+		else:
+			source = box_cache.fetch(VCF_box_url(chr))
+		n_variants, n_samples = build_genotype_store(source, chr, args.output_dir)
+		print(f'chr{chr}: {n_variants} variants x {n_samples} samples written to {store_paths(chr, args.output_dir)[0]}')
+
+if __name__ == "__main__":
+	main()
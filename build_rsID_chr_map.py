@@ -0,0 +1,28 @@
+# === Load Packages ===
+from rsID_chr_map import build_rsID_chr_map, map_paths, RSID_CHR_MAP_DIR, RSID_CHR_PICKLE_ID
+import argparse
+import box_cache
+import gzip
+import pickle
+
+# === FUNCTION: Build Map From Pickle ===
+def build_from_pickle(pickle_path, map_dir=None):
+	# The pickle comes from our own Box folder. This script is the only place it is unpickled;
+	# the app only opens the map written here.
+	with gzip.open(pickle_path, 'rb') as gz_file:
+		rsID_chr_dict = pickle.load(gz_file)
+	return build_rsID_chr_map(rsID_chr_dict.items(), map_dir)
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Build the memory-mapped rsID to chromosome map.')
+	parser.add_argument('--input', help='gzipped rsID->chr pickle; downloaded from Box if omitted')
+	parser.add_argument('--output-dir', default=RSID_CHR_MAP_DIR)
+	args = parser.parse_args()
+
+	source = args.input or box_cache.fetch(box_cache.box_url(RSID_CHR_PICKLE_ID, '.pkl'))
+	n_rsIDs = build_from_pickle(source, args.output_dir)
+	print(f'{n_rsIDs} rsIDs written to {map_paths(args.output_dir)[0]}')
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,23 @@
+# === Load Packages ===
+from contextvars import ContextVar
+
+# === SETTINGS ===
+# Pool threads cannot be stopped from outside, so a query stage that times out is cancelled by
+# setting its event; the download and decompression loops it runs check the event once per chunk
+# and raise QueryCancelled. Threads run with a copy of the submitting context, so the event only
+# reaches the stage it was given to. Code outside a cancellable stage never sees an event.
+cancel_event = ContextVar('cancel_event', default=None)
+
+# === CLASS: Query Cancelled ===
+class QueryCancelled(Exception):
+	pass
+
+def check_cancelled():
+	event = cancel_event.get()
+	if event is not None and event.is_set():
+		raise QueryCancelled("Query stage cancelled.")
+
+def run_cancellable(event, function, *args, **kwargs):
+	# Call within copy_context().run so the event is set only in the copied context.
+	cancel_event.set(event)
+	return function(*args, **kwargs)
@@ -0,0 +1,174 @@
+# === Load Packages ===
+from batch_query import BATCH_WORKERS, parse_batch_input, resolve_batch_variant
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from io import BytesIO
+import allele_frequencies
+import genotype_store
+import numpy as np
+import os
+import polars as pl
+import zipfile
+
+# === SETTINGS ===
+# A genotype matrix holds the genotypes of a list of AGVs for the samples that pass Region and
+# Date_mean filters, taken from the samples the AF table uses: one per specimen, without archaic
+# genomes and reference sequences. AGVs are grouped by chromosome, each chromosome's genotype
+# store or VCF is read once for all of its AGVs, and the matrix is streamed as a zip archive one
+# chromosome at a time, in one of two layouts, each with a separate sample table:
+# - plink: PLINK 1 binary files, dosages packed four to a byte with the alt allele as A1, and the
+#   sample annotation in {name}.samples.tsv;
+# - arrow: one Arrow IPC file per chromosome with a row per AGV and an Int8 alt-allele dosage
+#   column per sample (-1 = missing), and the sample annotation in {name}.samples.arrow.
+# Positions in the genotype files are hg19; the hg38 AGV position is kept alongside.
+GENOTYPE_MATRIX_MAX_VARIANTS = int(os.environ.get('AGV_GENOTYPE_MATRIX_MAX_VARIANTS', 5000))
+GENOTYPE_MATRIX_FORMATS = ('plink', 'arrow')
+GENOTYPE_MATRIX_NAME = 'AGV_genotypes'
+
+# PLINK .bed codes by dosage + 1: missing 01, hom. ref (A2) 11, het. 10, hom. alt (A1) 00.
+BED_MAGIC = bytes([0x6c, 0x1b, 0x01])
+BED_CODES = np.array([0b01, 0b11, 0b10, 0b00], dtype=np.uint8)
+VARIANT_COLUMNS = {'query_variant': pl.Utf8, 'chr': pl.Utf8, 'pos_hg38': pl.Int64, 'pos_hg19': pl.Int64, 'rsID': pl.Utf8, 'ref': pl.Utf8, 'alt': pl.Utf8}
+STATUS_COLUMNS = {'query_variant': pl.Utf8, 'chr': pl.Utf8, 'pos': pl.Int64, 'rsID': pl.Utf8, 'status': pl.Utf8}
+
+# === UTILS ===
+class ChunkWriter:
+	# A write-only file object whose contents are handed out as they are written, so a zip archive
+	# can be streamed while it is built (zipfile writes data descriptors to unseekable files).
+	def __init__(self):
+		self.chunks = []
+
+	def write(self, data):
+		self.chunks.append(bytes(data))
+		return len(data)
+
+	def flush(self):
+		pass
+
+	def take(self):
+		data = b''.join(self.chunks)
+		self.chunks = []
+		return data
+
+def tsv_bytes(df):
+	return df.write_csv(separator='\t').encode('utf-8')
+
+def ipc_bytes(df):
+	buffer = BytesIO()
+	df.write_ipc(buffer)
+	return buffer.getvalue()
+
+def pack_bed_rows(dosages):
+	codes = BED_CODES[np.clip(dosages.astype(np.int64), -1, 2) + 1]
+	codes = np.pad(codes, ((0, 0), (0, -codes.shape[1] % 4)), constant_values=0).reshape(codes.shape[0], -1, 4)
+	return (codes[..., 0] | (codes[..., 1] << 2) | (codes[..., 2] << 4) | (codes[..., 3] << 6)).astype(np.uint8).tobytes()
+
+# === FUNCTION: Select Samples ===
+# Genetic_IDs of the AF samples of a VCF sample order whose Region is one of regions and whose
+# Date_mean is within [min_date, max_date] years BP; a filter that is None is not applied.
+def select_samples(sample_names, regions=None, min_date=None, max_date=None):
+	panel = allele_frequencies.sample_panel(sample_names)
+	keep = np.ones(len(panel.columns), dtype=bool)
+	if regions:
+		keep &= np.isin(panel.regions, list(regions)) & ~panel.region_nulls
+	if min_date is not None:
+		keep &= (panel.dates >= min_date) & ~panel.date_nulls
+	if max_date is not None:
+		keep &= (panel.dates <= max_date) & ~panel.date_nulls
+	return [panel.sample_names[column] for column in panel.columns[keep]]
+
+def sample_table(genetic_IDs):
+	return pl.DataFrame({'Genetic_ID': genetic_IDs}, schema={'Genetic_ID': pl.Utf8}).join(allele_frequencies.load_sample_annotation().frame(), on='Genetic_ID', how='left', maintain_order='left')
+
+def sample_dosages(dosages, sample_names, genetic_IDs):
+	# Columns of genetic_IDs in this chromosome's sample order; samples it lacks are missing.
+	columns = {name: i for i, name in enumerate(sample_names)}
+	columns = np.asarray([columns.get(genetic_ID, -1) for genetic_ID in genetic_IDs], dtype=np.int64)
+	selected = dosages[:, np.maximum(columns, 0)] if len(sample_names) else np.zeros((len(dosages), len(columns)), dtype=np.int8)
+	selected[:, columns < 0] = genotype_store.MISSING_DOSAGE
+	return selected
+
+# === FUNCTION: Resolve AGVs ===
+# Resolves chr:pos and rsID tokens as a batch query does and groups the AGVs by chromosome.
+# Returns the groups and one status row per token; tokens that are not AGVs are only reported.
+def resolve_AGVs(variants):
+	if isinstance(variants, str):
+		variants = parse_batch_input(variants)
+	if not variants:
+		raise ValueError("Please enter at least one AGV.")
+	if len(variants) > GENOTYPE_MATRIX_MAX_VARIANTS:
+		raise ValueError(f"Genotype matrices are limited to {GENOTYPE_MATRIX_MAX_VARIANTS} AGVs; {len(variants)} were given.")
+
+	resolved = [resolve_batch_variant(token) for token in variants]
+	by_chr = {}
+	for variant in resolved:
+		if variant['status'] is None and not variant['is_AGV']:
+			variant['status'] = 'not AGV'
+		elif variant['status'] is None:
+			by_chr.setdefault(variant['chr'], []).append(variant)
+	return by_chr, resolved
+
+# === FUNCTION: Stream Genotype Matrix ===
+def extract_chromosome(variant_chr, chr_variants):
+	return genotype_store.fetch_variants_dosages(variant_chr, [variant['rsID'] for variant in chr_variants])
+
+def chromosome_matrices(by_chr, max_workers=None):
+	# Chromosomes are read in parallel and handed out in order, each with its AGVs and any error.
+	with ThreadPoolExecutor(max_workers=max_workers or BATCH_WORKERS) as executor:
+		futures = [(variant_chr, chr_variants, executor.submit(copy_context().run, extract_chromosome, variant_chr, chr_variants)) for variant_chr, chr_variants in by_chr.items()]
+		for variant_chr, chr_variants, future in futures:
+			try:
+				yield variant_chr, chr_variants, future.result(), None
+			except Exception as e:
+				yield variant_chr, chr_variants, None, e
+
+# Yields the zip archive in chunks as each chromosome is written. by_chr and resolved come from
+# resolve_AGVs, whose status rows are completed here and written to {name}.status.tsv.
+def stream_genotype_matrix(by_chr, resolved, regions=None, min_date=None, max_date=None, output_format='plink', name=GENOTYPE_MATRIX_NAME):
+	writer = ChunkWriter()
+	genetic_IDs, variant_rows = None, []
+	with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+		bed = archive.open(f'{name}.bed', 'w', force_zip64=True) if output_format == 'plink' else None
+		if bed is not None:
+			bed.write(BED_MAGIC)
+
+		for variant_chr, chr_variants, result, error in chromosome_matrices(by_chr):
+			if error is not None:
+				for variant in chr_variants:
+					variant['status'] = f"error: {error}"
+				continue
+			sample_names, found, positions, dosages = result
+			if genetic_IDs is None:
+				genetic_IDs = select_samples(sample_names, regions, min_date, max_date)
+			matrix = sample_dosages(dosages[found], sample_names, genetic_IDs)
+
+			chr_rows = []
+			for variant, is_found, pos_hg19 in zip(chr_variants, found.tolist(), positions.tolist()):
+				variant['status'] = 'extracted' if is_found else 'genotypes not found'
+				if is_found:
+					chr_rows.append({'query_variant': variant['query_variant'], 'chr': variant_chr, 'pos_hg38': variant['pos'], 'pos_hg19': pos_hg19, 'rsID': variant['rsID'], 'ref': variant['ref'], 'alt': variant['alt']})
+			variant_rows.extend(chr_rows)
+
+			if bed is not None:
+				bed.write(pack_bed_rows(matrix))
+			elif chr_rows:
+				variants_df = pl.DataFrame(chr_rows, schema=VARIANT_COLUMNS)
+				genotypes_df = pl.from_numpy(matrix, schema=genetic_IDs, orient='row') if genetic_IDs else pl.DataFrame()
+				archive.writestr(f'{name}.chr{variant_chr}.arrow', ipc_bytes(pl.concat([variants_df, genotypes_df], how='horizontal')))
+			yield writer.take()
+
+		genetic_IDs = genetic_IDs or []
+		samples_df = sample_table(genetic_IDs)
+		variants_df = pl.DataFrame(variant_rows, schema=VARIANT_COLUMNS)
+		if bed is not None:
+			bed.close()
+			bim = variants_df.select('chr', 'rsID', pl.lit(0).alias('cM'), 'pos_hg19', 'alt', 'ref')
+			archive.writestr(f'{name}.bim', bim.write_csv(separator='\t', include_header=False))
+			fam = pl.DataFrame({'FID': genetic_IDs, 'IID': genetic_IDs}, schema={'FID': pl.Utf8, 'IID': pl.Utf8}).with_columns(pl.lit(0).alias('father'), pl.lit(0).alias('mother'), pl.lit(0).alias('sex'), pl.lit(-9).alias('phenotype'))
+			archive.writestr(f'{name}.fam', fam.write_csv(separator='\t', include_header=False))
+			archive.writestr(f'{name}.variants.tsv', tsv_bytes(variants_df))
+			archive.writestr(f'{name}.samples.tsv', tsv_bytes(samples_df))
+		else:
+			archive.writestr(f'{name}.samples.arrow', ipc_bytes(samples_df))
+		archive.writestr(f'{name}.status.tsv', tsv_bytes(pl.DataFrame([{column: variant[column] for column in STATUS_COLUMNS} for variant in resolved], schema=STATUS_COLUMNS)))
+	yield writer.take()
@@ -0,0 +1,219 @@
+# === Load Packages ===
+import gzip
+import numpy as np
+import os
+import polars as pl
+import telemetry
+import VCF
+
+# === SETTINGS ===
+# Each chromosome is stored as a variants x samples int8 matrix of alt-allele dosages
+# (-1 = missing) in a raw memory-mapped file, so one AGV's genotypes are a single row slice.
+GENOTYPE_STORE_DIR = os.environ.get('AGV_GENOTYPE_STORE_DIR', 'files/genotype_store')
+SAMPLE_ANNOTATION_PATH = 'files/AADR_sample_annotation_basic.txt.gz'
+ARCHAIC_SAMPLE_NAMES = {"AltaiNeanderthal_snpAD.DG": "Altai", "Chagyrskaya_noUDG.SG": "Chagyrskaya", "Denisova3_snpAD.DG": "Denisovan", "Vindija_snpAD.DG": "Vindija"}
+MISSING_DOSAGE = -1
+GENOTYPE_STRINGS = np.array(['./.', '0/0', '0/1', '1/1'])
+GENOTYPE_CODES = {b'./.': -1, b'0/0': 0, b'0/1': 1, b'1/1': 2}
+
+# === UTILS ===
+def store_paths(variant_chr, store_dir=None):
+	base = os.path.join(store_dir or GENOTYPE_STORE_DIR, f'chr{variant_chr}')
+	return base + '.gt.int8', base + '.index.npz'
+
+def encode_genotype(GT):
+	code = GENOTYPE_CODES.get(GT)
+	if code is not None:
+		return code, False
+	# Calls other than the four canonical ones (phased, multiallelic) keep their text as an exception.
+	return (MISSING_DOSAGE if GT == b'./.' else GT.count(b'1')), True
+
+def encode_genotype_row(sample_fields, n_samples):
+	# Fast path: every call is three characters wide, so the sample columns form an (n, 4) byte grid.
+	# A row of mixed-width calls (e.g. '0' and '1/10') can have the same length, so the grid is
+	# only used when every fourth byte is a tab.
+	grid = None
+	if len(sample_fields) == 4 * n_samples - 1:
+		grid = np.frombuffer(sample_fields + b'\t', dtype=np.uint8).reshape(n_samples, 4)
+		if not (grid[:, 3] == ord('\t')).all():
+			grid = None
+	if grid is not None:
+		first, separator, second = grid[:, 0], grid[:, 1], grid[:, 2]
+		codes = (first == ord('1')).astype(np.int8) + (second == ord('1')).astype(np.int8)
+		missing = (first == ord('.')) & (second == ord('.')) & (separator == ord('/'))
+		codes[missing] = MISSING_DOSAGE
+		canonical = (separator == ord('/')) & (missing | ((first == ord('0')) & ((second == ord('0')) | (second == ord('1')))) | ((first == ord('1')) & (second == ord('1'))))
+		exception_columns = np.flatnonzero(~canonical)
+		for column in exception_columns:
+			codes[column], _ = encode_genotype(bytes(grid[column, :3]))
+		return codes, exception_columns, [bytes(grid[column, :3]) for column in exception_columns]
+
+	GTs = sample_fields.split(b'\t')
+	codes = np.empty(len(GTs), dtype=np.int8)
+	exception_columns = []
+	for column, GT in enumerate(GTs):
+		codes[column], is_exception = encode_genotype(GT)
+		if is_exception:
+			exception_columns.append(column)
+	return codes, np.asarray(exception_columns, dtype=np.int64), [GTs[column] for column in exception_columns]
+
+# === FUNCTION: Build Genotype Store ===
+def build_genotype_store(source, variant_chr, store_dir=None, annotation_path=SAMPLE_ANNOTATION_PATH):
+	matrix_path, index_path = store_paths(variant_chr, store_dir)
+	os.makedirs(os.path.dirname(matrix_path) or '.', exist_ok=True)
+
+	sample_names, variant_IDs, positions = [], [], []
+	exception_rows, exception_columns, exception_GTs = [], [], []
+
+	tmp_matrix_path = matrix_path + '.tmp'
+	with gzip.open(source, 'rb') as vcf_file, open(tmp_matrix_path, 'wb') as matrix_file:
+		for raw_line in vcf_file:
+			if raw_line.startswith(b'#'):
+				if raw_line.startswith(b'#CHROM'):
+					sample_names = raw_line.rstrip(b'\r\n').decode('utf-8').split('\t')[9:]
+				continue
+			fields = raw_line.rstrip(b'\r\n').split(b'\t', 9)
+			row, columns, GTs = encode_genotype_row(fields[9] if len(fields) > 9 else b'', len(sample_names))
+			exception_rows.extend([len(variant_IDs)] * len(columns))
+			exception_columns.extend(columns.tolist())
+			exception_GTs.extend(GT.decode('utf-8') for GT in GTs)
+			matrix_file.write(row.tobytes())
+			positions.append(int(fields[1]))
+			variant_IDs.append(fields[2].decode('utf-8'))
+
+	variant_IDs = np.asarray(variant_IDs, dtype=str)
+	rsID_ints = [VCF.rsID_to_int(variant_ID) for variant_ID in variant_IDs]
+	rsID_rows = np.asarray([i for i, rsID_int in enumerate(rsID_ints) if rsID_int is not None], dtype=np.int64)
+	rsID_keys = np.asarray([rsID_int for rsID_int in rsID_ints if rsID_int is not None], dtype=np.uint64)
+	rsID_order = np.argsort(rsID_keys, kind='stable')
+
+	sample_annotation = pl.read_csv(annotation_path, separator='\t', has_header=True, low_memory=True)
+	annotation_rows = dict(zip(sample_annotation['Genetic_ID'].to_list(), range(sample_annotation.height)))
+	locations = sample_annotation['Location'].fill_null('').to_list()
+	sample_rows = np.asarray([annotation_rows.get(name, -1) for name in sample_names], dtype=np.int64)
+	is_archaic = np.asarray([row >= 0 and ('Denisova' in locations[row] or 'Neanderthal' in locations[row]) for row in sample_rows], dtype=bool)
+	is_reference = np.asarray([row >= 0 and 'REF' in locations[row] for row in sample_rows], dtype=bool)
+
+	tmp_index_path = index_path + '.tmp.npz'
+	np.savez(
+		tmp_index_path,
+		shape=np.asarray([len(variant_IDs), len(sample_names)], dtype=np.int64),
+		variant_IDs=variant_IDs,
+		positions=np.asarray(positions, dtype=np.int64),
+		rsID_keys=rsID_keys[rsID_order],
+		rsID_rows=rsID_rows[rsID_order],
+		sample_names=np.asarray(sample_names, dtype=str),
+		sample_annotation_rows=sample_rows,
+		is_archaic=is_archaic,
+		is_reference=is_reference,
+		exception_rows=np.asarray(exception_rows, dtype=np.int64),
+		exception_columns=np.asarray(exception_columns, dtype=np.int64),
+		exception_GTs=np.asarray(exception_GTs, dtype=str)
+	)
+	os.replace(tmp_matrix_path, matrix_path)
+	os.replace(tmp_index_path, index_path)
+	return len(variant_IDs), len(sample_names)
+
+# === CLASS: Genotype Store Reader ===
+class GenotypeStore:
+	def __init__(self, matrix_path, index_path):
+		with np.load(index_path, allow_pickle=False) as index:
+			n_variants, n_samples = (int(n) for n in index['shape'])
+			self.variant_IDs = index['variant_IDs']
+			self.positions = index['positions']
+			self.rsID_keys = index['rsID_keys']
+			self.rsID_rows = index['rsID_rows']
+			self.sample_names = index['sample_names'].tolist()
+			self.sample_annotation_rows = index['sample_annotation_rows']
+			self.is_archaic = index['is_archaic']
+			self.is_reference = index['is_reference']
+			self.exception_rows = index['exception_rows']
+			self.exception_columns = index['exception_columns']
+			self.exception_GTs = index['exception_GTs']
+		self.matrix = np.memmap(matrix_path, dtype=np.int8, mode='r', shape=(n_variants, n_samples)) if n_variants else np.empty((0, n_samples), dtype=np.int8)
+		self.other_IDs = {variant_ID: i for i, variant_ID in enumerate(self.variant_IDs.tolist()) if VCF.rsID_to_int(variant_ID) is None}
+
+	@property
+	def shape(self):
+		return self.matrix.shape
+
+	def row_for_rsID(self, rsID):
+		key = VCF.rsID_to_int(rsID)
+		if key is None:
+			return self.other_IDs.get(rsID)
+		i = int(np.searchsorted(self.rsID_keys, key))
+		if i < len(self.rsID_keys) and self.rsID_keys[i] == key:
+			return int(self.rsID_rows[i])
+		return None
+
+	def rows_for_pos(self, pos):
+		return np.flatnonzero(self.positions == pos)
+
+	def dosages(self, row):
+		# A read-only view into the memory map; nothing is copied until the caller does so.
+		return np.asarray(self.matrix[row])
+
+	def dosage_series(self, row, name='dosage'):
+		return pl.Series(name, self.dosages(row))
+
+	def dosage_matrix(self, rows):
+		return self.matrix[np.asarray(rows, dtype=np.int64)]
+
+	def genotype_strings(self, row):
+		GTs = GENOTYPE_STRINGS[self.dosages(row).astype(np.int64) + 1].tolist()
+		start, end = np.searchsorted(self.exception_rows, [row, row + 1])
+		for column, GT in zip(self.exception_columns[start:end].tolist(), self.exception_GTs[start:end].tolist()):
+			GTs[column] = GT
+		return GTs
+
+# Only loaded stores are cached, so a store built while the app is running is picked up.
+genotype_stores = {}
+
+def load_genotype_store(variant_chr, store_dir=None):
+	if (variant_chr, store_dir) not in genotype_stores:
+		matrix_path, index_path = store_paths(variant_chr, store_dir)
+		if not (os.path.exists(matrix_path) and os.path.exists(index_path)):
+			return None
+		genotype_stores[variant_chr, store_dir] = GenotypeStore(matrix_path, index_path)
+	return genotype_stores[variant_chr, store_dir]
+
+# === FUNCTION: Fetch Genotypes for a Variant ===
+def fetch_variant_GTs(variant_chr, variant_rsID):
+	with telemetry.span('genotype_lookup') as span:
+		store = load_genotype_store(variant_chr)
+		if store is not None:
+			row = store.row_for_rsID(variant_rsID)
+			sample_names, GTs = store.sample_names, (store.genotype_strings(row) if row is not None else None)
+		else:
+			sample_names, GTs = VCF.fetch_variant_GTs(variant_chr, variant_rsID)
+		span.set(rows=len(GTs) if GTs is not None else 0)
+	return sample_names, GTs
+
+# === FUNCTION: Fetch Dosages for Many Variants ===
+# Reads the chromosome's genotype store, or else its VCF, once for all of variant_rsIDs. Returns
+# the sample names and, in variant_rsIDs order, whether each variant was found, its position in
+# the genotype files (hg19) and its row of dosages (all missing when not found).
+def fetch_variants_dosages(variant_chr, variant_rsIDs):
+	with telemetry.span('genotype_lookup') as span:
+		store = load_genotype_store(variant_chr)
+		if store is not None:
+			sample_names = store.sample_names
+			rows = [store.row_for_rsID(rsID) for rsID in variant_rsIDs]
+			found = np.asarray([row is not None for row in rows], dtype=bool)
+			found_rows = np.asarray([row for row in rows if row is not None], dtype=np.int64)
+			positions = np.zeros(len(rows), dtype=np.int64)
+			positions[found] = store.positions[found_rows]
+			dosages = np.full((len(rows), len(sample_names)), MISSING_DOSAGE, dtype=np.int8)
+			# Rows are read in file order.
+			order = np.argsort(found_rows, kind='stable')
+			dosages[np.flatnonzero(found)[order]] = store.dosage_matrix(found_rows[order])
+		else:
+			sample_names, records = VCF.fetch_variants_records(variant_chr, variant_rsIDs)
+			found = np.asarray([rsID in records for rsID in variant_rsIDs], dtype=bool)
+			positions = np.asarray([int(records[rsID][1]) if rsID in records else 0 for rsID in variant_rsIDs], dtype=np.int64)
+			dosages = np.full((len(variant_rsIDs), len(sample_names)), MISSING_DOSAGE, dtype=np.int8)
+			for i, rsID in enumerate(variant_rsIDs):
+				if rsID in records:
+					dosages[i] = encode_genotype_row('\t'.join(records[rsID][9:]).encode('utf-8'), len(sample_names))[0]
+		span.set(rows=int(found.sum()), bytes=dosages.nbytes)
+	return sample_names, found, positions, dosages
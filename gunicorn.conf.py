@@ -0,0 +1,11 @@
+# === Load Packages ===
+import warmup
+
+# === SETTINGS ===
+# Loads the app in the master before forking workers, so the reference data built when app is
+# imported (see warmup.py) is shared by all workers copy-on-write.
+preload_app = True
+
+# === HOOKS ===
+def post_worker_init(worker):
+	warmup.start_worker_warm_up()
@@ -0,0 +1,55 @@
+# === Load Packages ===
+import box_cache
+import hashlib
+import json
+import os
+import result_store
+
+# === SETTINGS ===
+# Complete query results are memoized in the shared result store under a handle derived from the
+# normalized variant, so chr:pos and rsID queries for the same AGV share one entry across workers.
+# Entries are evicted least-recently-used with the rest of the store; bumping AGV_DATA_VERSION
+# invalidates every entry built from older data files.
+DATA_VERSION = os.environ.get('AGV_DATA_VERSION', '1')
+STATS_PATH = os.path.join(result_store.RESULT_STORE_DIR, '.query_cache_stats.json')
+
+# === UTILS ===
+def query_key(variant_chr, variant_pos, variant_rsID, min_r2=None, min_D=None, ancestry_groups=None):
+	variant = ['pos', str(variant_chr), str(variant_pos)] if variant_pos else ['rsID', str(variant_chr), variant_rsID]
+	# No ancestry filter (None) and an empty selection, which keeps no proxies, are distinct keys.
+	parts = [DATA_VERSION, variant, min_r2, min_D, sorted(ancestry_groups) if ancestry_groups is not None else None]
+	return 'q' + hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:32]
+
+def record(event, stats_path=None):
+	stats_path = stats_path or STATS_PATH
+	with box_cache.file_lock(stats_path + '.lock'):
+		stats = box_cache.read_metadata(stats_path) or {'hits': 0, 'misses': 0}
+		stats[event] = stats.get(event, 0) + 1
+		box_cache.write_atomic_json(stats_path, stats)
+
+def stats(stats_path=None):
+	return box_cache.read_metadata(stats_path or STATS_PATH) or {'hits': 0, 'misses': 0}
+
+# === FUNCTION: Memoized Query ===
+# compute() returns (frames, cacheable). Returns the result handle and the frames; results of
+# failed or partial queries are stored under a one-off handle so they are retried next time.
+# A per-key lock deduplicates concurrent jobs for the same query: later jobs wait for the first
+# one and then read its result. The lock file is removed with the key's result when it is
+# evicted, or here, while still held, when nothing is stored under the key.
+def cached_query(key, compute):
+	key_lock_path = result_store.lock_path(key)
+	with box_cache.file_lock(key_lock_path):
+		try:
+			frames = result_store.get_results(key)
+			if frames is not None:
+				box_cache.touch(result_store.handle_dir(key))
+				record('hits')
+				return key, frames
+
+			record('misses')
+			frames, cacheable = compute()
+			handle = result_store.put_results(frames, handle=key if cacheable else None)
+		finally:
+			if not os.path.isdir(result_store.handle_dir(key)) and os.path.exists(key_lock_path):
+				os.remove(key_lock_path)
+	return handle, {name: df for name, df in frames.items() if df is not None}
@@ -0,0 +1,319 @@
+# === Load Packages ===
+from io import BytesIO
+from rsID_chr_map import CHROMOSOMES
+import AGV_catalog
+import AGV_LD
+import allele_frequencies
+import argparse
+import genotype_store
+import json
+import multiprocessing
+import os
+import polars as pl
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import telemetry
+import threading
+import time
+import variants
+import VCF
+
+# === SETTINGS ===
+# An optional resident query service: one process per shard, each owning a fixed set of
+# chromosomes and keeping their indexes, genotype stores and sample frames in memory, so they
+# are held once rather than by every gunicorn worker, and a heavy query on one chromosome only
+# queues behind its own shard. Shards answer variant lookups, LD proxy and partner queries and the
+# genotype/AF pipeline over Unix sockets at {AGV_QUERY_SERVICE_SOCKET}.{shard}. Each shard runs at
+# most AGV_QUERY_SERVICE_CONCURRENCY requests at once, and proxy requests for the same chromosome
+# and filters that arrive within AGV_QUERY_SERVICE_BATCH_WAIT_MS of each other share one scan.
+# Clients use the service when AGV_QUERY_SERVICE_SOCKET is set and run the query in-process when
+# a shard cannot be reached; AGV_QUERY_SERVICE_SHARDS must match on both sides.
+QUERY_SERVICE_SOCKET = os.environ.get('AGV_QUERY_SERVICE_SOCKET', '')
+QUERY_SERVICE_SHARDS = int(os.environ.get('AGV_QUERY_SERVICE_SHARDS', 1))
+QUERY_SERVICE_CONCURRENCY = int(os.environ.get('AGV_QUERY_SERVICE_CONCURRENCY', 4))
+QUERY_SERVICE_BATCH_WAIT_MS = float(os.environ.get('AGV_QUERY_SERVICE_BATCH_WAIT_MS', 5))
+QUERY_SERVICE_TIMEOUT_SECONDS = float(os.environ.get('AGV_QUERY_SERVICE_TIMEOUT_SECONDS', 150))
+QUERY_SERVICE_RETRY_SECONDS = 30
+DEFAULT_SOCKET = os.path.join('cache', 'query_service.sock')
+
+HEADER_SIZE = struct.Struct('>I')
+unavailable_until = {}
+
+# === UTILS ===
+def shard_for(variant_chr, n_shards=None):
+	# Chromosomes are dealt out in order, so each shard gets a mix of large and small ones.
+	variant_chr = str(variant_chr) if variant_chr else None
+	return CHROMOSOMES.index(variant_chr) % (n_shards or QUERY_SERVICE_SHARDS) if variant_chr in CHROMOSOMES else 0
+
+def shard_chromosomes(shard, n_shards):
+	return [chr for chr in CHROMOSOMES if shard_for(chr, n_shards) == shard]
+
+def shard_socket(shard, socket_path=None):
+	return f'{socket_path or QUERY_SERVICE_SOCKET}.{shard}'
+
+def json_default(value):
+	# numpy scalars, e.g. positions and genotype calls.
+	if hasattr(value, 'item'):
+		return value.item()
+	raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+# === FUNCTION: Messages ===
+# A message is a 4-byte length, a JSON header, then the Arrow IPC stream of each frame the header
+# lists as [name, size].
+def receive_exactly(sock, size):
+	data = bytearray()
+	while len(data) < size:
+		chunk = sock.recv(min(size - len(data), 1024 * 1024))
+		if not chunk:
+			raise ConnectionError('Query service connection closed mid-message.')
+		data += chunk
+	return bytes(data)
+
+def send_message(sock, header, frames=None):
+	payloads = {}
+	for name, df in (frames or {}).items():
+		if df is not None:
+			buffer = BytesIO()
+			df.write_ipc_stream(buffer)
+			payloads[name] = buffer.getvalue()
+	header = dict(header, frames=[[name, len(payload)] for name, payload in payloads.items()])
+	encoded = json.dumps(header, default=json_default).encode('utf-8')
+	sock.sendall(HEADER_SIZE.pack(len(encoded)) + encoded + b''.join(payloads.values()))
+	return HEADER_SIZE.size + len(encoded) + sum(len(payload) for payload in payloads.values())
+
+def receive_message(sock):
+	header = json.loads(receive_exactly(sock, HEADER_SIZE.unpack(receive_exactly(sock, HEADER_SIZE.size))[0]))
+	frames = {name: pl.read_ipc_stream(BytesIO(receive_exactly(sock, size))) for name, size in header['frames']}
+	return header, frames
+
+# === CLASS: Proxy Batcher ===
+# The first request for a chromosome and filter set waits batch_wait seconds for others to join,
+# then runs one query_AGV_LDVs over all of their variants, as a batch query does; each request
+# then keeps the rows of its own variants, which stay in the same r2 order.
+class ProxyBatch:
+	def __init__(self):
+		self.positions, self.rsIDs = set(), set()
+		self.n_requests = 0
+		self.done = threading.Event()
+		self.result = self.error = None
+
+class ProxyBatcher:
+	def __init__(self, batch_wait):
+		self.batch_wait = batch_wait
+		self.lock = threading.Lock()
+		self.open_batches = {}
+
+	def query(self, variant_chr, LDV_positions=(), LDV_rsIDs=(), **filters):
+		key = (variant_chr, json.dumps(filters, sort_keys=True))
+		with self.lock:
+			batch = self.open_batches.get(key)
+			leader = batch is None
+			if leader:
+				batch = self.open_batches[key] = ProxyBatch()
+			batch.positions.update(int(pos) for pos in LDV_positions)
+			batch.rsIDs.update(LDV_rsIDs)
+			batch.n_requests += 1
+
+		if leader:
+			time.sleep(self.batch_wait)
+			with self.lock:
+				del self.open_batches[key]
+			try:
+				batch.result = AGV_LD.query_AGV_LDVs(variant_chr, sorted(batch.positions), sorted(batch.rsIDs), **filters)
+			except Exception as e:
+				batch.error = e
+			batch.done.set()
+		else:
+			batch.done.wait()
+
+		if batch.error is not None:
+			raise batch.error
+		if batch.n_requests == 1:
+			return batch.result
+		return batch.result.filter(pl.col('LDV_pos').is_in([int(pos) for pos in LDV_positions]) | pl.col('LDV_rsID').is_in(list(LDV_rsIDs)))
+
+# === FUNCTION: Shard Operations ===
+# Each returns the JSON values and the frames of its response.
+def lookup_operation(server, input_chr=None, input_pos=None, input_rsID=None):
+	return {'variant': list(variants.process_variant(input_chr, input_pos, input_rsID))}, {}
+
+def proxies_operation(server, variant_chr, LDV_positions=(), LDV_rsIDs=(), min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None):
+	return {}, {'proxies': server.batcher.query(variant_chr, LDV_positions, LDV_rsIDs, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)}
+
+def partners_operation(server, variant_chr, AGV_pos, min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None):
+	return {}, {'partners': AGV_LD.query_AGV_partners(variant_chr, AGV_pos, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)}
+
+def AFs_operation(server, variant_chr, variant_rsID, date_bins=allele_frequencies.DATE_BINS, region_groups=allele_frequencies.REGION_GROUPS, replicates=0):
+	archaic_GTs_dict, GTs_df, AFs_summary_df = allele_frequencies.retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID, date_bins=date_bins, region_groups=region_groups, replicates=replicates)
+	return {'archaic': archaic_GTs_dict}, {'genotypes': GTs_df, 'AFs': AFs_summary_df}
+
+OPERATIONS = {
+	'lookup': lookup_operation,
+	'proxies': proxies_operation,
+	'partners': partners_operation,
+	'AFs': AFs_operation
+}
+
+# === CLASS: Shard Server ===
+class ShardHandler(socketserver.BaseRequestHandler):
+	def handle(self):
+		try:
+			request, _ = receive_message(self.request)
+		except (ConnectionError, ValueError) as e:
+			print(f"Query service received a bad request: {e}")
+			return
+		with self.server.slots:
+			try:
+				with telemetry.trace(f"query_service.{request['op']}"):
+					values, frames = OPERATIONS[request['op']](self.server, **request['args'])
+				response = ({'ok': True, 'values': values}, frames)
+			except Exception as e:
+				response = ({'ok': False, 'error': f'{type(e).__name__}: {e}'}, None)
+			try:
+				send_message(self.request, *response)
+			except OSError as e:
+				print(f"Query service could not send a response: {e}")
+
+class ShardServer(socketserver.ThreadingUnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, socket_path, concurrency, batch_wait):
+		self.slots = threading.BoundedSemaphore(concurrency)
+		self.batcher = ProxyBatcher(batch_wait)
+		super().__init__(socket_path, ShardHandler)
+
+# === FUNCTION: Run a Shard ===
+def warm_up_shard(chromosomes):
+	steps = [('AGV_catalog', AGV_catalog.get_AGV_catalog)]
+	for chr in chromosomes:
+		steps.append((f'chr{chr} partner index', lambda chr=chr: AGV_LD.load_AGV_partner_index(chr)))
+		for source in (genotype_store.load_genotype_store(chr), VCF.load_VCF_index(chr)):
+			if source is not None:
+				steps.append((f'chr{chr} sample frame', lambda source=source: allele_frequencies.sample_panel(source.sample_names).sample_frame()))
+	for name, step in steps:
+		try:
+			step()
+		except Exception as e:
+			print(f"Error warming up {name}: {e}")
+
+def serve_shard(shard, n_shards, socket_path, concurrency, batch_wait):
+	chromosomes = shard_chromosomes(shard, n_shards)
+	path = shard_socket(shard, socket_path)
+	# The socket only appears once the shard is warm; until then clients query in-process.
+	warm_up_shard(chromosomes)
+	if os.path.exists(path):
+		os.remove(path)
+	server = ShardServer(path, concurrency, batch_wait)
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	print(f"Query service shard {shard} serving chr{', chr'.join(chromosomes)} on {path}")
+	try:
+		server.serve_forever()
+	finally:
+		server.server_close()
+		if os.path.exists(path):
+			os.remove(path)
+
+# === FUNCTION: Client ===
+def shard_unavailable(shard, error):
+	print(f"Query service shard {shard} unavailable, running queries in-process: {error}")
+	unavailable_until[shard] = time.monotonic() + QUERY_SERVICE_RETRY_SECONDS
+
+# Sends one request to the shard owning variant_chr (shard 0 when it is not known) and returns
+# its values and frames, or None if the service is not configured or the shard cannot be reached
+# or fails to answer (it dies, times out or closes mid-reply), in which case the caller runs the
+# query in-process. Such a shard is not retried for QUERY_SERVICE_RETRY_SECONDS. Errors raised by
+# the query itself are re-raised here.
+def request(variant_chr, op, args):
+	if not QUERY_SERVICE_SOCKET:
+		return None
+	shard = shard_for(variant_chr)
+	if time.monotonic() < unavailable_until.get(shard, 0):
+		return None
+
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	sock.settimeout(QUERY_SERVICE_TIMEOUT_SECONDS)
+	try:
+		sock.connect(shard_socket(shard))
+	except OSError as e:
+		sock.close()
+		shard_unavailable(shard, e)
+		return None
+
+	try:
+		with sock, telemetry.span('query_service') as span:
+			sent = send_message(sock, {'op': op, 'args': args})
+			response, frames = receive_message(sock)
+			span.set(rows=sum(df.height for df in frames.values()), bytes=sent)
+	except (OSError, ValueError, pl.exceptions.PolarsError) as e:
+		# A truncated or corrupt reply fails to decode as JSON or Arrow.
+		shard_unavailable(shard, e)
+		return None
+	if not response['ok']:
+		raise RuntimeError(response['error'])
+	return response['values'], frames
+
+def LD_filter_args(min_r2, min_D, ancestry_groups):
+	return {'min_r2': min_r2, 'min_D': min_D, 'ancestry_groups': list(ancestry_groups) if ancestry_groups is not None else None}
+
+def process_variant(input_chr=None, input_pos=None, input_rsID=None):
+	response = request(input_chr, 'lookup', {'input_chr': input_chr, 'input_pos': input_pos, 'input_rsID': input_rsID})
+	if response is None:
+		return variants.process_variant(input_chr, input_pos, input_rsID)
+	return tuple(response[0]['variant'])
+
+def query_AGV_LDVs(variant_chr, LDV_positions=(), LDV_rsIDs=(), min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None):
+	response = request(variant_chr, 'proxies', dict(LD_filter_args(min_r2, min_D, ancestry_groups), variant_chr=variant_chr, LDV_positions=[int(pos) for pos in LDV_positions], LDV_rsIDs=list(LDV_rsIDs)))
+	if response is None:
+		return AGV_LD.query_AGV_LDVs(variant_chr, LDV_positions, LDV_rsIDs, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
+	return response[1]['proxies']
+
+def query_AGV_partners(variant_chr, AGV_pos, min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None):
+	response = request(variant_chr, 'partners', dict(LD_filter_args(min_r2, min_D, ancestry_groups), variant_chr=variant_chr, AGV_pos=int(AGV_pos)))
+	if response is None:
+		return AGV_LD.query_AGV_partners(variant_chr, AGV_pos, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
+	return response[1]['partners']
+
+def retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID, report=None, date_bins=allele_frequencies.DATE_BINS, region_groups=allele_frequencies.REGION_GROUPS, replicates=0):
+	# The shard runs both stages in one request, so they are reported around it.
+	if report:
+		report('Retrieving genotypes')
+	response = request(variant_chr, 'AFs', {'variant_chr': variant_chr, 'variant_rsID': variant_rsID, 'date_bins': date_bins, 'region_groups': region_groups, 'replicates': replicates})
+	if response is None:
+		return allele_frequencies.retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID, report=report, date_bins=date_bins, region_groups=region_groups, replicates=replicates)
+	if report:
+		report('Computing allele frequencies')
+	values, frames = response
+	return values['archaic'], frames.get('genotypes'), frames.get('AFs')
+
+# === MAIN ===
+def main():
+	parser = argparse.ArgumentParser(description='Run the sharded AGV query service that app workers call over Unix sockets.')
+	parser.add_argument('--socket', default=QUERY_SERVICE_SOCKET or DEFAULT_SOCKET, help='socket path prefix; shard i listens on {socket}.{i} (default: AGV_QUERY_SERVICE_SOCKET)')
+	parser.add_argument('--shards', type=int, default=QUERY_SERVICE_SHARDS, help='number of shard processes (default: AGV_QUERY_SERVICE_SHARDS)')
+	parser.add_argument('--concurrency', type=int, default=QUERY_SERVICE_CONCURRENCY, help='requests each shard runs at once')
+	parser.add_argument('--batch-wait-ms', type=float, default=QUERY_SERVICE_BATCH_WAIT_MS, help='how long a proxy request waits for others to share its scan')
+	args = parser.parse_args()
+
+	os.makedirs(os.path.dirname(args.socket) or '.', exist_ok=True)
+	# Shards are spawned rather than forked, so each starts with its own polars thread pool.
+	context = multiprocessing.get_context('spawn')
+	shards = [
+		context.Process(target=serve_shard, args=(shard, args.shards, args.socket, args.concurrency, args.batch_wait_ms / 1000), name=f'query-shard-{shard}')
+		for shard in range(args.shards)
+	]
+	for process in shards:
+		process.start()
+
+	def stop(signum, frame):
+		for process in shards:
+			process.terminate()
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGINT, stop)
+	for process in shards:
+		process.join()
+
+if __name__ == "__main__":
+	main()
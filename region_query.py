@@ -0,0 +1,63 @@
+# === Load Packages ===
+from AGV_catalog import get_AGV_catalog
+from contextlib import closing
+from variants import process_chr
+import AGV_LD
+import os
+import polars as pl
+import re
+import telemetry
+
+# === SETTINGS ===
+# A region query returns the AGVs inside a chr:start-end window (hg38) and every LD variant in
+# the window with its AGV proxies. Proxies are ordered by LD variant position, then by first r2,
+# and returned a page at a time: a page reads only as much of the position-sorted index as it
+# needs, and the position and row to resume from are handed back as the next page's key.
+REGION_MAX_BP = int(os.environ.get('AGV_REGION_MAX_BP', 5_000_000))
+REGION_PAGE_ROWS = 100
+
+# === FUNCTION: Parse Region ===
+def parse_region(text):
+	match = re.fullmatch(r'\s*([^:\s]+):([\d,]+)\s*-\s*([\d,]+)\s*', text or '')
+	if not match:
+		return None, None, None, "Please enter a region as chromosome:start-end (e.g., chr11:63200000-63300000)."
+	region_chr, error = process_chr(match.group(1))
+	if error:
+		return None, None, None, error
+	start, end = (int(value.replace(',', '')) for value in match.group(2, 3))
+	if not 1 <= start <= end:
+		return None, None, None, "Region start must be a positive position no greater than its end."
+	if end - start + 1 > REGION_MAX_BP:
+		return None, None, None, f"Regions can span at most {REGION_MAX_BP:,} bp."
+	return region_chr, start, end, None
+
+# === FUNCTION: AGVs in Region ===
+def query_region_AGVs(region_chr, start, end):
+	return get_AGV_catalog().range(region_chr, start, end)
+
+# === FUNCTION: LD Proxies in Region ===
+# after = (LDV_pos, n) resumes at LDV_pos, skipping the n proxies of that position already
+# returned. Returns the page (typed LD lists) and the key of the next page, or None at the end.
+def query_region_proxies(region_chr, start, end, min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None, after=None, limit=REGION_PAGE_ROWS):
+	after_pos, skip = after or (start, 0)
+	kept, n_kept = [], 0
+	with closing(AGV_LD.AGV_LD_region_batches(region_chr, max(start, after_pos), end)) as batches:
+		for batch in batches:
+			with telemetry.span('r2_filtering') as span:
+				matched = batch.lazy().with_columns(pl.col('r2').list.first().alias('sort_r2'))
+				proxies = AGV_LD.filter_AGV_LDVs(matched, min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups).sort(['LDV_pos', 'sort_r2'], descending=[False, True], maintain_order=True).collect()
+				span.set(rows=proxies.height)
+			kept.append(proxies.drop('sort_r2'))
+			n_kept += proxies.height
+			# One row past the page shows whether there is a next page.
+			if n_kept > skip + limit:
+				break
+
+	if not kept:
+		return pl.DataFrame(), None
+	proxies = pl.concat(kept)
+	page = proxies.slice(skip, limit)
+	if proxies.height <= skip + limit:
+		return page, None
+	next_pos = proxies['LDV_pos'][skip + limit]
+	return page, (next_pos, proxies.head(skip + limit).filter(pl.col('LDV_pos') == next_pos).height)
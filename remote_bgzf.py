@@ -0,0 +1,104 @@
+# === Load Packages ===
+from functools import lru_cache
+import bgzf
+import box_cache
+import numpy as np
+import os
+import requests
+import telemetry
+
+# === SETTINGS ===
+# BGZF files and their indexes (see build_VCF_index.py and build_AGV_LD_bgzf.py) can be served
+# from any HTTP host that honours Range requests. The small index is fetched through the Box
+# cache; records are then read by fetching only the compressed blocks that hold them.
+REMOTE_INDEX_BASE_URL = os.environ.get('AGV_REMOTE_INDEX_BASE_URL', '').rstrip('/')
+REMOTE_COALESCE_GAP_BYTES = int(os.environ.get('AGV_REMOTE_COALESCE_GAP_BYTES', 64 * 1024))
+REMOTE_POOL_SIZE = int(os.environ.get('AGV_REMOTE_POOL_SIZE', 16))
+
+# === CLASS: Range Request Error ===
+class RangeNotSupported(requests.exceptions.RequestException):
+	pass
+
+# === UTILS ===
+def remote_url(name):
+	return f'{REMOTE_INDEX_BASE_URL}/{name}' if REMOTE_INDEX_BASE_URL else None
+
+@lru_cache(maxsize=None)
+def remote_session(pid):
+	# One keep-alive connection pool per process (pools do not survive a fork).
+	session = requests.Session()
+	adapter = requests.adapters.HTTPAdapter(pool_connections=REMOTE_POOL_SIZE, pool_maxsize=REMOTE_POOL_SIZE)
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+	return session
+
+def session():
+	return remote_session(os.getpid())
+
+def fetch_index(url):
+	with np.load(box_cache.fetch(url, session=session()), allow_pickle=False) as index:
+		return {name: index[name] for name in index.files}
+
+# === FUNCTION: Plan Byte Ranges ===
+# A span is the text between two virtual offsets. It needs the blocks from the one holding its
+# start to the one holding its last byte; spans whose blocks are adjacent or within gap_bytes of
+# each other are merged into one request.
+def span_blocks(block_offsets, start_voffset, end_voffset):
+	start_block, _ = bgzf.split_virtual_offset(start_voffset)
+	end_block, end_within = bgzf.split_virtual_offset(end_voffset)
+	first = int(np.searchsorted(block_offsets, start_block))
+	last = int(np.searchsorted(block_offsets, end_block)) - (0 if end_within else 1)
+	return first, max(first, last)
+
+def coalesce_ranges(block_ranges, block_offsets, gap_bytes=None):
+	gap_bytes = REMOTE_COALESCE_GAP_BYTES if gap_bytes is None else gap_bytes
+	merged = []
+	for first, last in sorted(block_ranges):
+		if merged and block_offsets[first] - block_offsets[merged[-1][1] + 1] <= gap_bytes:
+			merged[-1][1] = max(merged[-1][1], last)
+		else:
+			merged.append([first, last])
+	return merged
+
+# === CLASS: Remote BGZF File ===
+class RemoteBgzfFile:
+	def __init__(self, url, block_offsets, http=None):
+		self.url = url
+		self.block_offsets = np.asarray(block_offsets, dtype=np.int64)
+		self.http = http
+		self.bytes_fetched = 0
+
+	def fetch_blocks(self, first, last):
+		start, end = int(self.block_offsets[first]), int(self.block_offsets[last + 1])
+		with telemetry.span('download', bytes=end - start):
+			response = (self.http or session()).get(self.url, headers={'Range': f'bytes={start}-{end - 1}'}, timeout=box_cache.REQUEST_TIMEOUT)
+			response.raise_for_status()
+			if response.status_code != 206 or len(response.content) != end - start:
+				raise RangeNotSupported(f'{self.url} did not honour the byte range {start}-{end - 1}.')
+		self.bytes_fetched += end - start
+		data = response.content
+		with telemetry.span('decompression') as span:
+			blocks = {
+				i: bgzf.decompress_block(data[int(self.block_offsets[i]) - start:int(self.block_offsets[i + 1]) - start])
+				for i in range(first, last + 1)
+			}
+			span.set(bytes=sum(len(block) for block in blocks.values()))
+		return blocks
+
+	def read_spans(self, spans):
+		block_ranges = [span_blocks(self.block_offsets, start, end) for start, end in spans]
+		blocks = {}
+		for first, last in coalesce_ranges(block_ranges, self.block_offsets):
+			blocks.update(self.fetch_blocks(first, last))
+
+		texts = []
+		for (start, end), (first, last) in zip(spans, block_ranges):
+			if end <= start:
+				texts.append(b'')
+				continue
+			data = b''.join(blocks[i] for i in range(first, last + 1))
+			_, start_within = bgzf.split_virtual_offset(start)
+			_, end_within = bgzf.split_virtual_offset(end)
+			stop = len(data) - len(blocks[last]) + end_within if end_within else len(data)
+			texts.append(data[start_within:stop])
+		return texts
@@ -0,0 +1,144 @@
+# === Load Packages ===
+import box_cache
+import os
+import polars as pl
+import secrets
+import shutil
+import telemetry
+import tempfile
+import time
+
+# === SETTINGS ===
+# Query results are kept on the server as Arrow IPC files under a short random handle; only the
+# handle is sent to the browser. Entries are shared by all workers and expire by age and size.
+RESULT_STORE_DIR = os.environ.get('AGV_RESULT_STORE_DIR', os.path.join(box_cache.CACHE_DIR, 'results'))
+RESULT_STORE_MAX_BYTES = int(os.environ.get('AGV_RESULT_STORE_MAX_BYTES', 2 * 1024 ** 3))
+RESULT_STORE_TTL_SECONDS = int(os.environ.get('AGV_RESULT_STORE_TTL_SECONDS', 6 * 3600))
+
+# === UTILS ===
+def handle_dir(handle, store_dir=None):
+	if not handle or not handle.replace('-', '').replace('_', '').isalnum():
+		raise ValueError(f'Invalid result handle: {handle}')
+	return os.path.join(store_dir or RESULT_STORE_DIR, handle)
+
+def lock_path(handle, store_dir=None):
+	# Lock of a deterministic handle, held while its result is computed (see query_cache).
+	return os.path.join(store_dir or RESULT_STORE_DIR, f'.{handle}.lock')
+
+def is_expired(path, ttl_seconds=None):
+	ttl_seconds = RESULT_STORE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+	return time.time() - os.path.getmtime(path) > ttl_seconds
+
+def entry_stats(store_dir=None):
+	store_dir = store_dir or RESULT_STORE_DIR
+	entries = []
+	if not os.path.isdir(store_dir):
+		return entries
+	for handle in os.listdir(store_dir):
+		path = os.path.join(store_dir, handle)
+		if handle.startswith('.') or not os.path.isdir(path):
+			continue
+		try:
+			size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+			entries.append((os.path.getmtime(path), size, path))
+		except OSError:
+			continue
+	return entries
+
+# === FUNCTION: Store Results ===
+# Handles are random unless the caller passes a deterministic one (see query_cache); if another
+# worker stored the same handle first, its copy is kept. An expired copy that has not been
+# evicted yet is replaced.
+def put_results(frames, store_dir=None, handle=None):
+	store_dir = store_dir or RESULT_STORE_DIR
+	os.makedirs(store_dir, exist_ok=True)
+	handle = handle or secrets.token_urlsafe(9)
+	path = handle_dir(handle, store_dir)
+	tmp_dir = tempfile.mkdtemp(dir=store_dir, prefix='.tmp-')
+	try:
+		with telemetry.span('serialization') as span:
+			for name, df in frames.items():
+				if df is not None:
+					df.write_ipc(os.path.join(tmp_dir, f'{name}.arrow'))
+			span.set(rows=sum(df.height for df in frames.values() if df is not None), bytes=sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)))
+		try:
+			os.replace(tmp_dir, path)
+		except OSError:
+			if not os.path.isdir(path):
+				raise
+			if is_expired(path):
+				# Moved aside first: a directory cannot be replaced while it has files.
+				expired_dir = tempfile.mkdtemp(dir=store_dir, prefix='.tmp-')
+				os.replace(path, os.path.join(expired_dir, handle))
+				os.replace(tmp_dir, path)
+				shutil.rmtree(expired_dir, ignore_errors=True)
+			else:
+				shutil.rmtree(tmp_dir, ignore_errors=True)
+	except BaseException:
+		shutil.rmtree(tmp_dir, ignore_errors=True)
+		raise
+	evict(store_dir)
+	return handle
+
+# === FUNCTION: Retrieve Results ===
+def get_result(handle, name, store_dir=None, ttl_seconds=None):
+	ttl_seconds = RESULT_STORE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+	try:
+		path = handle_dir(handle, store_dir)
+	except ValueError:
+		return None
+	try:
+		if is_expired(path, ttl_seconds):
+			return None
+		return pl.read_ipc(os.path.join(path, f'{name}.arrow'), memory_map=True)
+	except OSError:
+		return None
+
+def get_results(handle, store_dir=None, ttl_seconds=None):
+	ttl_seconds = RESULT_STORE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+	try:
+		path = handle_dir(handle, store_dir)
+		if is_expired(path, ttl_seconds):
+			return None
+		names = [name[:-len('.arrow')] for name in os.listdir(path) if name.endswith('.arrow')]
+		return {name: pl.read_ipc(os.path.join(path, f'{name}.arrow'), memory_map=True) for name in names}
+	except (OSError, ValueError):
+		return None
+
+def has_result(handle, name, store_dir=None):
+	try:
+		return os.path.exists(os.path.join(handle_dir(handle, store_dir), f'{name}.arrow'))
+	except ValueError:
+		return False
+
+# === FUNCTION: Evict Expired and Oldest Results ===
+# A handle's lock file is removed with it, while held. A handle whose lock is held is being
+# recomputed, and is left for the worker computing it to replace.
+def remove_entry(path):
+	entry_lock_path = lock_path(os.path.basename(path), os.path.dirname(path))
+	if not os.path.exists(entry_lock_path):
+		shutil.rmtree(path, ignore_errors=True)
+		return True
+	try:
+		with box_cache.file_lock(entry_lock_path, blocking=False):
+			shutil.rmtree(path, ignore_errors=True)
+			os.remove(entry_lock_path)
+	except BlockingIOError:
+		return False
+	return True
+
+def evict(store_dir=None, max_bytes=None, ttl_seconds=None):
+	store_dir = store_dir or RESULT_STORE_DIR
+	max_bytes = RESULT_STORE_MAX_BYTES if max_bytes is None else max_bytes
+	ttl_seconds = RESULT_STORE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+
+	with box_cache.file_lock(os.path.join(store_dir, '.evict.lock')):
+		now = time.time()
+		entries = sorted(entry_stats(store_dir))
+		total = sum(size for _, size, _ in entries)
+		for mtime, size, path in entries:
+			if now - mtime <= ttl_seconds and total <= max_bytes:
+				break
+			if remove_entry(path):
+				total -= size
+	return total
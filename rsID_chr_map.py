@@ -0,0 +1,72 @@
+# === Load Packages ===
+import numpy as np
+import os
+
+# === SETTINGS ===
+# rsIDs are stored as a sorted uint64 array with a parallel uint8 chromosome array, both opened
+# with mmap so every worker shares the same pages through the OS page cache. The map is built
+# offline by build_rsID_chr_map.py; without it, non-AGV rsIDs are not resolved.
+RSID_CHR_MAP_DIR = os.environ.get('AGV_RSID_CHR_MAP_DIR', 'files/rsID_chr_map')
+RSID_CHR_PICKLE_ID = 'qlx2f1ncqgx7kug6kem3p93vbb4ljg8e'
+CHROMOSOMES = [str(i) for i in range(1, 23)] + ['X', 'Y', 'MT']
+CHR_CODES = {chr: code for code, chr in enumerate(CHROMOSOMES, start=1)}
+
+# === UTILS ===
+def map_paths(map_dir=None):
+	map_dir = map_dir or RSID_CHR_MAP_DIR
+	return os.path.join(map_dir, 'rsIDs.npy'), os.path.join(map_dir, 'chrs.npy')
+
+def encode_chr(chr):
+	chr = str(chr)
+	if chr.lower().startswith('chr'):
+		chr = chr[3:]
+	return CHR_CODES.get(chr, 0)
+
+# === FUNCTION: Build Map ===
+def build_rsID_chr_map(rsID_chr_pairs, map_dir=None):
+	rsIDs, chrs = [], []
+	for rsID, chr in rsID_chr_pairs:
+		if rsID.startswith('rs') and rsID[2:].isdigit():
+			code = encode_chr(chr)
+			if code:
+				rsIDs.append(int(rsID[2:]))
+				chrs.append(code)
+
+	rsIDs = np.asarray(rsIDs, dtype=np.uint64)
+	chrs = np.asarray(chrs, dtype=np.uint8)
+	order = np.argsort(rsIDs, kind='stable')
+
+	rsIDs_path, chrs_path = map_paths(map_dir)
+	os.makedirs(os.path.dirname(rsIDs_path), exist_ok=True)
+	for path, array in ((chrs_path, chrs[order]), (rsIDs_path, rsIDs[order])):
+		tmp_path = path + '.tmp.npy'
+		np.save(tmp_path, array)
+		os.replace(tmp_path, path)
+	return len(rsIDs)
+
+# === FUNCTION: Open Map ===
+# Only an opened map is cached, so a map built while the app is running is picked up.
+rsID_chr_maps = {}
+
+def open_rsID_chr_map(map_dir=None):
+	if map_dir not in rsID_chr_maps:
+		rsIDs_path, chrs_path = map_paths(map_dir)
+		if not (os.path.exists(rsIDs_path) and os.path.exists(chrs_path)):
+			print(f"rsID to chromosome map not found in {os.path.dirname(rsIDs_path)}; run build_rsID_chr_map.py to resolve non-AGV rsIDs.")
+			return None
+		rsID_chr_maps[map_dir] = np.load(rsIDs_path, mmap_mode='r'), np.load(chrs_path, mmap_mode='r')
+	return rsID_chr_maps[map_dir]
+
+# === FUNCTION: Lookup ===
+def lookup_chr_for_rsID(rsID, map_dir=None):
+	if not rsID or not rsID.startswith('rs') or not rsID[2:].isdigit() or int(rsID[2:]) >= 2 ** 64:
+		return None
+	rsID_chr_map = open_rsID_chr_map(map_dir)
+	if rsID_chr_map is None:
+		return None
+	rsIDs, chrs = rsID_chr_map
+	key = np.uint64(rsID[2:])
+	i = int(np.searchsorted(rsIDs, key))
+	if i < len(rsIDs) and rsIDs[i] == key:
+		return CHROMOSOMES[int(chrs[i]) - 1]
+	return None
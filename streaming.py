@@ -0,0 +1,105 @@
+# === Load Packages ===
+from contextlib import contextmanager
+import box_cache
+import cancellation
+import os
+import requests
+import telemetry
+import time
+import zlib
+
+# === SETTINGS ===
+# Without a local index, VCF and LD files are read as a stream of decompressed chunks instead of
+# whole files. With AGV_STREAM_DOWNLOADS set, files that are not already cached are streamed
+# straight from Box without being written to the cache, and the transfer is dropped as soon as
+# the reader stops. Readers size their batches from the per-query memory ceiling.
+STREAM_DOWNLOADS = os.environ.get('AGV_STREAM_DOWNLOADS', '').lower() in ('1', 'true', 'yes')
+QUERY_MEMORY_LIMIT_BYTES = int(os.environ.get('AGV_QUERY_MEMORY_LIMIT_BYTES', 1024 ** 3))
+STREAM_CHUNK_SIZE = 1024 * 1024
+BATCH_BYTES = max(STREAM_CHUNK_SIZE, min(64 * 1024 ** 2, QUERY_MEMORY_LIMIT_BYTES // 16))
+
+# === CLASS: Memory Limit Error ===
+class MemoryLimitExceeded(MemoryError):
+	pass
+
+def check_memory(nbytes, limit=None):
+	limit = QUERY_MEMORY_LIMIT_BYTES if limit is None else limit
+	if nbytes > limit:
+		raise MemoryLimitExceeded(f"Query exceeded the memory limit of {limit / 1024 ** 2:.0f} MiB.")
+
+# === FUNCTION: Decompress a Gzip Stream ===
+# Handles multi-member files (including BGZF) and never inflates more than max_length bytes
+# from one call, so highly compressed input cannot spike memory.
+def decompress_gzip(chunks, max_length=STREAM_CHUNK_SIZE):
+	decompressor = zlib.decompressobj(31)
+	elapsed, nbytes = 0.0, 0
+	try:
+		for chunk in chunks:
+			cancellation.check_cancelled()
+			while True:
+				start = time.perf_counter()
+				data = decompressor.decompress(chunk, max_length)
+				elapsed += time.perf_counter() - start
+				if data:
+					nbytes += len(data)
+					yield data
+				if decompressor.eof:
+					chunk = decompressor.unused_data
+					decompressor = zlib.decompressobj(31)
+					if not chunk:
+						break
+				elif decompressor.unconsumed_tail or len(data) == max_length:
+					chunk = decompressor.unconsumed_tail
+				else:
+					break
+	finally:
+		telemetry.observe('decompression', elapsed, bytes=nbytes)
+
+# === FUNCTION: Split a Stream ===
+def iter_lines(chunks):
+	remainder = b''
+	for chunk in chunks:
+		lines = (remainder + chunk).split(b'\n')
+		remainder = lines.pop()
+		for line in lines:
+			yield line + b'\n'
+	if remainder:
+		yield remainder
+
+def iter_blocks(chunks, block_bytes=None):
+	# Blocks of at least block_bytes that end on a line boundary.
+	block_bytes = block_bytes or BATCH_BYTES
+	pending, size = [], 0
+	for chunk in chunks:
+		pending.append(chunk)
+		size += len(chunk)
+		if size >= block_bytes:
+			data = b''.join(pending)
+			end = data.rfind(b'\n') + 1
+			if end:
+				yield data[:end]
+				pending, size = [data[end:]], len(data) - end
+			else:
+				pending = [data]
+	data = b''.join(pending)
+	if data:
+		yield data
+
+# === FUNCTION: Open a Decompressed Stream ===
+# Yields an iterator of decompressed chunks from the cache, or straight from Box when streaming
+# downloads are enabled and the file is not cached. Leaving the block closes the response, which
+# aborts the rest of the transfer.
+def file_chunks(file, chunk_size=STREAM_CHUNK_SIZE):
+	return iter(lambda: file.read(chunk_size), b'')
+
+@contextmanager
+def open_decompressed(url, session=None):
+	if not STREAM_DOWNLOADS or box_cache.is_cached(url):
+		with box_cache.open_cached(url, session=session) as file:
+			yield decompress_gzip(file_chunks(file))
+		return
+
+	http = session or requests
+	with http.get(url, stream=True, timeout=box_cache.REQUEST_TIMEOUT) as response:
+		response.raise_for_status()
+		yield decompress_gzip(telemetry.timed_chunks('download', response.iter_content(chunk_size=STREAM_CHUNK_SIZE)))
@@ -0,0 +1,94 @@
+# === Load Packages ===
+import AGV_LD
+import polars as pl
+import re
+
+# === SETTINGS ===
+# Dash tables with custom page, sort and filter actions send their page, sort_by and filter_query
+# to a callback, which applies them here to a result frame held in the result store and returns
+# only the visible rows. LD metric columns are stored as comma-joined strings, one value per
+# ancestry group: they sort as lists of numbers, and a comparison matches a row if any group's
+# value matches. An operator prefixed with 'i' (e.g. 'icontains', 'i=') compares text
+# case-insensitively; 's' or no prefix is case-sensitive.
+LD_VALUE_COLUMNS = [column for column in AGV_LD.LD_LIST_COLUMNS if column != 'populations']
+FILTER_OPERATORS = {
+	'>=': 'ge', '<=': 'le', '!=': 'ne', '<': 'lt', '>': 'gt', '=': 'eq',
+	'ge': 'ge', 'le': 'le', 'ne': 'ne', 'lt': 'lt', 'gt': 'gt', 'eq': 'eq',
+	'contains': 'contains', 'datestartswith': 'starts_with'
+}
+FILTER_PART = re.compile(r'\{(?P<column>.+?)\}\s+(?P<case>[is])?(?P<operator>>=|<=|!=|<|>|=|ge|le|ne|lt|gt|eq|contains|datestartswith)\s+(?P<value>.+)')
+
+# === UTILS ===
+def LD_values(column):
+	return pl.col(column).str.split(', ').list.eval(pl.element().cast(pl.Float64, strict=False))
+
+def sort_key(column, schema):
+	return LD_values(column) if column in LD_VALUE_COLUMNS and schema[column] == pl.Utf8 else pl.col(column)
+
+def filter_value(text):
+	# (text, number): quoted values are only text; number is None if the value is not numeric.
+	text = text.strip()
+	if len(text) > 1 and text[0] == text[-1] and text[0] in ('"', "'", '`'):
+		return text[1:-1].replace('\\' + text[0], text[0]), None
+	try:
+		return text, float(text)
+	except ValueError:
+		return text, None
+
+def compare(expr, operator, value):
+	return {
+		'ge': expr >= value, 'le': expr <= value, 'lt': expr < value,
+		'gt': expr > value, 'ne': expr != value, 'eq': expr == value
+	}[operator]
+
+# === FUNCTION: Parse Filter Query ===
+# filter_query is the '&&'-joined expression a Dash table builds from its filter row, e.g.
+# '{r2} >= 0.8 && {AGV_rsID} contains "rs12"'. Parts naming unknown columns or that cannot be
+# parsed are ignored, as the table's native filtering does.
+def filter_expr(filter_query, schema):
+	conditions = []
+	for part in (filter_query or '').split(' && '):
+		match = FILTER_PART.fullmatch(part.strip())
+		if not match or match.group('column') not in schema:
+			continue
+		column, operator = match.group('column'), FILTER_OPERATORS[match.group('operator')]
+		text, number = filter_value(match.group('value'))
+		dtype = schema[column]
+		column_text = pl.col(column).cast(pl.Utf8)
+		if match.group('case') == 'i':
+			column_text, text = column_text.str.to_lowercase(), text.lower()
+
+		if operator == 'contains':
+			conditions.append(column_text.str.contains(text, literal=True))
+		elif operator == 'starts_with':
+			conditions.append(column_text.str.starts_with(text))
+		elif column in LD_VALUE_COLUMNS and dtype == pl.Utf8:
+			if number is not None:
+				conditions.append(LD_values(column).list.eval(compare(pl.element(), operator, number)).list.any())
+		elif dtype.is_numeric():
+			if number is not None:
+				conditions.append(compare(pl.col(column), operator, number))
+		else:
+			conditions.append(compare(column_text, operator, text))
+
+	return pl.all_horizontal(conditions) if conditions else None
+
+# === FUNCTION: Page Table ===
+# Returns the rows of page page_current (or of the last page, if fewer remain after filtering),
+# that page's index and the number of pages. Sorts are stable, so rows that tie keep the stored
+# order (proxies by descending r2).
+def page_table(df, page_current, page_size, sort_by=None, filter_query=None):
+	schema = df.schema
+	rows = df.lazy()
+	condition = filter_expr(filter_query, schema)
+	if condition is not None:
+		rows = rows.filter(condition)
+
+	sort_by = [sort for sort in sort_by or [] if sort['column_id'] in schema]
+	if sort_by:
+		rows = rows.sort([sort_key(sort['column_id'], schema) for sort in sort_by], descending=[sort['direction'] == 'desc' for sort in sort_by], nulls_last=True, maintain_order=True)
+
+	rows = rows.collect()
+	page_count = max(1, -(-rows.height // page_size))
+	page_current = min(page_current or 0, page_count - 1)
+	return rows.slice(page_current * page_size, page_size), page_current, page_count
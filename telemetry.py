@@ -0,0 +1,248 @@
+# === Load Packages ===
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import Blueprint, Response, g, request
+from functools import lru_cache, wraps
+import diskcache
+import json
+import os
+import psutil
+import time
+import uuid
+
+# === SETTINGS ===
+# Each query stage (rsID resolution, catalog load, download, decompression, parsing, r2
+# filtering, annotation join, AF computation, serialization) is timed as a span carrying its row
+# count, bytes transferred and change in resident memory. Spans are aggregated into histograms in
+# a store shared by all workers and background query processes and served in the Prometheus text
+# format at /metrics; the spans of a request are also returned in its Server-Timing header, and
+# with AGV_TRACE_LOG set every query's spans are appended to that file as one JSON line.
+METRICS_DIR = os.environ.get('AGV_METRICS_DIR', os.path.join(os.environ.get('AGV_CACHE_DIR', 'cache'), 'metrics'))
+TRACE_LOG = os.environ.get('AGV_TRACE_LOG', '')
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SPAN_COUNTERS = ('rows', 'bytes')
+
+current_trace = ContextVar('current_trace', default=None)
+
+# === UTILS ===
+@lru_cache(maxsize=None)
+def metrics_store(pid):
+	# One connection per process; SQLite connections do not survive a fork.
+	return diskcache.Cache(METRICS_DIR)
+
+@lru_cache(maxsize=None)
+def current_process(pid):
+	return psutil.Process(pid)
+
+def rss():
+	return current_process(os.getpid()).memory_info().rss
+
+# === CLASS: Span ===
+class Span:
+	def __init__(self, name, **attrs):
+		self.name = name
+		self.attrs = attrs
+		self.start = time.perf_counter()
+		self.duration = None
+
+	def set(self, **attrs):
+		self.attrs.update(attrs)
+
+	def to_dict(self, origin):
+		return {'name': self.name, 'start_ms': round((self.start - origin) * 1000, 3), 'duration_ms': round(self.duration * 1000, 3), **self.attrs}
+
+# === CLASS: Trace ===
+# The spans of one request or background query. Worker threads see the trace of the code that
+# submitted them when run through contextvars.copy_context().
+class Trace:
+	def __init__(self, name, **attrs):
+		self.id = uuid.uuid4().hex
+		self.name = name
+		self.attrs = attrs
+		self.started_at = time.time()
+		self.start = time.perf_counter()
+		self.spans = []
+
+	def server_timing(self):
+		durations = {}
+		for span in self.spans:
+			durations[span.name] = durations.get(span.name, 0) + span.duration
+		durations['total'] = time.perf_counter() - self.start
+		return ', '.join(f'{name};dur={duration * 1000:.1f}' for name, duration in durations.items())
+
+	def to_dict(self):
+		return {
+			'trace_id': self.id,
+			'name': self.name,
+			'started_at': self.started_at,
+			'duration_ms': round((time.perf_counter() - self.start) * 1000, 3),
+			**self.attrs,
+			'spans': [span.to_dict(self.start) for span in self.spans]
+		}
+
+def start_trace(name, **attrs):
+	trace = Trace(name, **attrs)
+	return trace, current_trace.set(trace)
+
+def end_trace(trace, token, trace_log=None):
+	try:
+		current_trace.reset(token)
+	except ValueError:
+		# Streamed responses finish in a different context than the one the trace started in.
+		pass
+	parent = current_trace.get()
+	if parent is not None:
+		parent.spans.extend(trace.spans)
+	trace_log = TRACE_LOG if trace_log is None else trace_log
+	if trace_log and trace.spans:
+		line = (json.dumps(trace.to_dict(), default=str) + '\n').encode('utf-8')
+		fd = os.open(trace_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		try:
+			os.write(fd, line)
+		finally:
+			os.close(fd)
+
+@contextmanager
+def trace(name, **attrs):
+	current, token = start_trace(name, **attrs)
+	try:
+		yield current
+	finally:
+		end_trace(current, token)
+
+def traced(name):
+	# Runs each call of the decorated function in its own trace, e.g. a background callback.
+	def decorator(function):
+		@wraps(function)
+		def wrapper(*args, **kwargs):
+			with trace(name):
+				return function(*args, **kwargs)
+		return wrapper
+	return decorator
+
+# === FUNCTION: Record Spans ===
+def record(span):
+	trace = current_trace.get()
+	if trace is not None:
+		trace.spans.append(span)
+	try:
+		store = metrics_store(os.getpid())
+		with store.transact():
+			store.incr(('count', span.name))
+			store.incr(('bucket', span.name, bisect_left(DURATION_BUCKETS, span.duration)))
+			store.incr(('duration_us', span.name), int(span.duration * 1_000_000))
+			for counter in SPAN_COUNTERS:
+				if span.attrs.get(counter):
+					store.incr((counter, span.name), int(span.attrs[counter]))
+			if span.attrs.get('memory_delta_bytes') is not None:
+				store.incr(('memory_delta_bytes', span.name), int(span.attrs['memory_delta_bytes']))
+				store.incr(('memory_count', span.name))
+			if span.attrs.get('error'):
+				store.incr(('errors', span.name))
+	except Exception as e:
+		print(f"Error recording metrics for {span.name}: {e}")
+
+@contextmanager
+def span(name, **attrs):
+	current = Span(name, **attrs)
+	rss_before = rss()
+	try:
+		yield current
+	except BaseException as e:
+		current.set(error=type(e).__name__)
+		raise
+	finally:
+		current.duration = time.perf_counter() - current.start
+		current.set(memory_delta_bytes=rss() - rss_before)
+		record(current)
+
+def observe(name, duration, **attrs):
+	# For stages whose time is accumulated piecemeal, e.g. inside a generator.
+	current = Span(name, **attrs)
+	current.start -= duration
+	current.duration = duration
+	record(current)
+
+def timed_chunks(name, chunks, **attrs):
+	# Times only the work of producing each chunk and counts its bytes.
+	elapsed, nbytes = 0.0, 0
+	chunks = iter(chunks)
+	try:
+		while True:
+			start = time.perf_counter()
+			try:
+				chunk = next(chunks)
+			except StopIteration:
+				break
+			finally:
+				elapsed += time.perf_counter() - start
+			nbytes += len(chunk)
+			yield chunk
+	finally:
+		observe(name, elapsed, bytes=nbytes, **attrs)
+
+# === FUNCTION: Prometheus Exposition ===
+def label(name, **labels):
+	values = ','.join(f'{key}="{value}"' for key, value in labels.items())
+	return f'{name}{{{values}}}'
+
+def exposition(store=None):
+	store = store or metrics_store(os.getpid())
+	values = {}
+	for key in store.iterkeys():
+		values[key] = store.get(key, 0)
+	stages = sorted(key[1] for key in values if key[0] == 'count')
+
+	lines = [
+		'# HELP agv_stage_duration_seconds Time spent in each query stage.',
+		'# TYPE agv_stage_duration_seconds histogram'
+	]
+	for stage in stages:
+		cumulative = 0
+		for i, bound in enumerate(DURATION_BUCKETS + ('+Inf',)):
+			cumulative += values.get(('bucket', stage, i), 0)
+			lines.append(f"{label('agv_stage_duration_seconds_bucket', stage=stage, le=bound)} {cumulative}")
+		lines.append(f"{label('agv_stage_duration_seconds_sum', stage=stage)} {values.get(('duration_us', stage), 0) / 1_000_000}")
+		lines.append(f"{label('agv_stage_duration_seconds_count', stage=stage)} {values[('count', stage)]}")
+
+	for counter, help_text in (
+		('rows', 'Rows produced by each query stage.'),
+		('bytes', 'Bytes transferred or produced by each query stage.'),
+		('errors', 'Query stage spans that raised an error.')
+	):
+		lines += [f'# HELP agv_stage_{counter}_total {help_text}', f'# TYPE agv_stage_{counter}_total counter']
+		lines += [f"{label(f'agv_stage_{counter}_total', stage=stage)} {values.get((counter, stage), 0)}" for stage in stages]
+
+	lines += [
+		'# HELP agv_stage_memory_delta_bytes Change in worker resident memory across each query stage.',
+		'# TYPE agv_stage_memory_delta_bytes summary'
+	]
+	for stage in stages:
+		lines.append(f"{label('agv_stage_memory_delta_bytes_sum', stage=stage)} {values.get(('memory_delta_bytes', stage), 0)}")
+		lines.append(f"{label('agv_stage_memory_delta_bytes_count', stage=stage)} {values.get(('memory_count', stage), 0)}")
+	return '\n'.join(lines) + '\n'
+
+# === BLUEPRINT: Metrics and Server-Timing ===
+metrics = Blueprint('metrics', __name__)
+
+@metrics.route('/metrics')
+def metrics_endpoint():
+	return Response(exposition(), mimetype='text/plain; version=0.0.4')
+
+@metrics.before_app_request
+def start_request_trace():
+	g.trace, g.trace_token = start_trace(request.path)
+
+@metrics.after_app_request
+def add_server_timing(response):
+	trace = g.get('trace')
+	if trace is not None and trace.spans:
+		response.headers['Server-Timing'] = trace.server_timing()
+	return response
+
+@metrics.teardown_app_request
+def end_request_trace(error=None):
+	trace, token = g.pop('trace', None), g.pop('trace_token', None)
+	if trace is not None:
+		end_trace(trace, token)
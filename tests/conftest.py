@@ -0,0 +1,22 @@
+# The app's modules live at the repository root.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# === Load Packages ===
+import box_standin
+import pytest
+import threading
+
+# === FIXTURES ===
+@pytest.fixture
+def box_server(tmp_path):
+	# Serves a temporary directory through the local Box stand-in; yields the directory and its URL.
+	directory = tmp_path / 'served'
+	directory.mkdir()
+	server = box_standin.make_server(str(directory), port=0)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	yield directory, f'http://127.0.0.1:{server.server_port}'
+	server.shutdown()
+	server.server_close()
@@ -0,0 +1,84 @@
+# === Load Packages ===
+import allele_frequencies
+import genotype_store
+import numpy as np
+import os
+import polars as pl
+import pytest
+
+# === SETTINGS ===
+ANNOTATION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), genotype_store.SAMPLE_ANNOTATION_PATH)
+CALLS = ["0/0", "0/1", "1/1", "./.", "0/2", "./1", "0|1", "1|0", "1|1"]
+
+# === FIXTURES ===
+# Genotypes are drawn per specimen, so which of a specimen's samples is kept does not change the
+# table. Oceania is left out entirely, and every Present-day African sample is missing, so the
+# tables have both empty cells and cells without a called genotype.
+@pytest.fixture(scope='module')
+def annotation():
+	return allele_frequencies.load_sample_annotation(ANNOTATION_PATH)
+
+@pytest.fixture(scope='module')
+def fixture_GTs(annotation):
+	rng = np.random.default_rng(7)
+	frame = annotation.frame()
+	consistent = frame.group_by('Specimen_ID').agg((pl.col('Date_mean').n_unique() == 1) & (pl.col('Region').n_unique() == 1)).filter(pl.col('Date_mean'))['Specimen_ID']
+	frame = frame.filter(pl.col('Specimen_ID').is_in(consistent) & (pl.col('Region').is_null() | (pl.col('Region') != 'Oceania')))
+	frame = frame.filter(pl.lit(pl.Series(rng.random(frame.height) < 0.5)) | pl.col('Genetic_ID').is_in(list(genotype_store.ARCHAIC_SAMPLE_NAMES)))
+
+	specimens = frame['Specimen_ID'].unique().sort()
+	specimen_calls = dict(zip(specimens.to_list(), rng.choice(CALLS, size=len(specimens)).tolist()))
+	GTs = [
+		allele_frequencies.MISSING_GT if region == 'Africa' and date == 0 else specimen_calls[specimen]
+		for specimen, region, date in frame.select('Specimen_ID', 'Region', 'Date_mean').iter_rows()
+	]
+	order = rng.permutation(frame.height).tolist()
+	genetic_IDs = frame['Genetic_ID'].to_list()
+	return [genetic_IDs[i] for i in order], [GTs[i] for i in order]
+
+# === FUNCTION: Previous Per-Cell Implementation ===
+# The allele frequency table as the app computed it before summarize_AFs: one filter per region
+# and time bin over the deduplicated, annotated genotypes.
+def per_cell_AFs(annotation, sample_names, GTs):
+	GTs_df = pl.DataFrame({'Genetic_ID': sample_names, 'Genotype': GTs}).join(annotation.frame(), on='Genetic_ID', how='left')
+	filtered_GTs_df = GTs_df.filter(~pl.col("Location").str.contains("Denisova|Neanderthal|REF"))
+	filtered_GTs_df = (filtered_GTs_df.with_columns((pl.col("Data_source") == "Shotgun.diploid").cast(pl.Int32()).alias("priority")).sort(["Specimen_ID", "priority"], descending=[False, True], maintain_order=True).group_by("Specimen_ID", maintain_order=True).head(1))
+
+	def cell(subset):
+		if subset.shape[0] == 0:
+			return ""
+		GT_counts = [GT for GT in subset["Genotype"].to_list() if GT != "./."]
+		alt_count = sum(GT.count('1') for GT in GT_counts)
+		total_alleles = 2 * len(GT_counts)
+		AF = alt_count / total_alleles if total_alleles else None
+		return f"{round(AF, 4) if AF is not None else ''} ({len(GT_counts)})"
+
+	def in_bin(lower, upper, label):
+		return (pl.col('Date_mean') <= upper) & (pl.col('Date_mean') > lower) if label != "Present" else (pl.col('Date_mean') == 0)
+
+	output = []
+	for region in allele_frequencies.REGIONS:
+		row = {"Region": region}
+		for lower, upper, label in allele_frequencies.DATE_BINS:
+			row[label] = cell(filtered_GTs_df.filter((pl.col('Region') == region) & in_bin(lower, upper, label)))
+		output.append(row)
+
+	total_row = {"Region": "Total"}
+	for lower, upper, label in allele_frequencies.DATE_BINS:
+		total_row[label] = cell(filtered_GTs_df.filter(in_bin(lower, upper, label)))
+	output.append(total_row)
+	return pl.DataFrame(output)
+
+# === TESTS ===
+def test_summarize_AFs_matches_per_cell_table(annotation, fixture_GTs):
+	sample_names, GTs = fixture_GTs
+	panel = allele_frequencies.SamplePanel(sample_names, annotation)
+	expected = per_cell_AFs(annotation, sample_names, GTs)
+	actual = allele_frequencies.summarize_AFs(panel, allele_frequencies.genotype_dosages(GTs))
+
+	assert actual.equals(expected)
+	assert set(expected.row(allele_frequencies.REGIONS.index('Oceania'))[1:]) == {""}
+	assert expected.row(allele_frequencies.REGIONS.index('Africa'), named=True)["Present"] == " (0)"
+
+def test_genotype_dosages_decode_uncommon_calls():
+	assert allele_frequencies.genotype_dosages(["./.", "0/2", "./1", "0|1", "1|1"]).tolist() == [-1, 0, 1, 1, 2]
@@ -0,0 +1,33 @@
+# === Load Packages ===
+import background_jobs
+import diskcache
+import time
+
+# === UTILS ===
+STAGES = ['Resolving variant', 'Retrieving genotypes']
+
+def query_job(set_progress, n):
+	report = background_jobs.stage_reporter(set_progress, STAGES)
+	report('Resolving variant')
+	report('Retrieving genotypes')
+	return n * 2
+
+def wait_for_result(manager, key, timeout=30):
+	deadline = time.time() + timeout
+	while not manager.result_ready(key):
+		assert time.time() < deadline, 'background job did not finish'
+		time.sleep(0.05)
+
+# === TESTS ===
+def test_fork_server_job_runs_and_reports_progress(tmp_path):
+	manager = background_jobs.ForkServerManager(diskcache.Cache(str(tmp_path)), preload_modules=[])
+	job_fn = manager.make_job_fn(query_job, progress=True)
+	key = 'job-key'
+
+	pid = manager.call_job_fn(key, job_fn, [21], {})
+	assert pid
+	wait_for_result(manager, key)
+
+	assert manager.get_progress(key) == (67, 'Retrieving genotypes')
+	assert manager.get_result(key, pid) == 42
+	assert not manager.result_ready(key)
@@ -0,0 +1,72 @@
+# === Load Packages ===
+import box_cache
+import os
+import pytest
+import requests
+
+# === UTILS ===
+class UnreachableSession:
+	def get(self, url, **kwargs):
+		raise requests.exceptions.ConnectionError(f'{url} is unreachable')
+
+def serve(directory, name, data):
+	(directory / name).write_bytes(data)
+
+# === TESTS ===
+def test_fetch_fills_cache(tmp_path, box_server):
+	directory, base_url = box_server
+	cache_dir = str(tmp_path / 'cache')
+	serve(directory, 'a.gz', b'AGV-LD')
+
+	data_path = box_cache.fetch(f'{base_url}/a.gz', cache_dir=cache_dir)
+	with open(data_path, 'rb') as data_file:
+		assert data_file.read() == b'AGV-LD'
+	assert box_cache.is_cached(f'{base_url}/a.gz', cache_dir)
+	metadata = box_cache.read_metadata(box_cache.entry_paths(f'{base_url}/a.gz', cache_dir)[1])
+	assert metadata['etag'] and metadata['size'] == 6
+
+def test_fetch_revalidates_with_etag(tmp_path, box_server):
+	directory, base_url = box_server
+	cache_dir = str(tmp_path / 'cache')
+	url = f'{base_url}/a.gz'
+	serve(directory, 'a.gz', b'first')
+	data_path = box_cache.fetch(url, cache_dir=cache_dir)
+	_, meta_path, _ = box_cache.entry_paths(url, cache_dir)
+	inode, checked_at = os.stat(data_path).st_ino, box_cache.read_metadata(meta_path)['checked_at']
+
+	# Unchanged on the server: answered 304, so the cached file is kept and only re-dated.
+	assert box_cache.fetch(url, cache_dir=cache_dir, revalidate_seconds=0) == data_path
+	assert os.stat(data_path).st_ino == inode
+	assert box_cache.read_metadata(meta_path)['checked_at'] > checked_at
+
+	serve(directory, 'a.gz', b'second file')
+	box_cache.fetch(url, cache_dir=cache_dir, revalidate_seconds=0)
+	with open(data_path, 'rb') as data_file:
+		assert data_file.read() == b'second file'
+
+def test_fetch_serves_stale_copy_when_unreachable(tmp_path, box_server):
+	directory, base_url = box_server
+	cache_dir = str(tmp_path / 'cache')
+	serve(directory, 'a.gz', b'stale')
+	data_path = box_cache.fetch(f'{base_url}/a.gz', cache_dir=cache_dir)
+
+	assert box_cache.fetch(f'{base_url}/a.gz', session=UnreachableSession(), cache_dir=cache_dir, revalidate_seconds=0) == data_path
+	with open(data_path, 'rb') as data_file:
+		assert data_file.read() == b'stale'
+	with pytest.raises(requests.exceptions.ConnectionError):
+		box_cache.fetch(f'{base_url}/b.gz', session=UnreachableSession(), cache_dir=cache_dir)
+
+def test_evict_removes_least_recently_used_entry(tmp_path, box_server):
+	directory, base_url = box_server
+	cache_dir = str(tmp_path / 'cache')
+	for name in ('a.gz', 'b.gz', 'c.gz'):
+		serve(directory, name, b'x' * 100)
+	a_path = box_cache.fetch(f'{base_url}/a.gz', cache_dir=cache_dir)
+	b_path = box_cache.fetch(f'{base_url}/b.gz', cache_dir=cache_dir)
+	os.utime(b_path, (1, 1))
+	box_cache.fetch(f'{base_url}/a.gz', cache_dir=cache_dir)
+
+	c_path = box_cache.fetch(f'{base_url}/c.gz', cache_dir=cache_dir, max_bytes=250)
+	assert not any(os.path.exists(path) for path in box_cache.entry_paths(f'{base_url}/b.gz', cache_dir))
+	assert os.path.exists(a_path) and os.path.exists(c_path)
+	assert box_cache.cache_size(cache_dir) == 200
@@ -0,0 +1,36 @@
+# === Load Packages ===
+import genotype_store
+import gzip
+
+# === TESTS ===
+def test_encode_genotype_row_fixed_width():
+	codes, exception_columns, exception_GTs = genotype_store.encode_genotype_row(b'0/1\t./.\t1|1\t0/0\t1/1', 5)
+	assert codes.tolist() == [1, -1, 2, 0, 2]
+	assert exception_columns.tolist() == [2]
+	assert exception_GTs == [b'1|1']
+
+def test_encode_genotype_row_mixed_width_same_length():
+	# Haploid and multiallelic calls that add up to the fixed-width row length.
+	sample_fields = b'0\t1/10\t0/10\t1/1'
+	assert len(sample_fields) == 4 * 4 - 1
+	codes, exception_columns, exception_GTs = genotype_store.encode_genotype_row(sample_fields, 4)
+	assert codes.tolist() == [0, 2, 1, 2]
+	assert exception_columns.tolist() == [0, 1, 2]
+	assert exception_GTs == [b'0', b'1/10', b'0/10']
+
+def test_load_genotype_store_picks_up_store_built_later(tmp_path):
+	store_dir = str(tmp_path / 'genotype_store')
+	assert genotype_store.load_genotype_store('11', store_dir) is None
+
+	vcf_path = str(tmp_path / 'chr11.vcf.gz')
+	annotation_path = str(tmp_path / 'annotation.txt')
+	with gzip.open(vcf_path, 'wt') as vcf_file:
+		vcf_file.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\n')
+		vcf_file.write('11\t100\trs5\tA\tG\t.\t.\t.\tGT\t0/1\t1/1\n')
+	with open(annotation_path, 'w') as annotation_file:
+		annotation_file.write('Genetic_ID\tLocation\nS1\tFrance\nS2\tREF\n')
+	genotype_store.build_genotype_store(vcf_path, '11', store_dir, annotation_path)
+
+	store = genotype_store.load_genotype_store('11', store_dir)
+	assert store is not None and genotype_store.load_genotype_store('11', store_dir) is store
+	assert store.genotype_strings(store.row_for_rsID('rs5')) == ['0/1', '1/1']
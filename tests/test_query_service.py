@@ -0,0 +1,13 @@
+# === Load Packages ===
+import polars as pl
+import query_service
+
+# === TESTS ===
+def test_AF_stages_reported_when_shard_answers(monkeypatch):
+	AFs = pl.DataFrame({'Region': ['Total']})
+	monkeypatch.setattr(query_service, 'request', lambda variant_chr, op, args: ({'archaic': {'Denisova': '0/0'}}, {'AFs': AFs}))
+	stages = []
+
+	archaic, genotypes, AFs_summary = query_service.retrieve_GTs_and_calculate_AFs('11', 'rs5', report=stages.append)
+	assert stages == ['Retrieving genotypes', 'Computing allele frequencies']
+	assert archaic == {'Denisova': '0/0'} and genotypes is None and AFs_summary is AFs
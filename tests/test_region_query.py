@@ -0,0 +1,45 @@
+# === Load Packages ===
+from functools import partial
+import AGV_LD
+import polars as pl
+import pytest
+import region_query
+
+# === UTILS ===
+def write_AGV_LD_parquet(parquet_dir):
+	# Seven proxies share each of positions 102-104; every third one is below the r2 threshold.
+	rows = []
+	for LDV_pos, n in ((100, 2), (102, 7), (103, 7), (104, 7), (106, 1), (110, 3)):
+		for i in range(n):
+			rows.append({
+				'chr': 11, 'LDV_pos': LDV_pos, 'LDV_ref': 'A', 'LDV_alt': 'G', 'LDV_rsID': f'rs{LDV_pos}',
+				'AGV_pos': 1000 * LDV_pos + i, 'AGV_ref': 'C', 'AGV_alt': 'T', 'AGV_rsID': f'rs{1000 * LDV_pos + i}',
+				'populations': ['EUR'], 'r2': [0.3 if i % 3 == 2 else 0.5 + i / 100], "D'": [1.0], 'corr': [1.0]
+			})
+	df = pl.DataFrame(rows, schema=AGV_LD.AGV_LDV_SCHEMA)
+	df.write_parquet(AGV_LD.parquet_path('11', parquet_dir))
+	return df
+
+# === TESTS ===
+@pytest.mark.parametrize('limit', [1, 3, 7, 10, 100])
+def test_region_pages_cover_every_row_once(tmp_path, monkeypatch, limit):
+	parquet_dir = str(tmp_path)
+	df = write_AGV_LD_parquet(parquet_dir)
+	monkeypatch.setattr(AGV_LD, 'AGV_LD_PARQUET_DIR', parquet_dir)
+	# Small batches, so pages also resume across batch boundaries.
+	monkeypatch.setattr(AGV_LD, 'AGV_LD_region_batches', partial(AGV_LD.AGV_LD_region_batches, batch_rows=4))
+
+	expected = (
+		df.filter(pl.col('LDV_pos').is_between(101, 106) & (pl.col('r2').list.first() >= AGV_LD.MIN_R2))
+		.sort(['LDV_pos', pl.col('r2').list.first()], descending=[False, True])['AGV_pos'].to_list()
+	)
+	seen, after, n_pages = [], None, 0
+	while True:
+		page, after = region_query.query_region_proxies('11', 101, 106, after=after, limit=limit)
+		assert page.height <= limit
+		seen.extend(page['AGV_pos'].to_list())
+		n_pages += 1
+		if after is None:
+			break
+	assert seen == expected
+	assert n_pages == -(-len(expected) // limit)
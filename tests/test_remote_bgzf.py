@@ -0,0 +1,79 @@
+# === Load Packages ===
+from bgzf import make_virtual_offset
+from functools import partial
+from http.server import ThreadingHTTPServer
+import box_cache
+import box_standin
+import gzip
+import pytest
+import remote_bgzf
+import threading
+import VCF
+
+# === UTILS ===
+BLOCK_OFFSETS = [0, 100, 250, 400, 1000, 1100]
+VCF_LINES = [
+	'#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2',
+	'11\t100\trs5\tA\tG\t.\t.\t.\tGT\t0/1\t1/1',
+	'11\t200\trs7\tC\tT\t.\t.\t.\tGT\t0/0\t./.'
+]
+
+class NoRangeHandler(box_standin.RangeRequestHandler):
+	# A host that ignores Range headers and answers 200 with the whole file.
+	def send_head(self):
+		del self.headers['Range']
+		return super().send_head()
+
+@pytest.fixture
+def no_range_server(box_server):
+	directory, _ = box_server
+	server = ThreadingHTTPServer(('127.0.0.1', 0), partial(NoRangeHandler, directory=str(directory)))
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	yield directory, f'http://127.0.0.1:{server.server_port}'
+	server.shutdown()
+	server.server_close()
+
+@pytest.fixture
+def remote_VCF(tmp_path, box_server, monkeypatch):
+	# Publishes a chr11 VCF as BGZF with its index, and as the gzipped Box file.
+	directory, _ = box_server
+	vcf_path = directory / f"{box_cache.box_file_ids(VCF.VCFS_BOX_URLS_PATH)['chr11']}.gz"
+	with gzip.open(vcf_path, 'wt') as vcf_file:
+		vcf_file.write('\n'.join(VCF_LINES) + '\n')
+	VCF.build_VCF_index(str(vcf_path), *VCF.indexed_VCF_paths('11', str(directory)))
+
+	monkeypatch.setattr(box_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+	monkeypatch.setattr(VCF, 'VCF_INDEX_DIR', str(tmp_path / 'no_VCF_index'))
+	monkeypatch.setattr(VCF, 'remote_VCF_indexes', {})
+	return directory
+
+# === TESTS ===
+def test_span_blocks():
+	assert remote_bgzf.span_blocks(BLOCK_OFFSETS, make_virtual_offset(0, 10), make_virtual_offset(0, 50)) == (0, 0)
+	# A span ending at the start of a block does not need that block.
+	assert remote_bgzf.span_blocks(BLOCK_OFFSETS, make_virtual_offset(0, 10), make_virtual_offset(100, 0)) == (0, 0)
+	assert remote_bgzf.span_blocks(BLOCK_OFFSETS, make_virtual_offset(0, 10), make_virtual_offset(250, 5)) == (0, 2)
+	assert remote_bgzf.span_blocks(BLOCK_OFFSETS, make_virtual_offset(100, 0), make_virtual_offset(100, 0)) == (1, 1)
+
+def test_coalesce_ranges():
+	assert remote_bgzf.coalesce_ranges([(3, 3), (0, 0), (1, 1)], BLOCK_OFFSETS, gap_bytes=0) == [[0, 1], [3, 3]]
+	assert remote_bgzf.coalesce_ranges([(3, 3), (0, 0), (1, 1)], BLOCK_OFFSETS, gap_bytes=150) == [[0, 3]]
+	assert remote_bgzf.coalesce_ranges([(0, 2), (1, 1), (4, 4)], BLOCK_OFFSETS, gap_bytes=0) == [[0, 2], [4, 4]]
+
+def test_remote_VCF_records_read_with_ranges(remote_VCF, box_server, monkeypatch):
+	monkeypatch.setattr(remote_bgzf, 'REMOTE_INDEX_BASE_URL', box_server[1])
+	sample_names, records = VCF.fetch_variants_records('11', ['rs7', 'rs5', 'rs9'])
+	assert sample_names == ['S1', 'S2']
+	assert records == {rsID: line.split('\t') for rsID, line in (('rs5', VCF_LINES[1]), ('rs7', VCF_LINES[2]))}
+
+def test_range_not_supported_falls_back_to_box(remote_VCF, no_range_server, monkeypatch):
+	_, base_url = no_range_server
+	monkeypatch.setattr(remote_bgzf, 'REMOTE_INDEX_BASE_URL', base_url)
+	monkeypatch.setattr(box_cache, 'BOX_BASE_URL', base_url)
+
+	remote_index = VCF.load_remote_VCF_index('11')
+	with pytest.raises(remote_bgzf.RangeNotSupported):
+		remote_index.fetch_by_rsIDs(['rs5'])
+
+	sample_names, records = VCF.fetch_variants_records('11', ['rs5'])
+	assert sample_names == ['S1', 'S2'] and records['rs5'] == VCF_LINES[1].split('\t')
@@ -0,0 +1,57 @@
+# === Load Packages ===
+import box_cache
+import os
+import polars as pl
+import query_cache
+import result_store
+import time
+
+# === UTILS ===
+def expire(path):
+	old = time.time() - result_store.RESULT_STORE_TTL_SECONDS - 60
+	os.utime(path, (old, old))
+
+# === TESTS ===
+def test_put_results_replaces_expired_handle(tmp_path):
+	store_dir = str(tmp_path)
+	result_store.put_results({'proxies': pl.DataFrame({'pos': [1]})}, store_dir=store_dir, handle='qkey')
+	expire(result_store.handle_dir('qkey', store_dir))
+	assert result_store.get_results('qkey', store_dir=store_dir) is None
+
+	assert result_store.put_results({'proxies': pl.DataFrame({'pos': [2]})}, store_dir=store_dir, handle='qkey') == 'qkey'
+	assert result_store.get_result('qkey', 'proxies', store_dir=store_dir)['pos'].to_list() == [2]
+	assert not [name for name in os.listdir(store_dir) if name.startswith('.tmp-')]
+
+def test_put_results_keeps_fresh_copy(tmp_path):
+	store_dir = str(tmp_path)
+	result_store.put_results({'proxies': pl.DataFrame({'pos': [1]})}, store_dir=store_dir, handle='qkey')
+	result_store.put_results({'proxies': pl.DataFrame({'pos': [2]})}, store_dir=store_dir, handle='qkey')
+	assert result_store.get_result('qkey', 'proxies', store_dir=store_dir)['pos'].to_list() == [1]
+
+def test_evict_removes_lock_files_with_handles(tmp_path):
+	store_dir = str(tmp_path)
+	for handle in ('qold', 'qbusy'):
+		result_store.put_results({'proxies': pl.DataFrame({'pos': [1]})}, store_dir=store_dir, handle=handle)
+		open(result_store.lock_path(handle, store_dir), 'w').close()
+		expire(result_store.handle_dir(handle, store_dir))
+
+	with box_cache.file_lock(result_store.lock_path('qbusy', store_dir)):
+		result_store.evict(store_dir)
+		assert sorted(os.listdir(store_dir)) == ['.evict.lock', '.qbusy.lock', 'qbusy']
+	result_store.evict(store_dir)
+	assert os.listdir(store_dir) == ['.evict.lock']
+
+def test_cached_query_lock_files(tmp_path, monkeypatch):
+	store_dir = str(tmp_path)
+	monkeypatch.setattr(result_store, 'RESULT_STORE_DIR', store_dir)
+	monkeypatch.setattr(query_cache, 'STATS_PATH', os.path.join(store_dir, '.query_cache_stats.json'))
+	frames = {'proxies': pl.DataFrame({'pos': [1]})}
+
+	handle, _ = query_cache.cached_query('qpartial', lambda: (frames, False))
+	assert handle != 'qpartial' and not os.path.exists(result_store.lock_path('qpartial'))
+
+	assert query_cache.cached_query('qfull', lambda: (frames, True))[0] == 'qfull'
+	assert query_cache.cached_query('qfull', lambda: (None, True))[1]['proxies']['pos'].to_list() == [1]
+	expire(result_store.handle_dir('qfull'))
+	result_store.evict()
+	assert not os.path.exists(result_store.lock_path('qfull'))
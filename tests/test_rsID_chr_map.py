@@ -0,0 +1,20 @@
+# === Load Packages ===
+from build_rsID_chr_map import build_from_pickle
+import gzip
+import pickle
+import rsID_chr_map
+
+# === TESTS ===
+def test_lookup_without_map_returns_none(tmp_path):
+	map_dir = str(tmp_path / 'rsID_chr_map')
+	assert rsID_chr_map.lookup_chr_for_rsID('rs123', map_dir) is None
+
+	pickle_path = str(tmp_path / 'rsID_chr.pkl')
+	with gzip.open(pickle_path, 'wb') as pickle_file:
+		pickle.dump({'rs123': '11', 'rs7': 'chrX', 'rs9': 'unplaced'}, pickle_file)
+	assert build_from_pickle(pickle_path, map_dir) == 2
+
+	# A map built after a failed lookup is picked up without a restart.
+	assert rsID_chr_map.lookup_chr_for_rsID('rs123', map_dir) == '11'
+	assert rsID_chr_map.lookup_chr_for_rsID('rs7', map_dir) == 'X'
+	assert rsID_chr_map.lookup_chr_for_rsID('rs9', map_dir) is None
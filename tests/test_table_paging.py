@@ -0,0 +1,49 @@
+# === Load Packages ===
+import polars as pl
+import table_paging
+
+# === UTILS ===
+PROXIES = pl.DataFrame({
+	'LDV_rsID': ['rs10', 'rs2', 'rs30', 'RS4', 'rs5'],
+	'LDV_pos': [100, 200, 300, 400, 500],
+	'r2': ['0.9, 0.1', '0.5, 0.7', '0.2, 0.3', '0.85, nan', '0.7, 0.6'],
+	'date': ['2024-01-05', '2023-11-30', '2024-02-10', '2024-01-20', '2022-06-01']
+})
+
+def matching(filter_query, df=PROXIES):
+	condition = table_paging.filter_expr(filter_query, df.schema)
+	return df.filter(condition)['LDV_rsID'].to_list() if condition is not None else df['LDV_rsID'].to_list()
+
+# === TESTS ===
+def test_numeric_operators():
+	assert matching('{LDV_pos} >= 300') == ['rs30', 'RS4', 'rs5']
+	assert matching('{LDV_pos} lt 300') == ['rs10', 'rs2']
+	assert matching('{LDV_pos} = 200') == ['rs2']
+	assert matching('{LDV_pos} != 200 && {LDV_pos} <= 300') == ['rs10', 'rs30']
+	assert matching('{LDV_pos} > abc') == matching('')
+
+def test_LD_list_columns_match_any_group():
+	assert matching('{r2} >= 0.8') == ['rs10', 'RS4']
+	assert matching('{r2} < 0.2') == ['rs10']
+	assert matching('{r2} eq 0.7') == ['rs2', 'rs5']
+
+def test_text_operators_and_case():
+	assert matching('{LDV_rsID} contains rs') == ['rs10', 'rs2', 'rs30', 'rs5']
+	assert matching('{LDV_rsID} icontains rs') == ['rs10', 'rs2', 'rs30', 'RS4', 'rs5']
+	assert matching('{LDV_rsID} scontains "RS"') == ['RS4']
+	assert matching('{LDV_rsID} i= rs4') == ['RS4']
+	assert matching('{date} datestartswith 2024-01') == ['rs10', 'RS4']
+
+def test_unknown_columns_and_parts_are_ignored():
+	assert table_paging.filter_expr('{missing} > 1 && not a filter', PROXIES.schema) is None
+
+def test_page_table_sorts_then_slices():
+	sort_by = [{'column_id': 'r2', 'direction': 'desc'}]
+	page, page_current, page_count = table_paging.page_table(PROXIES, 0, 2, sort_by)
+	assert (page['LDV_rsID'].to_list(), page_current, page_count) == (['rs10', 'RS4'], 0, 3)
+	page, page_current, _ = table_paging.page_table(PROXIES, 1, 2, sort_by)
+	assert page['LDV_rsID'].to_list() == ['rs5', 'rs2']
+
+	# Past the last page after filtering: the last page is returned.
+	page, page_current, page_count = table_paging.page_table(PROXIES, 5, 2, sort_by, '{LDV_pos} >= 300')
+	assert (page['LDV_rsID'].to_list(), page_current, page_count) == (['rs30'], 1, 2)
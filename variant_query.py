@@ -0,0 +1,98 @@
+# === Load Packages ===
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from contextvars import copy_context
+from functools import lru_cache
+import AGV_LD
+import box_cache
+import cancellation
+import os
+import polars as pl
+import query_service
+import remote_bgzf
+import streaming
+import threading
+import time
+
+# === SETTINGS ===
+# The genotype/AF pipeline and the LD proxy lookup are independent and mostly I/O-bound, so
+# they run concurrently on a pool shared by all queries in the worker. Each stage has its own
+# timeout; a stage that times out or fails is reported without discarding the other's result.
+# A stage that times out is cancelled: it stops at its next download or decompression chunk
+# (see cancellation), so it does not hold a pool thread or keep a background job alive. Work
+# that cannot be interrupted, such as a Parquet scan or a query service request, runs to the end
+# and its result is discarded.
+QUERY_WORKERS = int(os.environ.get('AGV_QUERY_WORKERS', 8))
+AF_TIMEOUT_SECONDS = float(os.environ.get('AGV_AF_TIMEOUT_SECONDS', 120))
+LD_TIMEOUT_SECONDS = float(os.environ.get('AGV_LD_TIMEOUT_SECONDS', 120))
+
+QUERY_STAGES = ['Resolving variant', 'Checking cached results', 'Downloading LD data', 'Filtering LD proxies', 'Retrieving genotypes', 'Computing allele frequencies']
+
+# One pool per process: background jobs run in processes forked from the web worker, and a
+# pool's threads do not survive a fork.
+@lru_cache(maxsize=None)
+def query_executor(pid):
+	return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='variant-query')
+
+# === FUNCTION: Query Stages ===
+def no_report(stage):
+	pass
+
+def AF_stage(variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, report=no_report):
+	archaic_GTs_dict, all_GTs_df, AFs_summary_df = query_service.retrieve_GTs_and_calculate_AFs(variant_chr, variant_rsID, report=report)
+	if AFs_summary_df is None:
+		raise RuntimeError(f"Genotypes for {variant_rsID} could not be retrieved.")
+	return {
+		'AGV': pl.DataFrame([{"AGV_chr": variant_chr, "AGV_pos": variant_pos, "AGV_rsID": variant_rsID, "AGV_ref": variant_ref, "AGV_alt": variant_alt}]),
+		'archaic': pl.DataFrame([archaic_GTs_dict]) if archaic_GTs_dict else None,
+		'AFs': AFs_summary_df,
+		'genotypes': all_GTs_df
+	}
+
+def LD_stage(variant_chr, variant_pos, variant_rsID, min_r2, min_D, ancestry_groups, report=no_report):
+	# With the query service, the shard that owns the chromosome downloads and caches its LD file.
+	if not query_service.QUERY_SERVICE_SOCKET and not os.path.exists(AGV_LD.parquet_path(variant_chr)):
+		report('Downloading LD data')
+		if not (streaming.STREAM_DOWNLOADS or remote_bgzf.REMOTE_INDEX_BASE_URL):
+			box_cache.fetch(AGV_LD.AGV_LD_box_url(variant_chr))
+	report('Filtering LD proxies')
+	if variant_pos:
+		AGV_LDVs = query_service.query_AGV_LDVs(variant_chr, LDV_positions=[variant_pos], min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
+	else:
+		AGV_LDVs = query_service.query_AGV_LDVs(variant_chr, LDV_rsIDs=[variant_rsID], min_r2=min_r2, min_D=min_D, ancestry_groups=ancestry_groups)
+	return {'proxies': AGV_LD.format_AGV_LDVs(AGV_LDVs) if AGV_LDVs.height else None}
+
+def submit_stage(executor, stage, *args):
+	# Returns the stage's future and the event that cancels it.
+	cancelled = threading.Event()
+	return executor.submit(copy_context().run, cancellation.run_cancellable, cancelled, stage, *args), cancelled
+
+def stage_error_message(stage, error):
+	if isinstance(error, TimeoutError):
+		return f"{stage} timed out."
+	return f"{stage} failed: {error}"
+
+# === FUNCTION: Query Variant ===
+# Runs the AF pipeline (AGVs only) and the LD proxy lookup for a normalized variant and returns
+# the frames memoized by query_cache. LD proxies are matched by position whenever it is known so
+# chr:pos and rsID queries for the same AGV give the same result. Stage failures are returned in
+# an 'errors' frame and make the result uncacheable. report(stage) is called with names from
+# QUERY_STAGES as the stages progress.
+def run_variant_query(variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV, min_r2=AGV_LD.MIN_R2, min_D=None, ancestry_groups=None, AF_timeout=None, LD_timeout=None, report=no_report):
+	executor = query_executor(os.getpid())
+	stages = {'LD proxy lookup': (*submit_stage(executor, LD_stage, variant_chr, variant_pos, variant_rsID, min_r2, min_D, ancestry_groups, report), LD_TIMEOUT_SECONDS if LD_timeout is None else LD_timeout)}
+	if is_AGV:
+		stages['Allele frequency calculation'] = (*submit_stage(executor, AF_stage, variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, report), AF_TIMEOUT_SECONDS if AF_timeout is None else AF_timeout)
+
+	start = time.monotonic()
+	results, errors = {}, []
+	for stage, (future, cancelled, timeout) in stages.items():
+		try:
+			results.update(future.result(timeout=max(0, timeout - (time.monotonic() - start))))
+		except Exception as e:
+			future.cancel()
+			cancelled.set()
+			errors.append({'stage': stage, 'error': stage_error_message(stage, e)})
+
+	if errors:
+		results['errors'] = pl.DataFrame(errors)
+	return results, not errors
@@ -0,0 +1,58 @@
+# === Load Packages ===
+from AGV_catalog import get_AGV_catalog, lookup_AGV_by_chr_pos, lookup_AGV_by_rsID
+import rsID_chr_map
+import telemetry
+
+# === FUNCTION: Process Chromosome ===
+def process_chr(input_chr):
+	if input_chr:
+		if input_chr.lower().startswith('chr'):
+			input_chr = input_chr[3:]
+
+		if input_chr not in map(str, range(1, 23)) and input_chr != 'X':
+			return None, f"Invalid chromosome: {input_chr}. Chromosome must be between 1-22 or X."
+
+	return input_chr, None
+
+# === FUNCTION: Process Variant ===
+def lookup_chr_for_rsID_external(rsID):
+	try:
+		with telemetry.span('rsID_resolution'):
+			return rsID_chr_map.lookup_chr_for_rsID(rsID)
+	except Exception as e:
+		print(f"Error loading rsID to chr lookup: {e}")
+		return None
+
+def process_variant(input_chr=None, input_pos=None, input_rsID=None):
+	catalog = get_AGV_catalog()
+
+	variant_chr = variant_pos = variant_rsID = variant_ref = variant_alt = None
+	is_AGV = False
+
+	if input_chr and input_pos:
+		row = lookup_AGV_by_chr_pos(catalog, input_chr, input_pos)
+		if row:
+			variant_chr = row['chr']
+			variant_pos = row['pos']
+			variant_rsID = row['rsID']
+			variant_ref = row['ref']
+			variant_alt = row['alt']
+			is_AGV = True
+		else:
+			variant_chr = input_chr
+			variant_pos = input_pos
+
+	elif input_rsID:
+		row = lookup_AGV_by_rsID(catalog, input_rsID)
+		if row:
+			variant_chr = row['chr']
+			variant_pos = row['pos']
+			variant_rsID = row['rsID']
+			variant_ref = row['ref']
+			variant_alt = row['alt']
+			is_AGV = True
+		else:
+			variant_chr = lookup_chr_for_rsID_external(input_rsID)
+			variant_rsID = input_rsID
+
+	return variant_chr, variant_pos, variant_rsID, variant_ref, variant_alt, is_AGV
@@ -0,0 +1,115 @@
+# === Load Packages ===
+from flask import Blueprint, jsonify
+import AGV_catalog
+import AGV_LD
+import allele_frequencies
+import box_cache
+import gc
+import genotype_store
+import os
+import query_service
+import rsID_chr_map
+import threading
+import time
+import VCF
+
+# === SETTINGS ===
+# Reference data is built in two phases. The shared phase (Box file IDs, AGV partner postings,
+# the sample annotation, sample panels for local genotype stores and VCF indexes, and the rsID
+# map) uses only numpy and the standard library and runs when app is imported, so with gunicorn
+# --preload it is built once in the master and forked workers share it copy-on-write. The worker
+# phase loads data held in polars frames (the AGV catalog and sample frames) in each worker after
+# it starts, since polars' thread pool does not survive a fork. /ready answers 503 until the
+# worker it reaches is warm.
+WARMUP = os.environ.get('AGV_WARMUP', '1').lower() in ('1', 'true', 'yes')
+
+phases = {'shared': {'pid': None, 'done': False, 'seconds': {}, 'errors': []}, 'worker': {'pid': None, 'done': False, 'seconds': {}, 'bytes': {}, 'errors': []}}
+worker_lock = threading.Lock()
+
+# === UTILS ===
+def run_step(phase, name, function):
+	start = time.perf_counter()
+	try:
+		function()
+	except Exception as e:
+		print(f"Error warming up {name}: {e}")
+		phases[phase]['errors'].append({'step': name, 'error': str(e)})
+	phases[phase]['seconds'][name] = round(time.perf_counter() - start, 3)
+
+def local_sample_sources():
+	for chr in rsID_chr_map.CHROMOSOMES:
+		for source in (genotype_store.load_genotype_store(chr), VCF.load_VCF_index(chr)):
+			if source is not None:
+				yield source
+
+# === FUNCTION: Shared Phase ===
+def load_box_file_ids():
+	for urls_path in (AGV_LD.AGVS_BOX_URLS_PATH, VCF.VCFS_BOX_URLS_PATH):
+		box_cache.box_file_ids(urls_path)
+
+def load_partner_indexes():
+	for chr in rsID_chr_map.CHROMOSOMES:
+		AGV_LD.load_AGV_partner_index(chr)
+
+def build_sample_panels():
+	for source in local_sample_sources():
+		allele_frequencies.sample_panel(source.sample_names)
+
+def warm_up_shared():
+	phases['shared']['pid'] = os.getpid()
+	run_step('shared', 'box_file_ids', load_box_file_ids)
+	run_step('shared', 'partner_indexes', load_partner_indexes)
+	run_step('shared', 'sample_annotation', allele_frequencies.load_sample_annotation)
+	run_step('shared', 'sample_panels', build_sample_panels)
+	run_step('shared', 'rsID_chr_map', rsID_chr_map.open_rsID_chr_map)
+	phases['shared']['done'] = True
+	# Keeps the collector from writing to these objects' headers, which would copy their pages in every worker.
+	gc.freeze()
+
+# === FUNCTION: Worker Phase ===
+def load_AGV_catalog():
+	# Reported in /ready, so the memory each worker spends on the catalog can be watched.
+	phases['worker']['bytes']['AGV_catalog'] = AGV_catalog.get_AGV_catalog().nbytes()
+
+def build_sample_frames():
+	for panel in list(allele_frequencies.sample_panels.values()):
+		panel.sample_frame()
+
+def warm_up_worker():
+	run_step('worker', 'AGV_catalog', load_AGV_catalog)
+	# Query service shards hold their own sample frames; workers only build them on fallback.
+	if not query_service.QUERY_SERVICE_SOCKET:
+		run_step('worker', 'sample_frames', build_sample_frames)
+	phases['worker']['done'] = True
+
+def start_worker_warm_up():
+	# Idempotent per process; called from gunicorn's post_worker_init and on a worker's first request.
+	with worker_lock:
+		if not WARMUP or phases['worker']['pid'] == os.getpid():
+			return
+		phases['worker'] = {'pid': os.getpid(), 'done': False, 'seconds': {}, 'bytes': {}, 'errors': []}
+	threading.Thread(target=warm_up_worker, name='warm-up', daemon=True).start()
+
+def is_ready():
+	worker = phases['worker']
+	return not WARMUP or (worker['pid'] == os.getpid() and worker['done'] and not worker['errors'] and not phases['shared']['errors'])
+
+# === BLUEPRINT: Readiness ===
+readiness = Blueprint('readiness', __name__)
+
+@readiness.before_app_request
+def warm_up_on_first_request():
+	start_worker_warm_up()
+
+@readiness.route('/ready')
+def ready_endpoint():
+	ready = is_ready()
+	body = {
+		'ready': ready,
+		'pid': os.getpid(),
+		'warmup': WARMUP,
+		'preloaded': phases['shared']['pid'] not in (None, os.getpid()),
+		'shared': phases['shared'],
+		'worker': phases['worker']
+	}
+	return jsonify(body), 200 if ready else 503